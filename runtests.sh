@@ -32,7 +32,10 @@ MIB2DEV_LOG=$(mktemp /tmp/mib2dev.XXXXXX)
 function cleanup()
 {
     rm -f $SNMPSIMD_LOG $SNMPSIMD_LOG $MIB2DEV_LOG
-    kill $SNMPSIMD_1_PID $SNMPSIMD_2_PID
+    rm -rf $BROKEN_DATA_DIR $FAST_DATA_DIR $SQL_DATA_DIR $REDIS_DATA_DIR
+    kill $SNMPSIMD_1_PID $SNMPSIMD_2_PID $SNMPSIMD_MEMORY_PID \
+        $SNMPSIMD_BROKEN_PID $SNMPSIMD_FAST_PID $SNMPSIMD_SQL_PID \
+        $REDIS_PID $SNMPSIMD_REDIS_PID
 }
 
 trap cleanup EXIT
@@ -153,6 +156,457 @@ snmpsim-record-commands \
 
 rm -f $SNMPREC_LOG
 
+# test lite snmpsim instance, in-memory index and memory-mapped data files
+snmpsim-command-responder-lite \
+    --log-level error \
+    --data-dir data \
+    --variation-modules-dir variation \
+    --index-backend memory \
+    --mmap-data-files \
+    --agent-udpv4-endpoint 127.0.0.1:1170 &
+
+SNMPSIMD_MEMORY_PID=$!
+
+sleep 3
+
+# some values vary in time, OIDs must not
+for getbulk in "" --use-getbulk; do
+    for community in public foreignformats/linux variation/virtualtable; do
+        for endpoint in 127.0.0.1:1163 127.0.0.1:1170; do
+            snmpsim-record-commands \
+                --log-level error \
+                $getbulk \
+                --community $community \
+                --output-file $SNMPREC_LOG-${endpoint##*:} \
+                --agent-udpv4-endpoint=$endpoint
+
+            [ -s $SNMPREC_LOG-${endpoint##*:}.snmprec ] || {
+                echo "Empty .snmprec generated"; exit 1 ; }
+        done
+
+        diff <(cut -d'|' -f1 $SNMPREC_LOG-1163.snmprec) \
+            <(cut -d'|' -f1 $SNMPREC_LOG-1170.snmprec) || {
+                echo "In-memory index served different OIDs"; exit 1 ; }
+
+        rm -f $SNMPREC_LOG-1163.snmprec $SNMPREC_LOG-1170.snmprec
+    done
+done
+
+# test lite snmpsim instance, data file broken while being served
+BROKEN_DATA_DIR=$(mktemp -d /tmp/snmpsim-broken.XXXXXX)
+
+head -20 data/public.snmprec > $BROKEN_DATA_DIR/broken.snmprec
+
+snmpsim-command-responder-lite \
+    --log-level error \
+    --data-dir $BROKEN_DATA_DIR \
+    --agent-udpv4-endpoint 127.0.0.1:1168 &
+
+SNMPSIMD_BROKEN_PID=$!
+
+sleep 3
+
+echo "broken record" >> $BROKEN_DATA_DIR/broken.snmprec
+
+# responder must still answer, with no data
+for getbulk in "" --use-getbulk; do
+    snmpsim-record-commands \
+        --log-level error \
+        $getbulk \
+        --community broken \
+        --output-file $SNMPREC_LOG \
+        --agent-udpv4-endpoint=127.0.0.1:1168
+
+    rm -f $SNMPREC_LOG
+done
+
+# test binary .snmprecb data served by lite snmpsim instance running
+# built-in codec, pre-encoded values and a few worker processes
+FAST_DATA_DIR=$(mktemp -d /tmp/snmpsim-fast.XXXXXX)
+
+snmpsim-manage-records \
+    --quiet \
+    --input-file data/public.snmprec \
+    --destination-record-type snmprecb \
+    --output-file $FAST_DATA_DIR/public.snmprecb
+
+cp data/public.snmprec $FAST_DATA_DIR/reference.snmprec
+
+snmpsim-command-responder-lite \
+    --log-level error \
+    --data-dir $FAST_DATA_DIR \
+    --variation-modules-dir variation \
+    --value-cache-size 10000 \
+    --fast-codec \
+    --pre-encode-values \
+    --workers 2 \
+    --agent-udpv4-endpoint 127.0.0.1:1167 &
+
+SNMPSIMD_FAST_PID=$!
+
+sleep 3
+
+# walk text and binary copies of the same data
+for getbulk in "" --use-getbulk; do
+    for community in reference public; do
+        snmpsim-record-commands \
+            --log-level error \
+            $getbulk \
+            --community $community \
+            --output-file $FAST_DATA_DIR/$community.walk.snmprec \
+            --agent-udpv4-endpoint=127.0.0.1:1167
+
+        [ -s $FAST_DATA_DIR/$community.walk.snmprec ] || { echo "Empty .snmprec generated"; exit 1 ; }
+    done
+
+    # some values vary in time, OIDs must not
+    diff <(cut -d'|' -f1 $FAST_DATA_DIR/reference.walk.snmprec) \
+        <(cut -d'|' -f1 $FAST_DATA_DIR/public.walk.snmprec) || {
+            echo "Binary data served different OIDs"; exit 1 ; }
+
+    rm -f $FAST_DATA_DIR/*.walk.snmprec
+done
+
+# test numeric variation module, batched and NumPy evaluation must
+# yield the same values as one-by-one evaluation does
+python - <<'EOF_PY'
+import itertools
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from pysnmp.proto import rfc1902
+
+from snmpsim import confdir
+from snmpsim import datafile
+from snmpsim import variation
+
+settings = []
+
+# every formula kind, many records each to get them vectorized
+for kind in itertools.product((0, 1), repeat=5):
+    for idx in range(20):
+        setting = ['rate=%s' % (idx * 0.25), 'initial=%d' % (idx * 10)]
+
+        for flag, option in zip(kind, ('atime=1', 'scale=3', 'offset=7',
+                                       'deviation=5', 'cumulative=1')):
+            if flag:
+                setting.append(option)
+
+        if idx % 2:
+            setting.append('max=1000000,wrap=1')
+
+        settings.append(','.join(setting))
+
+for function in ('sin', 'cos', 'sqrt', 'fmod%<time>%7'):
+    for extra in ('', ',scale=1000,offset=1000', ',deviation=50',
+                  ',cumulative=1'):
+        settings.append('function=%s%s' % (function, extra))
+
+data_dir = confdir.cache = tempfile.mkdtemp()
+
+data_file = os.path.join(data_dir, 'numeric.snmprec')
+
+with open(data_file, 'w') as f:
+    for idx, setting in enumerate(settings):
+        f.write('1.3.6.1.4.1.20408.%d|70:numeric|%s\n' % (idx + 1, setting))
+
+oids = [rfc1902.ObjectName('1.3.6.1.4.1.20408.%d' % (idx + 1))
+        for idx in range(len(settings))]
+
+null = rfc1902.Null('')
+
+results = {}
+
+for mode in ('scalar', 'batch', 'numpy'):
+    modules = variation.load_variation_modules(
+        ['variation'], {'numeric': [('numeric', '')]})
+
+    modules = {'numeric': modules['numeric']}
+
+    variation.initialize_variation_modules(modules, mode='variating')
+
+    body = modules['numeric'][0]
+
+    body['BOOTED'] = 1e9
+
+    if mode == 'scalar':
+        del body['variate_batch']
+
+    elif mode == 'batch':
+        body['numpy'] = None
+
+    elif body['numpy'] is None:
+        print('NumPy not installed, vectorized evaluation not tested')
+
+    data = datafile.DataFile(
+        data_file, variation.RECORD_TYPES['snmprec'], modules).index_text()
+
+    random.seed(1)
+
+    results[mode] = values = []
+
+    for step in range(3):
+        now = 1e9 + 100 + step * 17.5
+
+        time.time = lambda: now
+
+        values.extend(data.process_var_binds(
+            [(oid, null) for oid in oids], nextFlag=False, setFlag=False))
+
+        values.extend(data.process_var_binds(
+            [(oid[:-1] + (oid[-1] - 1,), null) for oid in oids],
+            nextFlag=True, setFlag=False))
+
+        values.extend(data.process_bulk_var_binds(
+            [(oids[0], null), (oids[300], null)], 25, nextFlag=True,
+            setFlag=False))
+
+shutil.rmtree(data_dir)
+
+for mode in ('batch', 'numpy'):
+    for expected, value in zip(results['scalar'], results[mode]):
+        if (expected[0] != value[0] or
+                expected[1].prettyPrint() != value[1].prettyPrint()):
+            raise SystemExit(
+                'Numeric %s evaluation yields %s=%s, one-by-one '
+                'evaluation %s=%s' % (mode, value[0], value[1].prettyPrint(),
+                                     expected[0], expected[1].prettyPrint()))
+EOF_PY
+
+# test SQL variation module against SQLite database
+SQL_DATA_DIR=$(mktemp -d /tmp/snmpsim-sql.XXXXXX)
+
+SQL_DB=$SQL_DATA_DIR/snmprec.db
+
+# record into SQLite, system and interfaces groups keep it quick
+snmpsim-record-commands \
+    --log-level error \
+    --variation-modules-dir variation \
+    --variation-module sql \
+    --variation-module-options dbtype:sqlite3,database:$SQL_DB \
+    --start-object 1.3.6.1.2.1 \
+    --stop-object 1.3.6.1.2.1.3 \
+    --output-file $SQL_DATA_DIR/sql.snmprec \
+    --agent-udpv4-endpoint=127.0.0.1:1161
+
+diff data/variation/sql.snmprec $SQL_DATA_DIR/sql.snmprec || {
+    echo "Recorded .snmprec differs from SQL sample"; exit 1 ; }
+
+snmpsim-command-responder-lite \
+    --log-level error \
+    --data-dir $SQL_DATA_DIR \
+    --variation-modules-dir variation \
+    --variation-module-options=sql:dbtype:sqlite3,database:$SQL_DB,poolsize:2 \
+    --agent-udpv4-endpoint 127.0.0.1:1169 &
+
+SNMPSIMD_SQL_PID=$!
+
+sleep 3
+
+# serve from SQLite, GETNEXT and GETBULK walks must match database rows
+for getbulk in "" --use-getbulk; do
+    snmpsim-record-commands \
+        --log-level error \
+        $getbulk \
+        --community sql \
+        --output-file $SQL_DATA_DIR/walk.snmprec \
+        --agent-udpv4-endpoint=127.0.0.1:1169
+
+    diff <(python -c "
+import sqlite3
+for oid, tag, value, _ in sqlite3.connect('$SQL_DB').execute(
+        'select * from snmprec order by oid'):
+    print('%s|%s|%s' % (oid.replace(' ', ''), tag, value))
+") $SQL_DATA_DIR/walk.snmprec || {
+        echo "SQL-backed walk differs from database contents"; exit 1 ; }
+
+    rm -f $SQL_DATA_DIR/walk.snmprec
+done
+
+# GET, SET (committed at the end of PDU) and GET again
+python - $SQL_DB <<'EOF_PY'
+import sqlite3
+import sys
+
+from pysnmp.hlapi import *
+
+SYS_DESCR = '1.3.6.1.2.1.1.1.0'
+SYS_CONTACT = '1.3.6.1.2.1.1.4.0'
+SYS_OR_DESCR = '1.3.6.1.2.1.1.9.1.3.99'
+
+
+def query(cmd, *var_binds):
+    error_indication, error_status, _, var_binds = next(cmd(
+        SnmpEngine(), CommunityData('sql'),
+        UdpTransportTarget(('127.0.0.1', 1169)), ContextData(),
+        *[ObjectType(ObjectIdentity(oid), *value)
+          for oid, value in var_binds]))
+
+    if error_indication or error_status:
+        raise SystemExit(
+            'SQL-backed SNMP query failed: %s' % (
+                error_indication or error_status.prettyPrint()))
+
+    return [(str(oid), str(value)) for oid, value in var_binds]
+
+
+def db_value(oid):
+    row = sqlite3.connect(sys.argv[1]).execute(
+        'select value from snmprec where oid=?',
+        ('.'.join(['%10s' % x for x in oid.split('.')]),)).fetchone()
+
+    return row and row[0]
+
+
+if query(getCmd, (SYS_DESCR, ()))[0][1].encode() != bytes.fromhex(
+        db_value(SYS_DESCR)):
+    raise SystemExit('SQL-backed GET returned wrong sysDescr')
+
+# update existing row and insert a new one
+query(setCmd, (SYS_CONTACT, (OctetString('admin'),)),
+      (SYS_OR_DESCR, (OctetString('test'),)))
+
+# a fresh connection only sees committed changes
+if db_value(SYS_CONTACT) != 'admin' or db_value(SYS_OR_DESCR) != 'test':
+    raise SystemExit('SQL-backed SET not committed')
+
+if query(getCmd, (SYS_CONTACT, ()), (SYS_OR_DESCR, ())) != [
+        (SYS_CONTACT, 'admin'), (SYS_OR_DESCR, 'test')]:
+    raise SystemExit('SQL-backed GET does not return values SET')
+EOF_PY
+
+# SQL statements get placeholders of every DB-API paramstyle
+python - $SQL_DATA_DIR/paramstyle.db <<'EOF_PY'
+import sqlite3
+import sys
+
+from snmpsim import variation
+
+UPDATE_QUERIES = {
+    'qmark': 'update snmprec set tag=?,value=? where oid=?',
+    'numeric': 'update snmprec set tag=:1,value=:2 where oid=:3',
+    'named': 'update snmprec set tag=:p1,value=:p2 where oid=:p3',
+    'format': 'update snmprec set tag=%s,value=%s where oid=%s',
+    'pyformat': 'update snmprec set tag=%s,value=%s where oid=%s',
+}
+
+conn = sqlite3.connect(sys.argv[1], isolation_level=None)
+
+conn.execute(
+    'CREATE TABLE snmprec (oid text, tag text, value text, maxaccess text)')
+
+modules = variation.load_variation_modules(
+    ['variation'],
+    {'sql': [('sql', 'dbtype:sqlite3,database:%s' % sys.argv[1])]})
+
+modules = {'sql': modules['sql']}
+
+variation.initialize_variation_modules(modules, mode='variating')
+
+body = modules['sql'][0]
+
+for idx, (paramstyle, query) in enumerate(sorted(UPDATE_QUERIES.items())):
+    body['moduleContext']['paramStyle'] = paramstyle
+    body['moduleContext']['dbQueries'] = {}
+
+    if body['_prepare_query']('update', 'snmprec') != query:
+        raise SystemExit(
+            'Bad SQL statement for %s paramstyle: %s' % (
+                paramstyle, body['_prepare_query']('update', 'snmprec')))
+
+    # SQLite takes these too
+    if paramstyle in ('format', 'pyformat'):
+        continue
+
+    oid = body['_format_sql_oid']('1.3.6.1.%d' % idx)
+
+    cursor = conn.cursor()
+
+    body['_execute'](cursor, 'insert', 'snmprec', oid, '4', 'old')
+    body['_execute'](cursor, 'update', 'snmprec', '4', 'new', oid)
+    body['_execute'](cursor, 'get', 'snmprec', oid)
+
+    if cursor.fetchone() != ('4', 'new'):
+        raise SystemExit('SQL GET with %s paramstyle failed' % paramstyle)
+
+    body['_execute'](
+        cursor, 'getnext', 'snmprec',
+        body['_format_sql_oid']('1.3.6.1.%d' % (idx - 1)))
+
+    if cursor.fetchone() != (oid, '4', 'new'):
+        raise SystemExit('SQL GETNEXT with %s paramstyle failed' % paramstyle)
+
+    cursor.close()
+EOF_PY
+
+# test redis variation module against in-process Redis stand-in
+if python -c 'import fakeredis, lupa' 2>/dev/null; then
+
+    python -c "
+from fakeredis import TcpFakeServer
+TcpFakeServer(('127.0.0.1', 16379), server_type='redis').serve_forever()
+" &
+
+    REDIS_PID=$!
+
+    REDIS_DATA_DIR=$(mktemp -d /tmp/snmpsim-redis.XXXXXX)
+
+    sleep 3
+
+    # record into Redis, system and interfaces groups keep it quick
+    snmpsim-record-commands \
+        --log-level error \
+        --variation-modules-dir variation \
+        --variation-module redis \
+        --variation-module-options host:127.0.0.1,port:16379,key-spaces-id:1234 \
+        --start-object 1.3.6.1.2.1 \
+        --stop-object 1.3.6.1.2.1.3 \
+        --output-file $REDIS_DATA_DIR/redis.snmprec \
+        --agent-udpv4-endpoint=127.0.0.1:1161
+
+    snmpsim-command-responder-lite \
+        --log-level error \
+        --data-dir $REDIS_DATA_DIR \
+        --variation-modules-dir variation \
+        --variation-module-options=redis:host:127.0.0.1,port:16379 \
+        --agent-udpv4-endpoint 127.0.0.1:1166 &
+
+    SNMPSIMD_REDIS_PID=$!
+
+    sleep 3
+
+    # serve from Redis
+    for getbulk in "" --use-getbulk; do
+        snmpsim-record-commands \
+            --log-level error \
+            $getbulk \
+            --community redis \
+            --output-file $REDIS_DATA_DIR/walk.snmprec \
+            --agent-udpv4-endpoint=127.0.0.1:1166
+
+        [ -s $REDIS_DATA_DIR/walk.snmprec ] || { echo "Empty .snmprec generated"; exit 1 ; }
+
+        # walk must match records kept in Redis
+        diff <(python -c "
+import redis
+db = redis.StrictRedis(host='127.0.0.1', port=16379)
+for key_space in db.lrange('1234', 0, -1):
+    for key in db.lrange(key_space + b'-oids_ordering', 0, -1):
+        oid = key.decode().split('-', 1)[1].replace(' ', '')
+        print('%s|%s' % (oid, db.get(key).decode()))
+") $REDIS_DATA_DIR/walk.snmprec || {
+            echo "Redis-backed walk differs from recorded data"; exit 1 ; }
+
+        rm -f $REDIS_DATA_DIR/walk.snmprec
+    done
+
+else
+    echo "fakeredis not installed, skipping redis variation module tests"
+fi
+
 # TODO: Fails on --log-level and something else
 #snmpsim-record-mibs \
 #    --log-level error \
@@ -84,10 +84,12 @@ params.update(
         'console_scripts': [
             'snmpsim-manage-records = snmpsim.commands.rec2rec:main',
             'snmpsim-record-mibs = snmpsim.commands.mib2rec:main',
+            'snmpsim-generate-records = snmpsim.commands.gen2rec:main',
             'snmpsim-record-traffic = snmpsim.commands.pcap2rec:main',
             'snmpsim-record-commands = snmpsim.commands.cmd2rec:main',
             'snmpsim-command-responder = snmpsim.commands.responder:main',
             'snmpsim-command-responder-lite = snmpsim.commands.responder_lite:main',
+            'snmpsim-bench = snmpsim.commands.bench:main',
         ]
      }}
 )
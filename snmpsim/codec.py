@@ -0,0 +1,397 @@
+#
+# This file is part of snmpsim software.
+#
+# Copyright (c) 2010-2019, Ilya Etingof <etingof@gmail.com>
+# License: http://snmplabs.com/snmpsim/license.html
+#
+# Minimal BER codec for common SNMP v1/v2c command responder messages
+#
+from pyasn1.codec.ber import encoder
+from pyasn1.type import univ
+from pysnmp.proto import rfc1902
+from pysnmp.proto import rfc1905
+
+GET = 0xa0
+GETNEXT = 0xa1
+RESPONSE = 0xa2
+GETBULK = 0xa5
+
+_SEQUENCE = 0x30
+_INTEGER = 0x02
+_OCTET_STRING = 0x04
+_NULL = 0x05
+_OBJECT_IDENTIFIER = 0x06
+
+_MAX_INTEGER = 0x7fffffff
+
+# the only value ever seen in read requests
+_NULL_VALUE = rfc1902.Null('')
+
+
+class Request(object):
+    """SNMP v1/v2c read request as seen by the codec"""
+    __slots__ = ('version', 'community', 'pdu_type', 'request_id',
+                 'non_repeaters', 'max_repetitions', 'var_binds')
+
+
+def _read_tlv(data, pos, end):
+    """Return tag, start and end of contents of TLV at `pos`"""
+    if pos + 2 > end:
+        raise ValueError('truncated TLV')
+
+    tag = data[pos]
+    length = data[pos + 1]
+
+    pos += 2
+
+    if length & 0x80:
+        size = length & 0x7f
+
+        # indefinite or absurdly long length form
+        if not size or size > 4 or pos + size > end:
+            raise ValueError('unsupported length')
+
+        length = 0
+
+        for octet in data[pos:pos + size]:
+            length = length << 8 | octet
+
+        pos += size
+
+    if pos + length > end:
+        raise ValueError('truncated TLV')
+
+    return tag, pos, pos + length
+
+
+def _read_integer(data, pos, end):
+    tag, start, pos = _read_tlv(data, pos, end)
+
+    if tag != _INTEGER or start == pos:
+        raise ValueError('INTEGER expected')
+
+    value = data[start]
+
+    if value & 0x80:
+        value -= 0x100
+
+    for octet in data[start + 1:pos]:
+        value = value << 8 | octet
+
+    return value, pos
+
+
+def _decode_oid(data, pos, end):
+    arcs = []
+    arc = 0
+
+    for octet in data[pos:end]:
+        # non-minimal sub-identifier encoding
+        if octet == 0x80 and not arc:
+            raise ValueError('malformed OBJECT IDENTIFIER')
+
+        arc = arc << 7 | octet & 0x7f
+
+        if not octet & 0x80:
+            arcs.append(arc)
+            arc = 0
+
+    if not arcs or data[end - 1] & 0x80:
+        raise ValueError('malformed OBJECT IDENTIFIER')
+
+    first = arcs[0]
+
+    if first < 40:
+        arcs[0:1] = 0, first
+
+    elif first < 80:
+        arcs[0:1] = 1, first - 40
+
+    else:
+        arcs[0:1] = 2, first - 80
+
+    return tuple(arcs)
+
+
+def decode_request(whole_msg):
+    """Decode SNMP v1/v2c GET, GETNEXT or GETBULK request message.
+
+    Returns a pair of `Request` and the rest of `whole_msg` or `None`
+    if the message has to be handled by the full-blown pyasn1 codec.
+    """
+    data = bytearray(whole_msg)
+
+    try:
+        tag, pos, msg_end = _read_tlv(data, 0, len(data))
+
+        if tag != _SEQUENCE:
+            return
+
+        version, pos = _read_integer(data, pos, msg_end)
+
+        if version not in (0, 1):
+            return
+
+        tag, start, pos = _read_tlv(data, pos, msg_end)
+
+        if tag != _OCTET_STRING:
+            return
+
+        community = bytes(data[start:pos])
+
+        pdu_type, pos, pdu_end = _read_tlv(data, pos, msg_end)
+
+        if (pdu_type not in (GET, GETNEXT, GETBULK) or
+                pdu_type == GETBULK and not version or pdu_end != msg_end):
+            return
+
+        request_id, pos = _read_integer(data, pos, pdu_end)
+
+        non_repeaters, pos = _read_integer(data, pos, pdu_end)
+        max_repetitions, pos = _read_integer(data, pos, pdu_end)
+
+        # leave out-of-range values to pyasn1 to complain about
+        if not -_MAX_INTEGER - 1 <= request_id <= _MAX_INTEGER:
+            return
+
+        if pdu_type == GETBULK:
+            if not (0 <= non_repeaters <= _MAX_INTEGER and
+                    0 <= max_repetitions <= _MAX_INTEGER):
+                return
+
+        elif non_repeaters or max_repetitions:
+            return
+
+        tag, pos, end = _read_tlv(data, pos, pdu_end)
+
+        if tag != _SEQUENCE or end != pdu_end:
+            return
+
+        var_binds = []
+
+        while pos < end:
+            tag, pos, var_bind_end = _read_tlv(data, pos, end)
+
+            if tag != _SEQUENCE:
+                return
+
+            tag, start, pos = _read_tlv(data, pos, var_bind_end)
+
+            if tag != _OBJECT_IDENTIFIER:
+                return
+
+            oid = _decode_oid(data, start, pos)
+
+            tag, start, pos = _read_tlv(data, pos, var_bind_end)
+
+            if tag != _NULL or start != pos or pos != var_bind_end:
+                return
+
+            var_binds.append((rfc1902.ObjectName(oid), _NULL_VALUE))
+
+    except ValueError:
+        return
+
+    request = Request()
+    request.version = version
+    request.community = rfc1902.OctetString(community)
+    request.pdu_type = pdu_type
+    request.request_id = request_id
+    request.non_repeaters = non_repeaters
+    request.max_repetitions = max_repetitions
+    request.var_binds = var_binds
+
+    return request, whole_msg[msg_end:]
+
+
+def decode_response_header(whole_msg):
+    """Decode header of SNMP v1/v2c response message.
+
+    Returns a tuple of request ID, error status and error index or
+    `None` if `whole_msg` is not a response message.
+    """
+    data = bytearray(whole_msg)
+
+    try:
+        tag, pos, msg_end = _read_tlv(data, 0, len(data))
+
+        if tag != _SEQUENCE:
+            return
+
+        version, pos = _read_integer(data, pos, msg_end)
+
+        tag, start, pos = _read_tlv(data, pos, msg_end)
+
+        if tag != _OCTET_STRING:
+            return
+
+        pdu_type, pos, pdu_end = _read_tlv(data, pos, msg_end)
+
+        if pdu_type != RESPONSE:
+            return
+
+        request_id, pos = _read_integer(data, pos, pdu_end)
+        error_status, pos = _read_integer(data, pos, pdu_end)
+        error_index, pos = _read_integer(data, pos, pdu_end)
+
+    except ValueError:
+        return
+
+    return request_id, error_status, error_index
+
+
+def _encode_tlv(tag, contents):
+    length = len(contents)
+
+    if length < 0x80:
+        return bytearray((tag, length)) + contents
+
+    octets = bytearray()
+
+    while length:
+        octets.insert(0, length & 0xff)
+        length >>= 8
+
+    return bytearray((tag, 0x80 | len(octets))) + octets + contents
+
+
+def _encode_integer(value):
+    # size the way pyasn1 does: by magnitude, so that e.g. -128
+    # takes two octets
+    octets = bytearray(abs(value).bit_length() // 8 + 1)
+
+    for idx in range(len(octets) - 1, -1, -1):
+        octets[idx] = value & 0xff
+        value >>= 8
+
+    return octets
+
+
+def _encode_base128(value, octets):
+    chunk = bytearray((value & 0x7f,))
+
+    value >>= 7
+
+    while value:
+        chunk.insert(0, 0x80 | value & 0x7f)
+        value >>= 7
+
+    octets.extend(chunk)
+
+
+def _encode_oid(oid):
+    if len(oid) < 2:
+        raise ValueError('short OBJECT IDENTIFIER')
+
+    first, second = oid[0], oid[1]
+
+    if first > 2 or first < 2 and second > 39:
+        raise ValueError('malformed OBJECT IDENTIFIER')
+
+    octets = bytearray()
+
+    _encode_base128(first * 40 + second, octets)
+
+    for arc in oid[2:]:
+        _encode_base128(arc, octets)
+
+    return octets
+
+
+def _encode_integer_value(value):
+    return _encode_integer(int(value))
+
+
+def _encode_octets_value(value):
+    return bytearray(value.asOctets())
+
+
+def _encode_oid_value(value):
+    return _encode_oid(value.asTuple())
+
+
+def _encode_null_value(value):
+    return bytearray()
+
+
+# value types encoded by the codec on its own
+_VALUE_ENCODERS = {
+    rfc1902.Integer.tagSet: (0x02, _encode_integer_value),
+    rfc1902.OctetString.tagSet: (0x04, _encode_octets_value),
+    univ.Null.tagSet: (0x05, _encode_null_value),
+    rfc1902.ObjectName.tagSet: (0x06, _encode_oid_value),
+    rfc1902.IpAddress.tagSet: (0x40, _encode_octets_value),
+    rfc1902.Counter32.tagSet: (0x41, _encode_integer_value),
+    rfc1902.Gauge32.tagSet: (0x42, _encode_integer_value),
+    rfc1902.TimeTicks.tagSet: (0x43, _encode_integer_value),
+    rfc1902.Opaque.tagSet: (0x44, _encode_octets_value),
+    rfc1902.Counter64.tagSet: (0x46, _encode_integer_value),
+    rfc1905.NoSuchObject.tagSet: (0x80, _encode_null_value),
+    rfc1905.NoSuchInstance.tagSet: (0x81, _encode_null_value),
+    rfc1905.EndOfMibView.tagSet: (0x82, _encode_null_value),
+}
+
+
+def encode_value(value):
+    """Encode SNMP value into BER, unusual values get encoded by pyasn1"""
+    try:
+        tag, encode = _VALUE_ENCODERS[value.tagSet]
+
+        return _encode_tlv(tag, encode(value))
+
+    except Exception:
+        return bytearray(encoder.encode(value))
+
+
+def encode_var_bind(oid, value):
+    """Encode var-bind into BER"""
+    try:
+        oid = _encode_tlv(_OBJECT_IDENTIFIER, _encode_oid(tuple(oid)))
+
+    except Exception:
+        oid = bytearray(encoder.encode(rfc1902.ObjectName(oid)))
+
+    return _encode_tlv(_SEQUENCE, oid + encode_value(value))
+
+
+class EncodedVarBind(tuple):
+    """OID-value pair carrying its ready-made BER encoding.
+
+    Behaves as a plain var-bind, but gets into response message as is.
+    """
+
+    def __new__(cls, oid, value):
+        var_bind = tuple.__new__(cls, (oid, value))
+        var_bind.encoded = bytes(encode_var_bind(oid, value))
+        return var_bind
+
+
+def encode_response(request, var_binds, error_status=0, error_index=0):
+    """Encode response message to `request` carrying `var_binds`.
+
+    With non-zero `error_status`, var-binds of the request are sent
+    back instead.
+    """
+    if error_status:
+        var_binds = request.var_binds
+
+    encoded_var_binds = bytearray()
+
+    for var_bind in var_binds:
+        if isinstance(var_bind, EncodedVarBind):
+            encoded_var_binds.extend(var_bind.encoded)
+
+        else:
+            encoded_var_binds.extend(encode_var_bind(*var_bind))
+
+    pdu = (_encode_tlv(_INTEGER, _encode_integer(request.request_id)) +
+           _encode_tlv(_INTEGER, _encode_integer(error_status)) +
+           _encode_tlv(_INTEGER, _encode_integer(error_index)) +
+           _encode_tlv(_SEQUENCE, encoded_var_binds))
+
+    msg = (_encode_tlv(_INTEGER, _encode_integer(request.version)) +
+           _encode_tlv(_OCTET_STRING,
+                       bytearray(request.community.asOctets())) +
+           _encode_tlv(RESPONSE, pdu))
+
+    return bytes(_encode_tlv(_SEQUENCE, msg))
@@ -0,0 +1,588 @@
+#
+# This file is part of snmpsim software.
+#
+# Copyright (c) 2010-2019, Ilya Etingof <etingof@gmail.com>
+# License: http://snmplabs.com/snmpsim/license.html
+#
+# SNMP Simulator benchmark tool
+#
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+from pyasn1.codec.ber import encoder
+from pysnmp.proto import api
+
+from snmpsim import codec
+from snmpsim import utils
+
+DESCRIPTION = (
+    'Measure SNMP simulator throughput and latency against generated '
+    'simulation data. Online documentation at http://snmplabs.com/snmpsim')
+
+# responder flavour -> command module
+RESPONDERS = {
+    'v3arch': 'snmpsim.commands.responder',
+    'lite': 'snmpsim.commands.responder_lite',
+}
+
+# workload -> request PDU class
+WORKLOADS = {
+    'get': 'GetRequestPDU',
+    'getnext': 'GetNextRequestPDU',
+    'getbulk': 'GetBulkRequestPDU',
+    'set': 'SetRequestPDU',
+}
+
+SYS_DESCR = (1, 3, 6, 1, 2, 1, 1, 1, 0)
+
+# system objects made writable by `writecache` variation module
+WRITABLE_OIDS = (
+    (1, 3, 6, 1, 2, 1, 1, 4, 0),  # sysContact
+    (1, 3, 6, 1, 2, 1, 1, 5, 0),  # sysName
+    (1, 3, 6, 1, 2, 1, 1, 6, 0),  # sysLocation
+)
+
+IF_NUMBER = (1, 3, 6, 1, 2, 1, 2, 1, 0)
+IF_ENTRY = (1, 3, 6, 1, 2, 1, 2, 2, 1)
+
+# ifTable column -> snmprec tag, value generator
+IF_COLUMNS = (
+    (1, '2', lambda rng, row: row),  # ifIndex
+    (2, '4', lambda rng, row: 'eth%d' % (row - 1)),  # ifDescr
+    (3, '2', lambda rng, row: 6),  # ifType
+    (4, '2', lambda rng, row: rng.choice((1500, 9000))),  # ifMtu
+    (5, '66', lambda rng, row: rng.choice((10, 100, 1000)) * 1000000),  # ifSpeed
+    (6, '4x', lambda rng, row: '%012x' % rng.getrandbits(48)),  # ifPhysAddress
+    (7, '2', lambda rng, row: 1),  # ifAdminStatus
+    (8, '2', lambda rng, row: rng.choice((1, 2))),  # ifOperStatus
+    (9, '67', lambda rng, row: rng.randint(0, 0xffffffff)),  # ifLastChange
+    (10, '65', lambda rng, row: rng.randint(0, 0xffffffff)),  # ifInOctets
+)
+
+# requests per client to pick from in round-robin fashion
+MESSAGES_PER_CLIENT = 1000
+
+# seconds to wait for responder to start serving (e.g. index data files)
+STARTUP_TIMEOUT = 120
+
+# seconds to wait for responder to shut down before killing it
+SHUTDOWN_TIMEOUT = 10
+
+
+def _format_oid(oid):
+    return '.'.join([str(x) for x in oid])
+
+
+def _generate_data(data_dir, data_files, records, rng):
+    """Write simulation data files resembling a simple network device.
+
+    Every data file consists of a few system objects (some of them
+    writable) and ifTable sized to make up `records` records.
+
+    Returns the list of SNMP community names the data files are served
+    under and the list of readable OIDs.
+    """
+    rows = max(1, (records - len(WRITABLE_OIDS) - 2) // len(IF_COLUMNS))
+
+    oids = [SYS_DESCR] + list(WRITABLE_OIDS) + [IF_NUMBER]
+    oids.extend(IF_ENTRY + (column, row)
+                for column, _, _ in IF_COLUMNS
+                for row in range(1, rows + 1))
+
+    communities = []
+
+    for idx in range(data_files):
+        community = 'agent%05d' % idx
+
+        with open(os.path.join(data_dir, community + '.snmprec'), 'w') as f:
+            f.write('%s|4|SNMP Simulator benchmark agent #%d\n' % (
+                _format_oid(SYS_DESCR), idx))
+            f.write('%s|4:writecache|value=admin@example.com\n' % (
+                _format_oid(WRITABLE_OIDS[0])))
+            f.write('%s|4:writecache|value=%s\n' % (
+                _format_oid(WRITABLE_OIDS[1]), community))
+            f.write('%s|4:writecache|value=rack %d\n' % (
+                _format_oid(WRITABLE_OIDS[2]), idx))
+            f.write('%s|2|%d\n' % (_format_oid(IF_NUMBER), rows))
+
+            for column, tag, value in IF_COLUMNS:
+                for row in range(1, rows + 1):
+                    f.write('%s|%s|%s\n' % (
+                        _format_oid(IF_ENTRY + (column, row)), tag,
+                        value(rng, row)))
+
+        communities.append(community)
+
+    return communities, oids
+
+
+def _build_message(workload, request_id, community, var_binds,
+                   max_repetitions=0):
+    p_mod = api.protoModules[api.protoVersion2c]
+
+    pdu = getattr(p_mod, WORKLOADS[workload])()
+
+    if workload == 'getbulk':
+        p_mod.apiBulkPDU.setDefaults(pdu)
+        p_mod.apiBulkPDU.setMaxRepetitions(pdu, max_repetitions)
+
+    else:
+        p_mod.apiPDU.setDefaults(pdu)
+
+    p_mod.apiPDU.setRequestID(pdu, request_id)
+    p_mod.apiPDU.setVarBinds(pdu, var_binds)
+
+    msg = p_mod.Message()
+
+    p_mod.apiMessage.setDefaults(msg)
+    p_mod.apiMessage.setCommunity(msg, community)
+    p_mod.apiMessage.setPDU(msg, pdu)
+
+    return encoder.encode(msg)
+
+
+def _build_messages(workload, communities, oids, first_request_id, count,
+                    var_binds, max_repetitions, rng):
+    p_mod = api.protoModules[api.protoVersion2c]
+
+    messages = []
+
+    for request_id in range(first_request_id, first_request_id + count):
+        if workload == 'set':
+            request_var_binds = [
+                (oid, p_mod.OctetString('value #%d' % request_id))
+                for oid in rng.sample(
+                    WRITABLE_OIDS, min(var_binds, len(WRITABLE_OIDS)))]
+
+        else:
+            request_var_binds = [
+                (rng.choice(oids), p_mod.Null(''))
+                for _ in range(var_binds)]
+
+        messages.append(
+            (request_id, _build_message(
+                workload, request_id, rng.choice(communities),
+                request_var_binds, max_repetitions)))
+
+    return messages
+
+
+def _run_client(endpoint, messages, deadline, timeout, results):
+    """Send requests one by one till `deadline`, measure response times"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.connect(endpoint)
+    sock.settimeout(timeout)
+
+    latencies = []
+    timeouts = errors = 0
+
+    idx = 0
+
+    while time.time() < deadline:
+        request_id, message = messages[idx]
+
+        idx = (idx + 1) % len(messages)
+
+        started = time.time()
+
+        try:
+            sock.send(message)
+
+            while True:
+                response = codec.decode_response_header(sock.recv(65535))
+
+                # drop late responses to timed out requests
+                if response and response[0] == request_id:
+                    break
+
+        except socket.timeout:
+            timeouts += 1
+            continue
+
+        except socket.error:
+            errors += 1
+            time.sleep(timeout)
+            continue
+
+        latencies.append(time.time() - started)
+
+        if response[1]:
+            errors += 1
+
+    sock.close()
+
+    results.put((latencies, timeouts, errors))
+
+
+def _get_cpu_time(pid):
+    """Return CPU time (in seconds) consumed by `pid` and its children.
+
+    Returns None where process information is not available via /proc.
+    """
+    total = 0
+
+    try:
+        entries = os.listdir('/proc')
+
+    except OSError:
+        return
+
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+
+        try:
+            with open(os.path.join('/proc', entry, 'stat')) as f:
+                stat = f.read()
+
+        except (IOError, OSError):
+            continue
+
+        # skip over process name which may contain anything
+        fields = stat[stat.rfind(')') + 2:].split()
+
+        if int(entry) == pid or int(fields[1]) == pid:
+            total += int(fields[11]) + int(fields[12])  # utime + stime
+
+    return total / float(os.sysconf('SC_CLK_TCK'))
+
+
+def _wait_for_responder(responder, endpoint, communities, timeout):
+    """Wait till every data file is served, return False on failure"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.connect(endpoint)
+    sock.settimeout(0.5)
+
+    p_mod = api.protoModules[api.protoVersion2c]
+
+    deadline = time.time() + timeout
+
+    try:
+        for request_id, community in enumerate(communities):
+            message = _build_message(
+                'get', request_id, community, [(SYS_DESCR, p_mod.Null(''))])
+
+            while True:
+                if responder.poll() is not None or time.time() > deadline:
+                    return False
+
+                try:
+                    sock.send(message)
+
+                    response = codec.decode_response_header(sock.recv(65535))
+
+                except socket.error:
+                    time.sleep(0.5)
+                    continue
+
+                if response and response[0] == request_id:
+                    break
+
+    finally:
+        sock.close()
+
+    return True
+
+
+def _stop_responder(responder):
+    responder.terminate()
+
+    deadline = time.time() + SHUTDOWN_TIMEOUT
+
+    while responder.poll() is None:
+        if time.time() > deadline:
+            responder.kill()
+            responder.wait()
+            break
+
+        time.sleep(0.1)
+
+
+def _percentile(values, percent):
+    return values[min(len(values) - 1, int(len(values) * percent / 100.0))]
+
+
+def _run_workload(args, responder, endpoint, workload, communities, oids):
+    rng = random.Random('%s:%s' % (args.seed, workload))
+
+    clients_messages = [
+        _build_messages(
+            workload, communities, oids, idx * MESSAGES_PER_CLIENT + 1,
+            MESSAGES_PER_CLIENT, args.var_binds, args.max_repetitions, rng)
+        for idx in range(args.clients)]
+
+    results = multiprocessing.Queue()
+
+    deadline = time.time() + args.duration
+
+    clients = [
+        multiprocessing.Process(
+            target=_run_client,
+            args=(endpoint, messages, deadline, args.timeout, results))
+        for messages in clients_messages]
+
+    cpu_time = _get_cpu_time(responder.pid)
+
+    started = time.time()
+
+    for client in clients:
+        client.start()
+
+    latencies = []
+    timeouts = errors = 0
+
+    for _ in clients:
+        client_latencies, client_timeouts, client_errors = results.get()
+
+        latencies.extend(client_latencies)
+        timeouts += client_timeouts
+        errors += client_errors
+
+    elapsed = time.time() - started
+
+    if cpu_time is not None:
+        cpu_time = _get_cpu_time(responder.pid) - cpu_time
+
+    for client in clients:
+        client.join()
+
+    latencies.sort()
+
+    requests = len(latencies)
+
+    if requests:
+        line = '%-8s %9d %9d %9d %10.1f %9.3f %9.3f' % (
+            workload, requests, timeouts, errors, requests / elapsed,
+            _percentile(latencies, 50) * 1000,
+            _percentile(latencies, 99) * 1000)
+
+        if cpu_time is None:
+            line += ' %12s' % 'n/a'
+
+        else:
+            line += ' %12.1f' % (cpu_time / requests * 1000000)
+
+    else:
+        line = '%-8s %9d %9d %9d %10s %9s %9s %12s' % (
+            workload, requests, timeouts, errors, 'n/a', 'n/a', 'n/a', 'n/a')
+
+    sys.stdout.write(line + '\n')
+    sys.stdout.flush()
+
+
+def _parse_endpoint(arg):
+    try:
+        host, port = arg.split(':')
+        return host, int(port)
+
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'Malformed network endpoint address %s' % arg)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+
+    parser.add_argument(
+        '-v', '--version', action='version',
+        version=utils.TITLE)
+
+    parser.add_argument(
+        '--responder', choices=sorted(RESPONDERS), default='v3arch',
+        help='Command responder to benchmark: full-blown SNMPv1/v2c/v3 '
+             'one or the lightweight SNMPv1/v2c one')
+
+    parser.add_argument(
+        '--data-files', type=int, default=1, metavar='<COUNT>',
+        help='Number of simulation data files to generate')
+
+    parser.add_argument(
+        '--records', type=int, default=1000, metavar='<COUNT>',
+        help='Number of records in each simulation data file')
+
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        help='Seed for generating simulation data and requests')
+
+    parser.add_argument(
+        '--workload', dest='workloads', choices=sorted(WORKLOADS),
+        action='append',
+        help='Kind of SNMP requests to fire at the responder, may be given '
+             'more than once. Default is all of them.')
+
+    parser.add_argument(
+        '--clients', type=int, default=4, metavar='<COUNT>',
+        help='Number of client processes sending requests concurrently')
+
+    parser.add_argument(
+        '--duration', type=float, default=10, metavar='<SECONDS>',
+        help='For how long to run each workload')
+
+    parser.add_argument(
+        '--var-binds', type=int, default=1, metavar='<COUNT>',
+        help='Number of variable bindings in each request')
+
+    parser.add_argument(
+        '--max-repetitions', type=int, default=25, metavar='<COUNT>',
+        help='Max-repetitions value of GETBULK requests')
+
+    parser.add_argument(
+        '--timeout', type=float, default=1, metavar='<SECONDS>',
+        help='Response timeout')
+
+    parser.add_argument(
+        '--agent-udpv4-endpoint', type=_parse_endpoint,
+        metavar='<X.X.X.X:NNNNN>',
+        help='UDP/IPv4 address for the responder to listen on. Default is '
+             'a random loopback port.')
+
+    parser.add_argument(
+        '--work-dir', type=str, metavar='<DIR>',
+        help='Keep generated simulation data, index and responder log in '
+             'this directory rather than in a temporary one')
+
+    parser.add_argument(
+        '--process-user', type=str,
+        help='If run as root, have the responder switch to this user')
+
+    parser.add_argument(
+        '--process-group', type=str,
+        help='If run as root, have the responder switch to this group')
+
+    parser.add_argument(
+        'responder_args', nargs=argparse.REMAINDER,
+        help='Further command-line options to pass to the responder, '
+             'e.g. "-- --workers 4"')
+
+    args = parser.parse_args()
+
+    responder_args = args.responder_args
+
+    if responder_args and responder_args[0] == '--':
+        responder_args = responder_args[1:]
+
+    if args.data_files < 1 or args.records < 1 or args.clients < 1:
+        sys.stderr.write(
+            'ERROR: data files, records and clients must be positive\r\n')
+        parser.print_usage(sys.stderr)
+        return 1
+
+    if args.agent_udpv4_endpoint:
+        endpoint = args.agent_udpv4_endpoint
+
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(('127.0.0.1', 0))
+        endpoint = sock.getsockname()
+        sock.close()
+
+    if args.work_dir:
+        work_dir = args.work_dir
+
+        if not os.path.exists(work_dir):
+            os.makedirs(work_dir)
+
+    else:
+        work_dir = tempfile.mkdtemp(prefix='snmpsim-bench-')
+
+        # responder might be running as a different user
+        os.chmod(work_dir, 0o755)
+
+    data_dir = os.path.join(work_dir, 'data')
+    cache_dir = os.path.join(work_dir, 'cache')
+
+    for path in data_dir, cache_dir:
+        if os.path.exists(path):
+            shutil.rmtree(path)
+
+        os.mkdir(path)
+
+    if os.getuid() == 0 and args.process_user and args.process_group:
+        import grp
+        import pwd
+
+        os.chown(cache_dir, pwd.getpwnam(args.process_user).pw_uid,
+                 grp.getgrnam(args.process_group).gr_gid)
+
+    sys.stderr.write(
+        '# Generating %d data files of %d records at %s\r\n' % (
+            args.data_files, args.records, data_dir))
+
+    communities, oids = _generate_data(
+        data_dir, args.data_files, args.records, random.Random(args.seed))
+
+    command = [
+        sys.executable, '-m', RESPONDERS[args.responder],
+        '--data-dir', data_dir, '--cache-dir', cache_dir,
+        '--agent-udpv4-endpoint', '%s:%s' % endpoint,
+        '--log-level', 'error'
+    ]
+
+    if args.process_user:
+        command.extend(['--process-user', args.process_user])
+
+    if args.process_group:
+        command.extend(['--process-group', args.process_group])
+
+    command.extend(responder_args)
+
+    log_file = os.path.join(work_dir, 'responder.log')
+
+    sys.stderr.write('# Starting %s\r\n' % ' '.join(command))
+
+    with open(log_file, 'w') as log:
+        responder = subprocess.Popen(command, stdout=log, stderr=log)
+
+    try:
+        if not _wait_for_responder(
+                responder, endpoint, communities, STARTUP_TIMEOUT):
+            with open(log_file) as log:
+                sys.stderr.write(
+                    'ERROR: responder failed to start serving data '
+                    'files:\r\n%s\r\n' % log.read())
+            return 1
+
+        sys.stdout.write(
+            '%-8s %9s %9s %9s %10s %9s %9s %12s\n' % (
+                'workload', 'requests', 'timeouts', 'errors', 'req/sec',
+                'p50 ms', 'p99 ms', 'CPU us/req'))
+
+        for workload in args.workloads or sorted(WORKLOADS):
+            _run_workload(
+                args, responder, endpoint, workload, communities, oids)
+
+    finally:
+        _stop_responder(responder)
+
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return 0
+
+
+if __name__ == '__main__':
+    try:
+        rc = main()
+
+    except KeyboardInterrupt:
+        sys.stderr.write('shutting down process...')
+        rc = 0
+
+    except Exception:
+        sys.stderr.write('process terminated: %s' % sys.exc_info()[1])
+
+        for line in traceback.format_exception(*sys.exc_info()):
+            sys.stderr.write(line.replace('\n', ';'))
+        rc = 1
+
+    sys.exit(rc)
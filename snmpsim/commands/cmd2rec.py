@@ -256,6 +256,12 @@ def main():
         record = variation.RECORD_TYPES[args.destination_record_type]
         args.output_file = record.open(args.output_file, 'wb')
 
+    elif variation.RECORD_TYPES[args.destination_record_type].embedded_index:
+        sys.stderr.write(
+            'ERROR: --output-file is required for %s records\r\n' % (
+                args.destination_record_type))
+        return 1
+
     else:
         args.output_file = sys.stdout
 
@@ -586,7 +592,7 @@ def main():
                     'total': cb_ctx['total'],
                     'iteration': cb_ctx['iteration'],
                     'reqTime': cb_ctx['reqTime'],
-                    'args.start_object': args.start_object,
+                    'startOID': args.start_object,
                     'stopOID': args.stop_object,
                     'stopFlag': stop_flag,
                     'variationModule': variation_module
@@ -0,0 +1,425 @@
+#
+# This file is part of snmpsim software.
+#
+# Copyright (c) 2010-2019, Ilya Etingof <etingof@gmail.com>
+# License: http://snmplabs.com/snmpsim/license.html
+#
+# SNMP Simulator synthetic data files generator
+#
+import argparse
+import binascii
+import collections
+import heapq
+import os
+import random
+import sys
+import traceback
+
+from pysnmp.proto import rfc1902
+
+from snmpsim import confdir
+from snmpsim import synthesis
+from snmpsim import utils
+from snmpsim.error import SnmpsimError
+from snmpsim.record import snmprec
+from snmpsim.record.search.file import get_record
+
+DESCRIPTION = (
+    'Generates any number of SNMP simulation data files shaped after '
+    'template data files. Fills SNMP conceptual tables with random values '
+    'and binds some of the records to variation modules. Online '
+    'documentation at http://snmplabs.com/snmpsim')
+
+# default template, looked up in simulation data directories
+TEMPLATE_FILE = 'public.snmprec'
+
+# types of values simulated by `numeric` variation module
+NUMERIC_TYPES = (
+    rfc1902.Counter32,
+    rfc1902.Counter64,
+    rfc1902.TimeTicks,
+    rfc1902.Gauge32,
+    rfc1902.Integer32,
+)
+
+
+class _Column(object):
+    """Conceptual table column as seen in template data file"""
+
+    def __init__(self, oid, tag, value, syntax, mirrors_index):
+        self.oid = oid
+        self.tag = tag
+        self.value = value
+        self.syntax = syntax
+        self.mirrors_index = mirrors_index
+
+
+class _Template(object):
+    """Structure of template data file.
+
+    SNMP conceptual tables are recognized by their shape: `table.1`
+    entry holding at least two columns, all of them having rows out of
+    the same set of row indices. Tables indexed by a single integer get
+    filled with rows of random values. The rest of the records (scalars,
+    tables indexed by several sub-identifiers or by strings) are copied
+    into generated data files as is.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        record = snmprec.SnmprecRecord()
+
+        # (OID, tag, text value, value)
+        records = []
+
+        with record.open(path) as f:
+            line_no = 0
+
+            while True:
+                line, line_no, _ = get_record(f, line_no)
+
+                if not line:
+                    break
+
+                try:
+                    oid, tag, value = record.grammar.parse(line)
+
+                    oid = tuple(int(x) for x in oid.split('.'))
+
+                    if ':' in tag:
+                        syntax = None  # variation module record
+
+                    else:
+                        _, _, syntax = record.evaluate_value(oid, tag, value)
+
+                except (SnmpsimError, ValueError) as exc:
+                    raise SnmpsimError(
+                        'Broken record in template %s line %s: '
+                        '%s' % (path, line_no, exc))
+
+                records.append((oid, tag, value, syntax))
+
+        records.sort(key=lambda x: x[0])
+
+        # entry OID -> column -> row indices, as if any sub-identifier
+        # 1 in OID could be that of `table.1` entry
+        entries = collections.defaultdict(
+            lambda: collections.defaultdict(set))
+
+        for oid, _, _, _ in records:
+            for pos in range(1, len(oid) - 2):
+                if oid[pos] == 1 and oid[pos + 2:] != (0,):
+                    entries[oid[:pos + 1]][oid[pos + 1]].add(oid[pos + 2:])
+
+        tables = set()
+
+        for entry, columns in entries.items():
+            rows = max(columns.values(), key=len)
+
+            # columns of a table hold the same (or sparse) rows
+            if len(columns) > 1 and all(x <= rows for x in columns.values()):
+                tables.add(entry)
+
+        # column OID -> [(row index, tag, text value, value)]
+        cells = collections.OrderedDict()
+
+        # copied as is
+        self.records = []
+
+        for oid, tag, value, syntax in records:
+            for pos in range(1, len(oid) - 2):
+                if oid[:pos + 1] in tables:
+                    break
+
+            else:
+                pos = None
+
+            if (pos is not None and len(oid) == pos + 3 and oid[-1] and
+                    all(len(x) == 1 for x in
+                        entries[oid[:pos + 1]][oid[pos + 1]])):
+                cells.setdefault(oid[:-1], []).append(
+                    (oid[-1], tag, value, syntax))
+
+            else:
+                self.records.append((oid, tag, value, syntax))
+
+        self.columns = []
+
+        for oid, column_cells in cells.items():
+            index, tag, value, syntax = column_cells[0]
+
+            # e.g. ifIndex
+            mirrors_index = isinstance(syntax, rfc1902.Integer32) and all(
+                syntax is not None and int(syntax) == index
+                for index, _, _, syntax in column_cells)
+
+            self.columns.append(
+                _Column(oid, tag, value, syntax, mirrors_index))
+
+
+class _Generator(object):
+    """Write records of a single data file to a file object"""
+
+    def __init__(self, template, rows, rng, variation_density):
+        self._template = template
+        self._rows = rows
+        self._rng = rng
+        self._variation_density = variation_density
+        self._synthesizer = synthesis.ValueSynthesizer(rng=rng)
+        self._record = snmprec.SnmprecRecord()
+
+    def _format(self, oid, tag, value, syntax):
+        if syntax is None:
+            return self._record.grammar.build(
+                self._record.format_oid(oid), tag, value)
+
+        if (self._variation_density and
+                self._rng.random() < self._variation_density):
+            line = self._format_variation(oid, syntax)
+
+            if line:
+                return line
+
+        return self._record.format(oid, syntax)
+
+    def _format_variation(self, oid, syntax):
+        """Return record serving `syntax` value by variation module.
+
+        Returns None if none of the modules fits value type.
+        """
+        if isinstance(syntax, (rfc1902.Counter32, rfc1902.Counter64)):
+            module, options = 'numeric', 'rate=%s,initial=%d,cumulative=1' % (
+                self._rng.choice((0.1, 1, 10, 100)), syntax)
+
+        elif isinstance(syntax, rfc1902.TimeTicks):
+            module, options = 'numeric', 'rate=100,initial=%d' % syntax
+
+        elif isinstance(syntax, NUMERIC_TYPES):
+            module, options = 'numeric', (
+                'scale=%d,rate=0.01,deviation=1,function=cos,'
+                'min=0' % max(1, int(syntax)))
+
+        elif isinstance(syntax, rfc1902.OctetString):
+            module, options = 'writecache', 'hexvalue=%s' % (
+                binascii.hexlify(syntax.asOctets()).decode('ascii'))
+
+        elif isinstance(syntax, rfc1902.ObjectIdentifier):
+            module, options = 'writecache', 'value=%s' % syntax.prettyPrint()
+
+        else:
+            return
+
+        return self._record.grammar.build(
+            self._record.format_oid(oid),
+            '%s:%s' % (self._record.grammar.get_tag_by_type(syntax), module),
+            options)
+
+    def _records(self):
+        for oid, tag, value, syntax in self._template.records:
+            yield oid, self._format(oid, tag, value, syntax)
+
+    def _column(self, column):
+        for index in range(1, self._rows + 1):
+            oid = column.oid + (index,)
+
+            if column.syntax is None:
+                value = None
+
+            elif column.mirrors_index:
+                value = column.syntax.clone(index)
+
+            else:
+                try:
+                    value = self._synthesizer.synthesize(column.syntax)
+
+                except SnmpsimError:
+                    value = column.syntax  # e.g. Null
+
+            yield oid, self._format(oid, column.tag, column.value, value)
+
+    def write(self, output_file):
+        """Write records in OID order, return the number of records"""
+        records = heapq.merge(
+            self._records(),
+            *[self._column(x) for x in self._template.columns])
+
+        count = 0
+
+        for oid, line in records:
+            output_file.write(line)
+
+            count += 1
+
+        return count
+
+
+def _find_template():
+    for path in confdir.data:
+        path = os.path.join(path, TEMPLATE_FILE)
+
+        if os.path.exists(path):
+            return path
+
+    raise SnmpsimError(
+        'Template data file %s not found in %s' % (
+            TEMPLATE_FILE, ', '.join(confdir.data)))
+
+
+def _parse_density(arg):
+    try:
+        density = float(arg)
+
+    except ValueError:
+        density = -1
+
+    if not 0 <= density <= 1:
+        raise argparse.ArgumentTypeError(
+            'Variation density must be between 0 and 1: %s' % arg)
+
+    return density
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+
+    parser.add_argument(
+        '-v', '--version', action='version',
+        version=utils.TITLE)
+
+    parser.add_argument(
+        '--quiet', action='store_true',
+        help='Do not print out informational messages')
+
+    parser.add_argument(
+        '--template-file', dest='template_files', metavar='<FILE>',
+        action='append', type=str,
+        help='SNMP simulation data file to shape generated data files '
+             'after, may be given more than once to have generated data '
+             'files alternate between templates. Default is %s from '
+             'simulation data directory.' % TEMPLATE_FILE)
+
+    parser.add_argument(
+        '--output-dir', metavar='<DIR>', type=str, required=True,
+        help='Directory to write generated SNMP simulation data files to')
+
+    parser.add_argument(
+        '--file-name-prefix', metavar='<PREFIX>', type=str, default='agent',
+        help='Generated data file names (hence SNMP community names) '
+             'are made of this prefix and sequence number')
+
+    parser.add_argument(
+        '--data-files', metavar='<COUNT>', type=int, default=1,
+        help='Number of SNMP simulation data files to generate')
+
+    parser.add_argument(
+        '--records', metavar='<COUNT>', type=int,
+        help='Approximate number of records in each generated data file, '
+             'tables are sized to make up at most this many records. '
+             'Ignored if --table-size is given.')
+
+    parser.add_argument(
+        '--table-size', metavar='<COUNT>', type=int,
+        help='Generate SNMP conceptual tables with this many rows, '
+             'default is 10')
+
+    parser.add_argument(
+        '--variation-density', metavar='<0..1>', type=_parse_density,
+        default=0,
+        help='Share of records to bind to variation modules (numeric or '
+             'writecache, depending on value type)')
+
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        help='Random number generator seed, same seed yields same '
+             'data files')
+
+    args = parser.parse_args()
+
+    if (args.data_files < 1 or args.records is not None and
+            args.records < 1 or args.table_size is not None and
+            args.table_size < 1):
+        sys.stderr.write(
+            'ERROR: data files, records and table size must be positive\r\n')
+        parser.print_usage(sys.stderr)
+        return 1
+
+    try:
+        templates = [
+            _Template(x) for x in args.template_files or [_find_template()]]
+
+    except (IOError, OSError, SnmpsimError) as exc:
+        sys.stderr.write('ERROR: %s\r\n' % exc)
+        return 1
+
+    if not os.path.exists(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    total_count = 0
+
+    for idx in range(args.data_files):
+        template = templates[idx % len(templates)]
+
+        rows = args.table_size
+
+        if rows is None:
+            if args.records and template.columns:
+                rows = ((args.records - len(template.records)) //
+                        len(template.columns))
+
+                if rows < 1:
+                    sys.stderr.write(
+                        'ERROR: template %s takes at least %d records\r\n' % (
+                            template.path,
+                            len(template.records) + len(template.columns)))
+                    return 1
+
+            else:
+                rows = 10
+
+        # every data file gets a random sequence of its own, so any of
+        # them can be reproduced regardless of the others
+        rng = random.Random('%s:%s' % (args.seed, idx))
+
+        generator = _Generator(template, rows, rng, args.variation_density)
+
+        path = os.path.join(
+            args.output_dir, '%s%05d%s%s' % (
+                args.file_name_prefix, idx, os.path.extsep,
+                snmprec.SnmprecRecord.ext))
+
+        with open(path, 'wb') as output_file:
+            count = generator.write(output_file)
+
+        total_count += count
+
+        if not args.quiet:
+            sys.stderr.write(
+                '# Data file %s: %d records shaped after %s, %d table '
+                'rows\r\n' % (path, count, template.path, rows))
+
+    if not args.quiet:
+        sys.stderr.write(
+            '# Data files: %d, records: %d\r\n' % (
+                args.data_files, total_count))
+
+    return 0
+
+
+if __name__ == '__main__':
+    try:
+        rc = main()
+
+    except KeyboardInterrupt:
+        sys.stderr.write('shutting down process...')
+        rc = 0
+
+    except Exception:
+        sys.stderr.write('process terminated: %s' % sys.exc_info()[1])
+
+        for line in traceback.format_exception(*sys.exc_info()):
+            sys.stderr.write(line.replace('\n', ';'))
+        rc = 1
+
+    sys.exit(rc)
@@ -9,20 +9,19 @@
 import argparse
 import functools
 import os
-import random
 import sys
 import traceback
 
 from pyasn1.error import PyAsn1Error
 from pyasn1.type import univ
 from pysnmp import debug
-from pysnmp.proto import rfc1902
 from pysnmp.smi import builder
 from pysnmp.smi import compiler
 from pysnmp.smi import error
 from pysnmp.smi import view
 from pysnmp.smi.rfc1902 import ObjectIdentity
 
+from snmpsim import synthesis
 from snmpsim import utils
 from snmpsim.error import SnmpsimError
 from snmpsim.record import dump
@@ -176,10 +175,6 @@ def main():
         with open(args.string_pool_file) as fl:
             args.string_pool = fl.read().split()
 
-    elif args.string_pool:
-        args.string_pool = ['Jaded', 'zombies', 'acted', 'quaintly', 'but',
-                            'kept', 'driving', 'their', 'oxen', 'forward']
-
     if args.output_file:
         ext = os.path.extsep + RECORD_TYPES[args.destination_record_type].ext
 
@@ -201,6 +196,15 @@ def main():
 
             msvcrt.setmode(sys.stdout.fileno(), os.O_BINARY)
 
+    synthesizer = synthesis.ValueSynthesizer(
+        string_pool=args.string_pool,
+        integer32_range=args.integer32_range,
+        unsigned_range=args.unsigned_range,
+        counter_range=args.counter_range,
+        counter64_range=args.counter64_range,
+        gauge_range=args.gauge_range,
+        timeticks_range=args.timeticks_range)
+
     def get_value(syntax, hint='', automatic_values=args.automatic_values):
 
         make_guess = args.automatic_values
@@ -209,57 +213,10 @@ def main():
 
         while True:
             if make_guess:
-                if isinstance(syntax, rfc1902.IpAddress):
-                    val = '.'.join([str(random.randrange(1, 256)) for x in range(4)])
-
-                elif isinstance(syntax, rfc1902.TimeTicks):
-                    val = random.randrange(args.timeticks_range[0], args.timeticks_range[1])
-
-                elif isinstance(syntax, rfc1902.Gauge32):
-                    val = random.randrange(args.gauge_range[0], args.gauge_range[1])
-
-                elif isinstance(syntax, rfc1902.Counter32):
-                    val = random.randrange(args.counter_range[0], args.counter_range[1])
-
-                elif isinstance(syntax, rfc1902.Integer32):
-                    val = random.randrange(args.integer32_range[0], args.integer32_range[1])
-
-                elif isinstance(syntax, rfc1902.Unsigned32):
-                    val = random.randrange(args.unsigned_range[0], args.unsigned_range[1])
-
-                elif isinstance(syntax, rfc1902.Counter64):
-                    val = random.randrange(args.counter64_range[0], args.counter64_range[1])
-
-                elif isinstance(syntax, univ.OctetString):
-                    maxWords = 10
-                    val = ' '.join([args.string_pool[random.randrange(0, len(args.string_pool))]
-                                    for i in range(random.randrange(1, maxWords))])
-
-                elif isinstance(syntax, univ.ObjectIdentifier):
-                    val = '.'.join(['1', '3', '6', '1', '3'] + [
-                        '%d' % random.randrange(0, 255)
-                        for x in range(random.randrange(0, 10))])
-
-                elif isinstance(syntax, rfc1902.Bits):
-                    val = [random.randrange(0, 256)
-                           for x in range(random.randrange(0, 9))]
-
-                else:
-                    val = '?'
-
-            # remove value enumeration
+                val = synthesizer.guess(syntax)
 
             try:
-                if syntax.tagSet == rfc1902.Integer32.tagSet:
-                    return rfc1902.Integer32(syntax.clone(val))
-
-                if syntax.tagSet == rfc1902.Unsigned32.tagSet:
-                    return rfc1902.Unsigned32(syntax.clone(val))
-
-                if syntax.tagSet == rfc1902.Bits.tagSet:
-                    return rfc1902.OctetString(syntax.clone(val))
-
-                return syntax.clone(val)
+                return synthesizer.clone(syntax, val)
 
             except PyAsn1Error as exc:
                 if make_guess == 1:
@@ -458,7 +415,7 @@ def main():
 
             elif isinstance(node, MibScalar):
                 hint = ''
-                if not args.row_hint:
+                if not args.quiet:
                     hint += ('# Scalar %s::%s (type %s)'
                              '\r\n' % (mib_name, sym_name,
                                        node.syntax.__class__.__name__))
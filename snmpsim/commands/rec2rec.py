@@ -31,7 +31,7 @@ from snmpsim.record.search.file import get_record
 
 class SnmprecRecordMixIn(object):
 
-    def evaluateValue(self, oid, tag, value, **context):
+    def evaluate_value(self, oid, tag, value, **context):
         # Variation module reference
         if ':' in tag:
             context['backdoor']['textTag'] = tag
@@ -40,9 +40,9 @@ class SnmprecRecordMixIn(object):
         else:
             return snmprec.SnmprecRecord.evaluate_value(self, oid, tag, value)
 
-    def formatValue(self, oid, value, **context):
+    def format_value(self, oid, value, **context):
         if 'textTag' in context['backdoor']:
-            return self.formatOid(oid), context['backdoor']['textTag'], value
+            return self.format_oid(oid), context['backdoor']['textTag'], value
 
         else:
             return snmprec.SnmprecRecord.format_value(
@@ -58,6 +58,10 @@ class CompressedSnmprecRecord(SnmprecRecordMixIn,
     pass
 
 
+class BinarySnmprecRecord(SnmprecRecordMixIn, snmprec.BinarySnmprecRecord):
+    pass
+
+
 # data file types and parsers
 RECORD_TYPES = {
     dump.DumpRecord.ext: dump.DumpRecord(),
@@ -66,6 +70,7 @@ RECORD_TYPES = {
     walk.WalkRecord.ext: walk.WalkRecord(),
     SnmprecRecord.ext: SnmprecRecord(),
     CompressedSnmprecRecord.ext: CompressedSnmprecRecord(),
+    BinarySnmprecRecord.ext: BinarySnmprecRecord(),
 }
 
 DESCRIPTION = 'SNMP simulation data management and repair tool. Online ' \
@@ -151,8 +156,8 @@ def main():
 
     args = parser.parse_args()
 
-    if not args.mib_source:
-        args.mib_source = ['http://mibs.snmplabs.com/asn1/@mib@']
+    if not args.mib_sources:
+        args.mib_sources = ['http://mibs.snmplabs.com/asn1/@mib@']
 
     args.input_files = [
         RECORD_TYPES[args.source_record_type].open(x)
@@ -167,6 +172,12 @@ def main():
         args.output_file = RECORD_TYPES[args.destination_record_type].open(
             args.output_file, 'wb')
 
+    elif RECORD_TYPES[args.destination_record_type].embedded_index:
+        sys.stderr.write(
+            'ERROR: --output-file is required for %s records\r\n' % (
+                args.destination_record_type))
+        return 1
+
     else:
         args.output_file = sys.stdout
 
@@ -182,8 +193,8 @@ def main():
     if not args.input_files:
         args.input_files.append(sys.stdin)
 
-    if (isinstance(args.start_oid, rfc1902.ObjectIdentity) or
-            isinstance(args.stop_oid, rfc1902.ObjectIdentity)):
+    if (isinstance(args.start_object, rfc1902.ObjectIdentity) or
+            isinstance(args.stop_object, rfc1902.ObjectIdentity)):
 
         mib_builder = builder.MibBuilder()
 
@@ -192,11 +203,11 @@ def main():
         compiler.addMibCompiler(mib_builder, sources=args.mib_sources)
 
         try:
-            if isinstance(args.start_oid, rfc1902.ObjectIdentity):
-                args.start_oid.resolveWithMib(mib_view_controller)
+            if isinstance(args.start_object, rfc1902.ObjectIdentity):
+                args.start_object.resolveWithMib(mib_view_controller)
 
-            if isinstance(args.stop_oid, rfc1902.ObjectIdentity):
-                args.stop_oid.resolveWithMib(mib_view_controller)
+            if isinstance(args.stop_object, rfc1902.ObjectIdentity):
+                args.stop_object.resolveWithMib(mib_view_controller)
 
         except PySnmpError as exc:
             sys.stderr.write('ERROR: %s\r\n' % exc)
@@ -210,8 +221,8 @@ def main():
             sys.stderr.write(
                 '# Input file #%s, processing records from %s till '
                 '%s\r\n' % (args.input_files.index(input_file),
-                            args.start_oid or 'the beginning',
-                            args.stop_oid or 'the end'))
+                            args.start_object or 'the beginning',
+                            args.stop_object or 'the end'))
 
         line_no = 0
 
@@ -255,8 +266,8 @@ def main():
 
                     return 1
 
-            if (args.start_oid and args.start_oid > oid or
-                    args.stop_oid and args.stop_oid < oid):
+            if (args.start_object and args.start_object > oid or
+                    args.stop_object and args.stop_object < oid):
                 skipped_count += 1
                 continue
 
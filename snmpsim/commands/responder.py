@@ -7,9 +7,11 @@
 # SNMP Agent Simulator: fully-fledged SNMP v1/v2c/v3 command responder
 #
 import argparse
+import collections
 import functools
 import os
 import sys
+import time
 import traceback
 from hashlib import md5
 
@@ -20,7 +22,6 @@ from pysnmp import debug as pysnmp_debug
 from pysnmp import error
 from pysnmp.carrier.asyncore.dgram import udp
 from pysnmp.carrier.asyncore.dgram import udp6
-from pysnmp.carrier.asyncore.dispatch import AsyncoreDispatcher
 from pysnmp.entity import config
 from pysnmp.entity import engine
 from pysnmp.entity.rfc3413 import cmdrsp
@@ -30,10 +31,12 @@ from snmpsim import confdir
 from snmpsim import controller
 from snmpsim import daemon
 from snmpsim import datafile
+from snmpsim import dispatch
 from snmpsim import endpoints
 from snmpsim import log
 from snmpsim import utils
 from snmpsim import variation
+from snmpsim import workers
 from snmpsim.error import NoDataNotification
 from snmpsim.error import SnmpsimError
 from snmpsim.reporting.manager import ReportingManager
@@ -68,6 +71,74 @@ DESCRIPTION = (
 V3_OPTIONS = ('SNMPv3 options')
 
 
+class ContextTable(object):
+    """v3arch SNMP context name lookup table.
+
+    Maps data file names (as suggested by `datafile.probe_context`) into
+    SNMP context names and MIB instrumentation controllers the data files
+    are registered under. Requests are resolved by their transport
+    domain, source address, context engine ID and context name, the most
+    recently resolved ones are kept in LRU cache.
+    """
+    cache_size = 4096
+
+    def __init__(self):
+        self._candidates = {}
+        self._resolved = collections.OrderedDict()
+
+    def add(self, candidate, context_name, mib_instrum):
+        self._candidates[univ.OctetString(candidate).asOctets()] = (
+            context_name, mib_instrum)
+
+    def register(self, community_name, context_name, mib_instrum):
+        """Make data file served under `community_name` resolvable"""
+        self.add(context_name, context_name, mib_instrum)
+
+        # context names longer than 32 octets are registered by their hash
+        if len(community_name) > 32:
+            self.add(community_name, context_name, mib_instrum)
+
+        else:
+            self.add(community_name, community_name, mib_instrum)
+
+    def resolve(self, transport_domain, transport_address,
+                context_engine_id, context_name):
+        """Return candidate, context name and MIB instrum serving request.
+
+        Returns `None` if none of candidate data files are registered.
+        """
+        key = (transport_domain, transport_address[0],
+               context_engine_id, context_name)
+
+        try:
+            self._resolved[key] = resolved = self._resolved.pop(key)
+            return resolved
+
+        except KeyError:
+            pass
+
+        resolved = None
+
+        for candidate in datafile.probe_context(
+                transport_domain, transport_address,
+                context_engine_id, context_name):
+
+            try:
+                resolved = (candidate,) + self._candidates[candidate]
+
+            except KeyError:
+                continue
+
+            break
+
+        while self._resolved and len(self._resolved) >= self.cache_size:
+            self._resolved.popitem(last=False)
+
+        self._resolved[key] = resolved
+
+        return resolved
+
+
 def probe_hash_context(responder, snmp_engine):
     """v3arch SNMP context name searcher"""
     execCtx = snmp_engine.observer.getExecutionContext(
@@ -89,41 +160,37 @@ def probe_hash_context(responder, snmp_engine):
     else:
         context_engine_id = context_engine_id.prettyPrint()
 
-    for candidate in datafile.probe_context(
-            transport_domain, transport_address,
-            context_engine_id, context_name):
-
-        if len(candidate) > 32:
-            probed_context_name = md5(candidate).hexdigest()
+    if ReportingManager.stage_timings:
+        started = time.time()
 
-        else:
-            probed_context_name = candidate
+    resolved = responder.context_table.resolve(
+        transport_domain, transport_address, context_engine_id,
+        context_name)
 
-        try:
-            mib_instrum = responder.snmpContext.getMibInstrum(
-                probed_context_name)
+    if resolved:
+        candidate, context_name, mib_instrum = resolved
 
-        except error.PySnmpError:
-            pass
+        log.info(
+            'Using %s selected by candidate %s; transport ID %s, '
+            'source address %s, context engine ID %s, '
+            'community name "%s"', mib_instrum, candidate,
+            log.lazy(univ.ObjectIdentifier, transport_domain),
+            transport_address[0], context_engine_id, context_name)
 
-        else:
-            log.info(
-                'Using %s selected by candidate %s; transport ID %s, '
-                'source address %s, context engine ID %s, '
-                'community name '
-                '"%s"' % (mib_instrum, candidate,
-                          univ.ObjectIdentifier(transport_domain),
-                          transport_address[0], context_engine_id,
-                          probed_context_name))
-            context_name = probed_context_name
-            break
     else:
         mib_instrum = responder.snmpContext.getMibInstrum(context_name)
         log.info(
             'Using %s selected by contextName "%s", transport ID %s, '
-            'source address %s' % (mib_instrum, context_name,
-                                   univ.ObjectIdentifier(transport_domain),
-                                   transport_address[0]))
+            'source address %s', mib_instrum, context_name,
+            log.lazy(univ.ObjectIdentifier, transport_domain),
+            transport_address[0])
+
+    if ReportingManager.stage_timings:
+        ReportingManager.update_metrics(
+            transportDomain=univ.ObjectIdentifier(transport_domain),
+            transportEndpoint=transport_address.getLocalAddress(),
+            data_file=getattr(mib_instrum, 'data_file', None),
+            context_probe_time=time.time() - started)
 
     if not isinstance(mib_instrum, (
             controller.MibInstrumController,
@@ -135,7 +202,64 @@ def probe_hash_context(responder, snmp_engine):
     return context_name
 
 
-class GetCommandResponder(cmdrsp.GetCommandResponder):
+class CommandResponderMixIn(object):
+    """Resolve data files by context table, send delayed responses.
+
+    Responses delayed by variation modules are sent off dispatcher timer.
+    """
+
+    def __init__(self, snmp_engine, snmp_context, context_table):
+        cmdrsp.CommandResponderBase.__init__(self, snmp_engine, snmp_context)
+
+        self.context_table = context_table
+        self._deferred_responses = set()
+
+    def processPdu(self, snmp_engine, *args):
+        dispatch.begin_response()
+
+        try:
+            cmdrsp.CommandResponderBase.processPdu(self, snmp_engine, *args)
+
+        finally:
+            dispatch.end_response()
+
+    def sendVarBinds(self, snmp_engine, state_reference, error_status,
+                     error_index, var_binds):
+        response_delay = dispatch.get_response_delay()
+
+        if not response_delay:
+            cmdrsp.CommandResponderBase.sendVarBinds(
+                self, snmp_engine, state_reference, error_status,
+                error_index, var_binds)
+            return
+
+        # let other requests be served meanwhile
+        self._deferred_responses.add(state_reference)
+
+        snmp_engine.transportDispatcher.call_later(
+            response_delay, self._send_deferred_response, snmp_engine,
+            state_reference, error_status, error_index, var_binds)
+
+    def _send_deferred_response(self, snmp_engine, state_reference,
+                                error_status, error_index, var_binds):
+        self._deferred_responses.discard(state_reference)
+
+        try:
+            cmdrsp.CommandResponderBase.sendVarBinds(
+                self, snmp_engine, state_reference, error_status,
+                error_index, var_binds)
+
+        finally:
+            self.releaseStateInformation(state_reference)
+
+    def releaseStateInformation(self, state_reference):
+        if state_reference not in self._deferred_responses:
+            cmdrsp.CommandResponderBase.releaseStateInformation(
+                self, state_reference)
+
+
+class GetCommandResponder(
+        CommandResponderMixIn, cmdrsp.GetCommandResponder):
     """v3arch GET command handler"""
 
     def handleMgmtOperation(
@@ -151,7 +275,8 @@ class GetCommandResponder(cmdrsp.GetCommandResponder):
             self.releaseStateInformation(state_reference)
 
 
-class SetCommandResponder(cmdrsp.SetCommandResponder):
+class SetCommandResponder(
+        CommandResponderMixIn, cmdrsp.SetCommandResponder):
     """v3arch SET command handler"""
 
     def handleMgmtOperation(
@@ -167,7 +292,8 @@ class SetCommandResponder(cmdrsp.SetCommandResponder):
             self.releaseStateInformation(state_reference)
 
 
-class NextCommandResponder(cmdrsp.NextCommandResponder):
+class NextCommandResponder(
+        CommandResponderMixIn, cmdrsp.NextCommandResponder):
     """v3arch GETNEXT command handler"""
 
     def handleMgmtOperation(
@@ -183,7 +309,8 @@ class NextCommandResponder(cmdrsp.NextCommandResponder):
             self.releaseStateInformation(state_reference)
 
 
-class BulkCommandResponder(cmdrsp.BulkCommandResponder):
+class BulkCommandResponder(
+        CommandResponderMixIn, cmdrsp.BulkCommandResponder):
     """v3arch GETBULK command handler"""
 
     def handleMgmtOperation(
@@ -251,6 +378,11 @@ def main():
         metavar='=<%s[:args]>]' % '|'.join(ReportingManager.REPORTERS),
         default='null', help='Activity metrics reporting method.')
 
+    parser.add_argument(
+        '--stage-timings', action='store_true',
+        help='Report durations of request processing stages, if reporting '
+             'method collects timings')
+
     parser.add_argument(
         '--daemonize', action='store_true',
         help='Disengage from controlling terminal and become a daemon')
@@ -283,6 +415,37 @@ def main():
         '--validate-data', action='store_true',
         help='Validate simulation data files on daemon start-up')
 
+    parser.add_argument(
+        '--index-workers', type=int, default=1,
+        help='Number of processes to build data files indices with')
+
+    parser.add_argument(
+        '--index-backend', choices=datafile.RECORD_INDICES,
+        type=str, default='dbm',
+        help='Simulation data files index implementation: on-disk DBM '
+             'or in-memory sorted OID arrays')
+
+    parser.add_argument(
+        '--mmap-data-files', action='store_true',
+        help='Read simulation data files through read-only memory maps '
+             'rather than buffered file I/O')
+
+    parser.add_argument(
+        '--max-open-data-files', type=int,
+        default=datafile.DataFile.opened_files.max_entries,
+        help='Maximum number of simulation data files to keep open at '
+             'the same time, least recently used ones get closed')
+
+    parser.add_argument(
+        '--value-cache-size', type=int, default=0,
+        help='Maximum number of evaluated static records to cache per '
+             'simulation data file, zero disables caching')
+
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help='Number of worker processes to serve SNMP requests with, '
+             'all listening at the same endpoints through SO_REUSEPORT')
+
     parser.add_argument(
         '--variation-modules-dir', metavar='<DIR>', type=str,
         action='append', default=[],
@@ -438,6 +601,11 @@ configured automatically based on simulation data file paths relative to
     if args.cache_dir:
         confdir.cache = args.cache_dir
 
+    datafile.DataFile.opened_files.max_entries = args.max_open_data_files
+    datafile.DataFile.value_cache_size = args.value_cache_size
+
+    endpoints.TransportEndpointsBase.worker_count = args.workers
+
     if args.variation_modules_dir:
         confdir.variation = args.variation_modules_dir
 
@@ -474,6 +642,8 @@ configured automatically based on simulation data file paths relative to
         try:
             ReportingManager.configure(*args.reporting_method)
 
+            ReportingManager.time_stages(args.stage_timings)
+
         except SnmpsimError as exc:
             sys.stderr.write('%s\r\n' % exc)
             snmp_helper.print_usage(sys.stderr)
@@ -505,17 +675,20 @@ configured automatically based on simulation data file paths relative to
     variation_modules = variation.load_variation_modules(
         confdir.variation, variation_modules_options)
 
-    with daemon.PrivilegesOf(args.process_user, args.process_group):
-        variation.initialize_variation_modules(
-            variation_modules, mode='variating')
+    # worker processes initialize variation modules on their own
+    if args.workers < 2:
+        with daemon.PrivilegesOf(args.process_user, args.process_group):
+            variation.initialize_variation_modules(
+                variation_modules, mode='variating')
 
     def configure_managed_objects(
             data_dirs, data_index_instrum_controller, snmp_engine=None,
-            snmp_context=None):
+            snmp_context=None, context_table=None):
         """Build pysnmp Managed Objects base from data files information"""
 
         _mib_instrums = {}
         _data_files = {}
+        _new_data_files = []
 
         for dataDir in data_dirs:
 
@@ -547,8 +720,11 @@ configured automatically based on simulation data file paths relative to
 
                 else:
                     data_file = datafile.DataFile(
-                        full_path, text_parser, variation_modules)
-                    data_file.index_text(args.force_index_rebuild, args.validate_data)
+                        full_path, text_parser, variation_modules,
+                        indexType=args.index_backend,
+                        memoryMap=args.mmap_data_files)
+
+                    _new_data_files.append(data_file)
 
                     MibController = controller.MIB_CONTROLLERS[data_file.layout]
                     mib_instrum = MibController(data_file)
@@ -576,6 +752,8 @@ configured automatically based on simulation data file paths relative to
                 if len(community_name) <= 32:
                     snmp_context.registerContextName(community_name, mib_instrum)
 
+                context_table.register(community_name, context_name, mib_instrum)
+
                 data_index_instrum_controller.add_data_file(
                     full_path, community_name, context_name)
 
@@ -586,8 +764,17 @@ configured automatically based on simulation data file paths relative to
 
             log.msg.dec_ident()
 
+        errors = datafile.index_data_files(
+            _new_data_files, args.force_index_rebuild, args.validate_data,
+            args.index_workers)
+
+        if errors:
+            raise SnmpsimError(
+                '%d data file(s) could not be indexed' % len(errors))
+
         del _mib_instrums
         del _data_files
+        del _new_data_files
 
     # Bind transport endpoints
     for idx, opt in enumerate(snmp_args):
@@ -601,7 +788,7 @@ configured automatically based on simulation data file paths relative to
 
     # Start configuring SNMP engine(s)
 
-    transport_dispatcher = AsyncoreDispatcher()
+    transport_dispatcher = dispatch.AsyncoreDispatcher()
 
     transport_dispatcher.registerRoutingCbFun(lambda td, t, d: td)
 
@@ -649,13 +836,21 @@ configured automatically based on simulation data file paths relative to
 
                     data_index_instrum_controller = controller.DataIndexInstrumController()
 
-                    with daemon.PrivilegesOf(args.process_user, args.process_group):
-                        configure_managed_objects(
-                            ctx_data_dirs or data_dirs or confdir.data,
-                            data_index_instrum_controller,
-                            snmp_engine,
-                            snmp_context
-                        )
+                    context_table = ContextTable()
+
+                    try:
+                        with daemon.PrivilegesOf(args.process_user, args.process_group):
+                            configure_managed_objects(
+                                ctx_data_dirs or data_dirs or confdir.data,
+                                data_index_instrum_controller,
+                                snmp_engine,
+                                snmp_context,
+                                context_table
+                            )
+
+                    except SnmpsimError as exc:
+                        log.error(exc)
+                        return 1
 
                 # Configure access to data index
 
@@ -782,11 +977,12 @@ configured automatically based on simulation data file paths relative to
                                 '.'.join([str(handler) for handler in transport_domain])))
 
                 # SNMP applications
-                GetCommandResponder(snmp_engine, snmp_context)
-                SetCommandResponder(snmp_engine, snmp_context)
-                NextCommandResponder(snmp_engine, snmp_context)
+                GetCommandResponder(snmp_engine, snmp_context, context_table)
+                SetCommandResponder(snmp_engine, snmp_context, context_table)
+                NextCommandResponder(snmp_engine, snmp_context, context_table)
                 BulkCommandResponder(
-                    snmp_engine, snmp_context).maxVarBinds = local_max_var_binds
+                    snmp_engine, snmp_context,
+                    context_table).maxVarBinds = local_max_var_binds
 
                 log.msg.dec_ident()
 
@@ -910,6 +1106,30 @@ configured automatically based on simulation data file paths relative to
 
     transport_dispatcher.jobStarted(1)  # server job would never finish
 
+    if args.workers > 1:
+        try:
+            with daemon.PrivilegesOf(args.process_user, args.process_group):
+                worker_id = workers.run_workers(args.workers)
+
+        except SnmpsimError as exc:
+            log.error(exc)
+            return 1
+
+        if worker_id is None:
+            transport_dispatcher.closeDispatcher()
+
+            log.info('Process terminated')
+
+            return 0
+
+        endpoints.use_worker_sockets(transport_dispatcher, worker_id)
+
+        with daemon.PrivilegesOf(args.process_user, args.process_group):
+            variation.initialize_variation_modules(
+                variation_modules, mode='variating')
+
+    ReportingManager.start()
+
     with daemon.PrivilegesOf(args.process_user, args.process_group, final=True):
 
         try:
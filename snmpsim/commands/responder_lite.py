@@ -9,6 +9,7 @@
 import argparse
 import os
 import sys
+import time
 import traceback
 
 from pyasn1 import debug as pyasn1_debug
@@ -18,19 +19,21 @@ from pyasn1.type import univ
 from pysnmp import debug as pysnmp_debug
 from pysnmp.carrier.asyncore.dgram import udp
 from pysnmp.carrier.asyncore.dgram import udp6
-from pysnmp.carrier.asyncore.dispatch import AsyncoreDispatcher
 from pysnmp.proto import api
 from pysnmp.proto import rfc1902
 from pysnmp.proto import rfc1905
 
+from snmpsim import codec
 from snmpsim import confdir
 from snmpsim import controller
 from snmpsim import daemon
 from snmpsim import datafile
+from snmpsim import dispatch
 from snmpsim import endpoints
 from snmpsim import log
 from snmpsim import utils
 from snmpsim import variation
+from snmpsim import workers
 from snmpsim.error import NoDataNotification
 from snmpsim.error import SnmpsimError
 from snmpsim.reporting.manager import ReportingManager
@@ -84,6 +87,11 @@ def main():
         metavar='=<%s[:args]>]' % '|'.join(ReportingManager.REPORTERS),
         default='null', help='Activity metrics reporting method.')
 
+    parser.add_argument(
+        '--stage-timings', action='store_true',
+        help='Report durations of request processing stages, if reporting '
+             'method collects timings')
+
     parser.add_argument(
         '--daemonize', action='store_true',
         help='Disengage from controlling terminal and become a daemon')
@@ -116,6 +124,37 @@ def main():
         '--validate-data', action='store_true',
         help='Validate simulation data files on daemon start-up')
 
+    parser.add_argument(
+        '--index-workers', type=int, default=1,
+        help='Number of processes to build data files indices with')
+
+    parser.add_argument(
+        '--index-backend', choices=datafile.RECORD_INDICES,
+        type=str, default='dbm',
+        help='Simulation data files index implementation: on-disk DBM '
+             'or in-memory sorted OID arrays')
+
+    parser.add_argument(
+        '--mmap-data-files', action='store_true',
+        help='Read simulation data files through read-only memory maps '
+             'rather than buffered file I/O')
+
+    parser.add_argument(
+        '--max-open-data-files', type=int,
+        default=datafile.DataFile.opened_files.max_entries,
+        help='Maximum number of simulation data files to keep open at '
+             'the same time, least recently used ones get closed')
+
+    parser.add_argument(
+        '--value-cache-size', type=int, default=0,
+        help='Maximum number of evaluated static records to cache per '
+             'simulation data file, zero disables caching')
+
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help='Number of worker processes to serve SNMP requests with, '
+             'all listening at the same endpoints through SO_REUSEPORT')
+
     parser.add_argument(
         '--variation-modules-dir', metavar='<DIR>', type=str,
         action='append', default=[],
@@ -141,11 +180,27 @@ def main():
         help='Start numbering the last sub-OID of transport endpoint OIDs '
              'starting from this ID')
 
+    parser.add_argument(
+        '--transport-dispatcher', choices=('asyncore', 'asyncio', 'uvloop'),
+        type=str, default='asyncore',
+        help='I/O event loop to serve transport endpoints with: pysnmp '
+             'asyncore dispatcher, asyncio or uvloop-driven asyncio')
+
     parser.add_argument(
         '--max-var-binds', type=int, default=64,
         help='Maximum number of variable bindings to include in a single '
              'response')
 
+    parser.add_argument(
+        '--fast-codec', action='store_true',
+        help='Handle common SNMP v1/v2c GET/GETNEXT/GETBULK messages with '
+             'minimal built-in BER codec rather than pyasn1')
+
+    parser.add_argument(
+        '--pre-encode-values', action='store_true',
+        help='Keep cached static records BER-encoded for the built-in '
+             'codec to put into responses as is')
+
     parser.add_argument(
         '--data-dir', type=str, action='append', metavar='<DIR>',
         dest='data_dirs',
@@ -170,6 +225,13 @@ def main():
     if args.cache_dir:
         confdir.cache = args.cache_dir
 
+    datafile.DataFile.opened_files.max_entries = args.max_open_data_files
+    datafile.DataFile.value_cache_size = args.value_cache_size
+    datafile.DataFile.pre_encode_values = (
+        args.fast_codec and args.pre_encode_values)
+
+    endpoints.TransportEndpointsBase.worker_count = args.workers
+
     if args.variation_modules_dir:
         confdir.variation = args.variation_modules_dir
 
@@ -194,6 +256,8 @@ def main():
         try:
             ReportingManager.configure(*args.reporting_method)
 
+            ReportingManager.time_stages(args.stage_timings)
+
         except SnmpsimError as exc:
             sys.stderr.write('%s\r\n' % exc)
             parser.print_usage(sys.stderr)
@@ -225,9 +289,11 @@ def main():
     variation_modules = variation.load_variation_modules(
         confdir.variation, variation_modules_options)
 
-    with daemon.PrivilegesOf(args.process_user, args.process_group):
-        variation.initialize_variation_modules(
-            variation_modules, mode='variating')
+    # worker processes initialize variation modules on their own
+    if args.workers < 2:
+        with daemon.PrivilegesOf(args.process_user, args.process_group):
+            variation.initialize_variation_modules(
+                variation_modules, mode='variating')
 
     def configure_managed_objects(
             data_dirs, data_index_instrum_controller, snmp_engine=None,
@@ -236,6 +302,7 @@ def main():
 
         _mib_instrums = {}
         _data_files = {}
+        _new_data_files = []
 
         for dataDir in data_dirs:
 
@@ -267,8 +334,11 @@ def main():
 
                 else:
                     data_file = datafile.DataFile(
-                        full_path, text_parser, variation_modules)
-                    data_file.index_text(args.force_index_rebuild, args.validate_data)
+                        full_path, text_parser, variation_modules,
+                        indexType=args.index_backend,
+                        memoryMap=args.mmap_data_files)
+
+                    _new_data_files.append(data_file)
 
                     MibController = controller.MIB_CONTROLLERS[data_file.layout]
                     mib_instrum = MibController(data_file)
@@ -280,7 +350,7 @@ def main():
 
                 log.info('SNMPv1/2c community name: %s' % (community_name,))
 
-                contexts[univ.OctetString(community_name)] = mib_instrum
+                contexts.add(community_name, mib_instrum)
 
                 data_index_instrum_controller.add_data_file(
                     full_path, community_name
@@ -288,18 +358,28 @@ def main():
 
             log.msg.dec_ident()
 
+        errors = datafile.index_data_files(
+            _new_data_files, args.force_index_rebuild, args.validate_data,
+            args.index_workers)
+
+        if errors:
+            raise SnmpsimError(
+                '%d data file(s) could not be indexed' % len(errors))
+
         del _mib_instrums
         del _data_files
+        del _new_data_files
 
     def get_bulk_handler(
-            req_var_binds, non_repeaters, max_repetitions, read_next_vars):
+            req_var_binds, non_repeaters, max_repetitions, read_next_vars,
+            read_bulk_vars):
         """Only v2c arch GETBULK handler"""
         N = min(int(non_repeaters), len(req_var_binds))
         M = int(max_repetitions)
         R = max(len(req_var_binds) - N, 0)
 
         if R:
-            M = min(M, args.max_var_binds / R)
+            M = min(M, args.max_var_binds // R)
 
         if N:
             rsp_var_binds = read_next_vars(req_var_binds[:N])
@@ -307,20 +387,150 @@ def main():
         else:
             rsp_var_binds = []
 
-        var_binds = req_var_binds[-R:]
-
-        while M and R:
-            rsp_var_binds.extend(read_next_vars(var_binds))
-            var_binds = rsp_var_binds[-R:]
-            M -= 1
+        if M and R:
+            rsp_var_binds.extend(read_bulk_vars(req_var_binds[-R:], M))
 
         return rsp_var_binds
 
+    def select_context(transport_domain, transport_address, community_name):
+        if ReportingManager.stage_timings:
+            started = time.time()
+
+        resolved = contexts.lookup(
+            transport_domain, transport_address,
+            context_engine_id=datafile.SELF_LABEL,
+            context_name=community_name)
+
+        if ReportingManager.stage_timings:
+            ReportingManager.update_metrics(
+                data_file=resolved and getattr(resolved[1], 'data_file', None),
+                context_probe_time=time.time() - started)
+
+        if not resolved:
+            log.error(
+                'No data file selected for transport ID %s, source '
+                'address %s, community name "%s"',
+                log.lazy(univ.ObjectIdentifier, transport_domain),
+                transport_address[0], community_name)
+            return
+
+        candidate, mib_instrum = resolved
+
+        log.info(
+            'Using %s selected by candidate %s; transport ID %s, '
+            'source address %s, context engine ID <empty>, '
+            'community name "%s"', mib_instrum, candidate,
+            log.lazy(univ.ObjectIdentifier, transport_domain),
+            transport_address[0], community_name)
+
+        return mib_instrum
+
+    def get_v1_error(var_binds):
+        """Return SNMPv1 error status and index for SNMPv2c var-binds"""
+        for idx, (oid, val) in enumerate(var_binds):
+            if val.tagSet in SNMP_2TO1_ERROR_MAP:
+                return SNMP_2TO1_ERROR_MAP[val.tagSet], idx + 1
+
+        return 0, 0
+
+    def encode_response(mib_instrum, encode, *args):
+        """Encode response message by calling `encode(*args)`"""
+        if not ReportingManager.stage_timings:
+            return encode(*args)
+
+        started = time.time()
+
+        rsp_msg = encode(*args)
+
+        ReportingManager.update_metrics(
+            data_file=getattr(mib_instrum, 'data_file', None),
+            ber_encoding_time=time.time() - started)
+
+        return rsp_msg
+
+    def send_response(transport_dispatcher, transport_domain,
+                      transport_address, rsp_msg, response_delay):
+        if response_delay:
+            # let other requests be served meanwhile
+            transport_dispatcher.call_later(
+                response_delay, transport_dispatcher.sendMessage,
+                rsp_msg, transport_domain, transport_address)
+
+        else:
+            transport_dispatcher.sendMessage(
+                rsp_msg, transport_domain, transport_address)
+
+    def serve_fast_request(transport_dispatcher, transport_domain,
+                           transport_address, request):
+        """Serve request decoded by built-in codec, return False on failure"""
+        mib_instrum = select_context(
+            transport_domain, transport_address, request.community)
+
+        if mib_instrum is None:
+            return False
+
+        if request.pdu_type == codec.GET:
+            backend_fun = mib_instrum.readVars
+
+        elif request.pdu_type == codec.GETNEXT:
+            backend_fun = mib_instrum.readNextVars
+
+        else:
+            def backend_fun(var_binds):
+                return get_bulk_handler(
+                    var_binds, request.non_repeaters,
+                    request.max_repetitions,
+                    mib_instrum.readNextVars,
+                    mib_instrum.readBulkVars
+                )
+
+        dispatch.begin_response()
+
+        try:
+            var_binds = backend_fun(request.var_binds)
+
+        except NoDataNotification:
+            return False
+
+        except Exception as exc:
+            log.error('Ignoring SNMP engine failure: %s' % exc)
+            return False
+
+        finally:
+            response_delay = dispatch.end_response()
+
+        error_status = error_index = 0
+
+        if not request.version:
+            error_status, error_index = get_v1_error(var_binds)
+
+        send_response(
+            transport_dispatcher, transport_domain, transport_address,
+            encode_response(
+                mib_instrum, codec.encode_response,
+                request, var_binds, error_status, error_index),
+            response_delay)
+
+        return True
+
     def commandResponderCbFun(
             transport_dispatcher, transport_domain, transport_address,
             whole_msg):
         """v2c arch command responder request handling callback"""
         while whole_msg:
+            if args.fast_codec:
+                decoded = codec.decode_request(whole_msg)
+
+                if decoded:
+                    request, whole_msg = decoded
+
+                    if not serve_fast_request(
+                            transport_dispatcher, transport_domain,
+                            transport_address, request):
+                        return whole_msg
+
+                    continue
+
             msg_ver = api.decodeMessageVersion(whole_msg)
 
             if msg_ver in api.protoModules:
@@ -334,27 +544,10 @@ def main():
 
             community_name = req_msg.getComponentByPosition(1)
 
-            for candidate in datafile.probe_context(
-                    transport_domain, transport_address,
-                    context_engine_id=datafile.SELF_LABEL,
-                    context_name=community_name):
-                if candidate in contexts:
-                    log.info(
-                        'Using %s selected by candidate %s; transport ID %s, '
-                        'source address %s, context engine ID <empty>, '
-                        'community name '
-                        '"%s"' % (contexts[candidate], candidate,
-                                  univ.ObjectIdentifier(transport_domain),
-                                  transport_address[0], community_name))
-                    community_name = candidate
-                    break
+            mib_instrum = select_context(
+                transport_domain, transport_address, community_name)
 
-            else:
-                log.error(
-                    'No data file selected for transport ID %s, source '
-                    'address %s, community name '
-                    '"%s"' % (univ.ObjectIdentifier(transport_domain),
-                              transport_address[0], community_name))
+            if mib_instrum is None:
                 return whole_msg
 
             rsp_msg = p_mod.apiMessage.getResponse(req_msg)
@@ -362,13 +555,13 @@ def main():
             req_pdu = p_mod.apiMessage.getPDU(req_msg)
 
             if req_pdu.isSameTypeWith(p_mod.GetRequestPDU()):
-                backend_fun = contexts[community_name].readVars
+                backend_fun = mib_instrum.readVars
 
             elif req_pdu.isSameTypeWith(p_mod.SetRequestPDU()):
-                backend_fun = contexts[community_name].writeVars
+                backend_fun = mib_instrum.writeVars
 
             elif req_pdu.isSameTypeWith(p_mod.GetNextRequestPDU()):
-                backend_fun = contexts[community_name].readNextVars
+                backend_fun = mib_instrum.readNextVars
 
             elif (hasattr(p_mod, 'GetBulkRequestPDU') and
                   req_pdu.isSameTypeWith(p_mod.GetBulkRequestPDU())):
@@ -383,7 +576,8 @@ def main():
                     return get_bulk_handler(
                         var_binds, p_mod.apiBulkPDU.getNonRepeaters(req_pdu),
                         p_mod.apiBulkPDU.getMaxRepetitions(req_pdu),
-                        contexts[community_name].readNextVars
+                        mib_instrum.readNextVars,
+                        mib_instrum.readBulkVars
                     )
 
             else:
@@ -393,6 +587,8 @@ def main():
                                transport_address))
                 return whole_msg
 
+            dispatch.begin_response()
+
             try:
                 var_binds = backend_fun(p_mod.apiPDU.getVarBinds(req_pdu))
 
@@ -403,26 +599,24 @@ def main():
                 log.error('Ignoring SNMP engine failure: %s' % exc)
                 return whole_msg
 
-            if not msg_ver:
-
-                for idx in range(len(var_binds)):
-
-                    oid, val = var_binds[idx]
+            finally:
+                response_delay = dispatch.end_response()
 
-                    if val.tagSet in SNMP_2TO1_ERROR_MAP:
-                        var_binds = p_mod.apiPDU.getVarBinds(req_pdu)
+            if not msg_ver:
+                error_status, error_index = get_v1_error(var_binds)
 
-                        p_mod.apiPDU.setErrorStatus(
-                            rsp_pdu, SNMP_2TO1_ERROR_MAP[val.tagSet])
-                        p_mod.apiPDU.setErrorIndex(
-                            rsp_pdu, idx + 1)
+                if error_status:
+                    var_binds = p_mod.apiPDU.getVarBinds(req_pdu)
 
-                        break
+                    p_mod.apiPDU.setErrorStatus(rsp_pdu, error_status)
+                    p_mod.apiPDU.setErrorIndex(rsp_pdu, error_index)
 
             p_mod.apiPDU.setVarBinds(rsp_pdu, var_binds)
 
-            transport_dispatcher.sendMessage(
-                encoder.encode(rsp_msg), transport_domain, transport_address)
+            send_response(
+                transport_dispatcher, transport_domain, transport_address,
+                encode_response(mib_instrum, encoder.encode, rsp_msg),
+                response_delay)
 
         return whole_msg
 
@@ -433,16 +627,33 @@ def main():
 
     data_index_instrum_controller = controller.DataIndexInstrumController()
 
-    contexts = {univ.OctetString('index'): data_index_instrum_controller}
+    contexts = datafile.ContextTrie()
 
-    with daemon.PrivilegesOf(args.process_user, args.process_group):
-        configure_managed_objects(
-            args.data_dirs or confdir.data, data_index_instrum_controller)
+    contexts.add('index', data_index_instrum_controller)
 
-    contexts['index'] = data_index_instrum_controller
+    try:
+        with daemon.PrivilegesOf(args.process_user, args.process_group):
+            configure_managed_objects(
+                args.data_dirs or confdir.data, data_index_instrum_controller)
+
+    except SnmpsimError as exc:
+        log.error(exc)
+        return 1
 
     # Configure socket server
-    transport_dispatcher = AsyncoreDispatcher()
+    if args.transport_dispatcher == 'asyncore':
+        transport_dispatcher = dispatch.AsyncoreDispatcher()
+
+    else:
+        try:
+            transport_dispatcher = dispatch.AsyncioDispatcher(
+                use_uvloop=args.transport_dispatcher == 'uvloop')
+
+        except SnmpsimError as exc:
+            log.error(exc)
+            return 1
+
+    log.info('Using %s transport dispatcher' % args.transport_dispatcher)
 
     transport_index = args.transport_id_offset
     for agent_udpv4_endpoint in args.agent_udpv4_endpoints:
@@ -479,6 +690,30 @@ def main():
 
     transport_dispatcher.jobStarted(1)  # server job would never finish
 
+    if args.workers > 1:
+        try:
+            with daemon.PrivilegesOf(args.process_user, args.process_group):
+                worker_id = workers.run_workers(args.workers)
+
+        except SnmpsimError as exc:
+            log.error(exc)
+            return 1
+
+        if worker_id is None:
+            transport_dispatcher.closeDispatcher()
+
+            log.info('Process terminated')
+
+            return 0
+
+        endpoints.use_worker_sockets(transport_dispatcher, worker_id)
+
+        with daemon.PrivilegesOf(args.process_user, args.process_group):
+            variation.initialize_variation_modules(
+                variation_modules, mode='variating')
+
+    ReportingManager.start()
+
     with daemon.PrivilegesOf(args.process_user, args.process_group, final=True):
 
         try:
@@ -16,6 +16,11 @@ from snmpsim import datafile
 from snmpsim import log
 
 
+def _format_engine_id(snmp_engine):
+    return (hasattr(snmp_engine, 'snmpEngineID') and
+            snmp_engine.snmpEngineID.prettyPrint() or '<unknown>')
+
+
 class MibInstrumController(object):
     """Lightweight MIB instrumentation (API-compatible with pysnmp's)"""
 
@@ -25,6 +30,10 @@ class MibInstrumController(object):
     def __str__(self):
         return str(self._data_file)
 
+    @property
+    def data_file(self):
+        return self._data_file.text_file
+
     def _get_call_context(self, ac_info, next_flag=False, set_flag=False):
         if ac_info is None:
             return {'nextFlag': next_flag,
@@ -63,11 +72,10 @@ class MibInstrumController(object):
 
         log.info(
             'SNMP EngineID %s, transportDomain %s, transportAddress %s, '
-            'securityModel %s, securityName %s, securityLevel '
-            '%s' % (hasattr(snmp_engine, 'snmpEngineID') and
-                    snmp_engine.snmpEngineID.prettyPrint() or '<unknown>',
-                    transport_domain, transport_address, security_model,
-                    security_name, security_level))
+            'securityModel %s, securityName %s, securityLevel %s',
+            log.lazy(_format_engine_id, snmp_engine),
+            transport_domain, transport_address, security_model,
+            security_name, security_level)
 
         return {'snmpEngine': snmp_engine,
                 'transportDomain': rfc1902.ObjectIdentifier(transport_domain),
@@ -91,6 +99,10 @@ class MibInstrumController(object):
         return self._data_file.process_var_binds(
             var_binds, **self._get_call_context(acInfo, True))
 
+    def readBulkVars(self, var_binds, maxRepetitions, acInfo=None):
+        return self._data_file.process_bulk_var_binds(
+            var_binds, maxRepetitions, **self._get_call_context(acInfo, True))
+
     def writeVars(self, var_binds, acInfo=None):
         return self._data_file.process_var_binds(
             var_binds, **self._get_call_context(acInfo, False, True))
@@ -127,6 +139,16 @@ class DataIndexInstrumController(object):
         return [self._get_next_val(vb[0], exval.endOfMib)
                 for vb in var_binds]
 
+    def readBulkVars(self, var_binds, maxRepetitions, acInfo=None):
+        rsp_var_binds = []
+
+        while maxRepetitions:
+            var_binds = self.readNextVars(var_binds, acInfo)
+            rsp_var_binds.extend(var_binds)
+            maxRepetitions -= 1
+
+        return rsp_var_binds
+
     def writeVars(self, var_binds, acInfo=None):
         return [(vb[0], exval.noSuchInstance)
                 for vb in var_binds]
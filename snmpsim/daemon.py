@@ -73,9 +73,12 @@ else:
             signal.signal(s, signal_cb)
 
         # write pidfile
+        owner_pid = os.getpid()
+
         def atexit_cb():
             try:
-                if pidfile:
+                # forked worker processes must not remove supervisor's pidfile
+                if pidfile and os.getpid() == owner_pid:
                     os.remove(pidfile)
 
             except OSError:
@@ -6,11 +6,12 @@
 #
 # Simulation data file management tools
 #
+import collections
+import multiprocessing
 import os
 import stat
+import time
 
-from pyasn1.compat.octets import str2octs
-from pyasn1.type import univ
 from pysnmp.carrier.asyncore.dgram import udp
 from pysnmp.carrier.asyncore.dgram import udp6
 from pysnmp.carrier.asyncore.dgram import unix
@@ -18,54 +19,202 @@ from pysnmp.proto import rfc1902
 from pysnmp.smi import exval
 from pysnmp.smi.error import MibOperationError
 
+from snmpsim import codec
 from snmpsim import log
 from snmpsim import variation
 from snmpsim.error import NoDataNotification
 from snmpsim.error import SnmpsimError
 from snmpsim.record.search.database import RecordIndex
 from snmpsim.record.search.file import get_record
-from snmpsim.record.search.file import search_record_by_oid
+from snmpsim.record.search.memory import MemoryRecordIndex
 from snmpsim.reporting.manager import ReportingManager
 
 SELF_LABEL = 'self'
 
+RECORD_INDICES = {
+    'dbm': RecordIndex,
+    'memory': MemoryRecordIndex
+}
+
 
 class AbstractLayout(object):
     layout = '?'
 
 
+class OpenedFilesCache(object):
+    """LRU cache of data files holding open text and index handles"""
+
+    def __init__(self, max_entries=31):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, data_file):
+        return data_file in self._entries
+
+    def touch(self, data_file):
+        """Mark data file as the most recently used one"""
+        self._entries[data_file] = self._entries.pop(data_file, True)
+
+    def add(self, data_file):
+        """Register opened data file.
+
+        Returns a list of the least recently used data files pushed out of
+        the cache to make room for the new one. The caller is expected to
+        close them.
+        """
+        evicted = []
+
+        while self._entries and len(self._entries) >= self.max_entries:
+            lru_data_file, _ = self._entries.popitem(last=False)
+            evicted.append(lru_data_file)
+
+        self._entries[data_file] = True
+
+        return evicted
+
+    def discard(self, data_file):
+        self._entries.pop(data_file, None)
+
+
+class ValueCache(object):
+    """LRU cache of evaluated static data file records.
+
+    Maps raw data file record into a pair of ready-made OID and value
+    objects, so that static records do not have to be parsed and
+    evaluated on every request.
+
+    With `encode` set, cached var-binds also carry their BER encoding
+    for the built-in codec to put into response messages as is.
+    """
+
+    def __init__(self, max_entries, encode=False):
+        self.max_entries = max_entries
+        self.encode = encode
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, line):
+        """Return cached var-bind, raise `KeyError` on cache miss"""
+        self._entries[line] = var_bind = self._entries.pop(line)
+        return var_bind
+
+    def add(self, line, oid, value):
+        """Cache OID and value, return cached var-bind"""
+        while self._entries and len(self._entries) >= self.max_entries:
+            self._entries.popitem(last=False)
+
+        if self.encode:
+            var_bind = codec.EncodedVarBind(oid, value)
+
+        else:
+            var_bind = oid, value
+
+        self._entries[line] = var_bind
+
+        return var_bind
+
+    def clear(self):
+        self._entries.clear()
+
+
+def _format_var_binds(var_binds):
+    return ', '.join(
+        ['%s=<%s>' % (oid, val.prettyPrint()) for oid, val in var_binds])
+
+
 class DataFile(AbstractLayout):
     layout = 'text'
-    opened_queue = []
-    max_queue_entries = 31  # max number of open text and index files
+    opened_files = OpenedFilesCache()
+    value_cache_size = 0  # max number of cached static records per file
+    pre_encode_values = False  # cache static records BER-encoded as well
 
-    def __init__(self, textFile, textParser, variationModules):
-        self._record_index = RecordIndex(textFile, textParser)
+    def __init__(self, textFile, textParser, variationModules,
+                 indexType='dbm', memoryMap=False):
+        index_class = (textParser.embedded_index or
+                       RECORD_INDICES[indexType])
+
+        self._record_index = index_class(textFile, textParser, memoryMap)
         self._text_parser = textParser
         self._text_file = textFile
         self._variation_modules = variationModules
 
+        if self.value_cache_size:
+            self._value_cache = ValueCache(
+                self.value_cache_size, encode=self.pre_encode_values)
+
+        else:
+            self._value_cache = None
+
+        self._value_cache_time = None
+
+    @property
+    def text_file(self):
+        return self._text_file
+
     def index_text(self, forceIndexBuild=False, validateData=False):
         self._record_index.create(forceIndexBuild, validateData)
         return self
 
     def close(self):
+        DataFile.opened_files.discard(self)
         self._record_index.close()
 
     def get_handles(self):
-        if not self._record_index.is_open():
-            if len(DataFile.opened_queue) > self.max_queue_entries:
-                log.info('Closing %s' % self)
-                DataFile.opened_queue[0].close()
-                del DataFile.opened_queue[0]
+        if self._record_index.is_open():
+            DataFile.opened_files.touch(self)
+
+        else:
+            evicted = DataFile.opened_files.add(self)
+
+            for data_file in evicted:
+                log.info('Closing %s' % data_file)
+                data_file.close()
 
-            DataFile.opened_queue.append(self)
+            if evicted:
+                ReportingManager.update_metrics(
+                    datafile_cache_eviction_count=len(evicted))
 
             log.info('Opening %s' % self)
 
         return self._record_index.get_handles()
 
     def process_var_binds(self, var_binds, **context):
+        started = time.time()
+
+        batch = variation.VariationBatch()
+
+        rsp_var_binds = self._process_var_binds(
+            var_binds, variationBatch=batch, **context)
+
+        while batch:
+            pending = [(idx, var_bind[1])
+                       for idx, var_bind in enumerate(rsp_var_binds)
+                       if isinstance(var_bind[1], variation.PendingValue)]
+
+            rsp_var_binds = batch.run(rsp_var_binds)
+
+            for idx, val in pending:
+                if val.skipped:
+                    rsp_var_binds[idx] = self._next_record(
+                        val, variationBatch=batch, **context)
+
+        log.info(
+            'Response var-binds: %s',
+            log.lazy(_format_var_binds, rsp_var_binds))
+
+        if ReportingManager.timings:
+            ReportingManager.update_metrics(
+                data_file=self._text_file,
+                datafile_call_time=time.time() - started, **context)
+
+        return rsp_var_binds
+
+    def _process_var_binds(self, var_binds, skipped_records=None, **context):
         rsp_var_binds = []
 
         if context.get('nextFlag'):
@@ -74,6 +223,8 @@ class DataFile(AbstractLayout):
         else:
             error_status = exval.noSuchInstance
 
+        cache_hit = self._record_index.is_open()
+
         try:
             text, db = self.get_handles()
 
@@ -83,36 +234,58 @@ class DataFile(AbstractLayout):
 
             ReportingManager.update_metrics(
                 data_file=self._text_file, datafile_failure_count=1,
-                transport_call_count=1, **context)
+                datafile_cache_miss_count=1, transport_call_count=1,
+                **context)
 
             return [(vb[0], error_status) for vb in var_binds]
 
+        value_cache = self._value_cache
+
+        if value_cache is not None:
+            if self._value_cache_time != self._record_index.text_file_time:
+                value_cache.clear()
+                self._value_cache_time = self._record_index.text_file_time
+
+            # SET or GET of a missing OID is not a plain value evaluation
+            if context.get('setFlag'):
+                value_cache = None
+
         vars_remaining = vars_total = len(var_binds)
         err_total = 0
 
-        log.info(
-            'Request var-binds: %s, flags: %s, '
-            '%s' % (', '.join(['%s=<%s>' % (vb[0], vb[1].prettyPrint())
-                               for vb in var_binds]),
-                    context.get('nextFlag') and 'NEXT' or 'EXACT',
-                    context.get('setFlag') and 'SET' or 'GET'))
+        stage_timings = ReportingManager.stage_timings
+        lookup_time = evaluation_time = 0
 
-        for oid, val in var_binds:
-            text_oid = str(univ.OctetString('.'.join(['%s' % x for x in oid])))
+        log.info(
+            'Request var-binds: %s, flags: %s, %s',
+            log.lazy(_format_var_binds, var_binds),
+            context.get('nextFlag') and 'NEXT' or 'EXACT',
+            context.get('setFlag') and 'SET' or 'GET')
+
+        for idx, (oid, val) in enumerate(var_binds):
+            if stage_timings:
+                started = time.time()
+
+            # go on past the record having come up with no value
+            if skipped_records:
+                offset, _, _ = self._record_index.lookup(
+                    skipped_records[idx])
+                subtree_flag = False
+                exact_match = True
 
-            try:
-                line = self._record_index.lookup(
-                    str(univ.OctetString('.'.join(['%s' % x for x in oid]))))
+            else:
+                try:
+                    offset, subtree_flag, _ = self._record_index.lookup(oid)
 
-            except KeyError:
-                offset = search_record_by_oid(oid, text, self._text_parser)
-                subtree_flag = exact_match = False
+                except KeyError:
+                    offset = self._record_index.search(oid)
+                    subtree_flag = exact_match = False
 
-            else:
-                offset, subtree_flag, prev_offset = line.split(str2octs(','), 2)
-                subtree_flag, exact_match = int(subtree_flag), True
+                else:
+                    exact_match = True
 
-            offset = int(offset)
+            if stage_timings:
+                lookup_time += time.time() - started
 
             text.seek(offset)
 
@@ -132,7 +305,7 @@ class DataFile(AbstractLayout):
 
                             try:
                                 _, subtree_flag, _ = self._record_index.lookup(
-                                    str(_next_oid)).split(str2octs(','), 2)
+                                    _next_oid)
 
                             except KeyError:
                                 log.error(
@@ -141,7 +314,6 @@ class DataFile(AbstractLayout):
                                 line = ''  # fatal error
 
                             else:
-                                subtree_flag = int(subtree_flag)
                                 line = _next_line
 
                         else:
@@ -157,8 +329,7 @@ class DataFile(AbstractLayout):
                         _oid = 'last'
 
                     try:
-                        _, _, _prev_offset = self._record_index.lookup(
-                            str(_oid)).split(str2octs(','), 2)
+                        _, _, _prev_offset = self._record_index.lookup(_oid)
 
                     except KeyError:
                         log.error(
@@ -167,8 +338,6 @@ class DataFile(AbstractLayout):
                         line = ''  # fatal error
 
                     else:
-                        _prev_offset = int(_prev_offset)
-
                         # previous line serves a subtree?
                         if _prev_offset >= 0:
                             text.seek(_prev_offset)
@@ -182,8 +351,7 @@ class DataFile(AbstractLayout):
                                 subtree_flag = True
 
                 if not line:
-                    _oid = oid
-                    _val = error_status
+                    var_bind = oid, error_status
                     break
 
                 call_context = context.copy()
@@ -200,11 +368,32 @@ class DataFile(AbstractLayout):
                     variationModules=self._variation_modules
                 )
 
+                cacheable = value_cache is not None and (
+                    exact_match or context.get('nextFlag'))
+
+                if stage_timings:
+                    started = time.time()
+
                 try:
-                    _oid, _val = self._text_parser.evaluate(
-                        line, **call_context)
+                    if cacheable:
+                        try:
+                            var_bind = value_cache.get(line)
+
+                        except KeyError:
+                            var_bind = self._text_parser.evaluate(
+                                line, **call_context)
+
+                            if self._text_parser.is_static(line):
+                                var_bind = value_cache.add(line, *var_bind)
+
+                    else:
+                        var_bind = self._text_parser.evaluate(
+                            line, **call_context)
 
-                    if _val is exval.endOfMib:
+                    if stage_timings:
+                        evaluation_time += time.time() - started
+
+                    if var_bind[1] is exval.endOfMib:
                         exact_match = True
                         subtree_flag = False
                         continue
@@ -216,33 +405,324 @@ class DataFile(AbstractLayout):
                     raise
 
                 except Exception as exc:
-                    _oid = oid
-                    _val = error_status
+                    var_bind = oid, error_status
                     err_total += 1
                     log.error(
-                        'data error at %s for %s: %s' % (self, text_oid, exc))
+                        'data error at %s for %s: %s', self,
+                        '.'.join([str(x) for x in oid]), exc)
 
                 break
 
-            rsp_var_binds.append((_oid, _val))
+            rsp_var_binds.append(var_bind)
 
-        log.info(
-            'Response var-binds: %s' % (
-                ', '.join(['%s=<%s>' % (
-                    vb[0], vb[1].prettyPrint()) for vb in rsp_var_binds])))
+        if stage_timings:
+            context = dict(context, index_lookup_time=lookup_time,
+                           record_evaluation_time=evaluation_time)
 
         ReportingManager.update_metrics(
             data_file=self._text_file, varbind_count=vars_total,
             datafile_call_count=1, datafile_failure_count=err_total,
+            datafile_cache_hit_count=int(cache_hit),
+            datafile_cache_miss_count=int(not cache_hit),
             transport_call_count=1,
             **context)
 
         return rsp_var_binds
 
+    def process_bulk_var_binds(self, var_binds, maxRepetitions, **context):
+        """Fetch up to `maxRepetitions` successors of each var-bind.
+
+        First successors are resolved the regular GETNEXT way. From there
+        on, plain records are read sequentially from the data file, so
+        that a whole GETBULK column costs a single index lookup. Should
+        a record need anything more than plain evaluation (e.g. it refers
+        to a variation module), the rest of the column is resolved the
+        regular GETNEXT way.
+
+        Variation modules capable of batch evaluation get all var-binds
+        of the response evaluated at once. Unless the module leaves OIDs
+        of the records intact, batch is evaluated whenever successor of
+        its var-bind is to be looked up.
+
+        Returns var-binds ordered by repetition, as GETBULK response
+        requires.
+        """
+        started = time.time()
+
+        batch = context['variationBatch'] = variation.VariationBatch()
+
+        rsp_var_binds = self._process_var_binds(var_binds, **context)
+
+        columns = [[var_bind] for var_bind in rsp_var_binds]
+
+        walked_total = 0
+        walk_time = 0
+
+        for column in columns:
+            if maxRepetitions > 1:
+                walk_started = time.time()
+
+                walked = self._walk_records(
+                    column[-1][0], maxRepetitions - 1, **context)
+
+                walk_time += time.time() - walk_started
+
+                walked_total += len(walked)
+
+                column.extend(walked)
+
+            self._fill_column(column, maxRepetitions, batch, **context)
+
+        # failed evaluation makes further GETNEXTs start over from
+        # the OID being requested, value-less one makes them skip its
+        # record, just as one-by-one evaluation does
+        positions = [0] * len(columns)
+
+        while batch:
+            batch.run(())
+
+            for column_idx, column in enumerate(columns):
+                for idx in range(positions[column_idx], len(column)):
+                    val = column[idx][1]
+
+                    if not isinstance(val, variation.PendingValue):
+                        continue
+
+                    if val.failed or val.skipped:
+                        del column[idx + 1:]
+
+                        if val.skipped:
+                            column[idx] = self._next_record(val, **context)
+
+                        self._fill_column(
+                            column, maxRepetitions, batch, **context)
+
+                        positions[column_idx] = idx + int(val.failed)
+                        break
+
+                else:
+                    positions[column_idx] = len(column)
+
+        if walked_total:
+            metrics = dict(context, varbind_count=walked_total)
+
+            # sequentially read records are evaluated on the fly
+            if ReportingManager.stage_timings:
+                metrics['record_evaluation_time'] = walk_time
+
+            ReportingManager.update_metrics(
+                data_file=self._text_file, **metrics)
+
+        rsp_var_binds = batch.run(
+            [column[idx] for idx in range(maxRepetitions)
+             for column in columns])
+
+        log.info(
+            'Response var-binds: %s',
+            log.lazy(_format_var_binds, rsp_var_binds))
+
+        if ReportingManager.timings:
+            ReportingManager.update_metrics(
+                data_file=self._text_file,
+                datafile_call_time=time.time() - started, **context)
+
+        return rsp_var_binds
+
+    def _fill_column(self, column, count, batch, **context):
+        """Add GETNEXT successors to the column till it has `count` items"""
+        while len(column) < count:
+            oid, val = column[-1]
+
+            if isinstance(val, variation.PendingValue):
+                # value might come with OID of its own
+                if val.failed or not val.keeps_oid:
+                    batch.run(())
+
+                    oid, val = val.var_bind
+
+                # value is not known till the batch is evaluated
+                else:
+                    val = rfc1902.Null('')
+
+            column.extend(self._process_var_binds([(oid, val)], **context))
+
+    def _next_record(self, val, **context):
+        """Look up successor of the record `val` came up with no value for.
+
+        Just as one-by-one evaluation does, lookup goes on on behalf of
+        the OID originally requested.
+        """
+        var_binds = [(val.context['origOid'], val.context['origValue'])]
+
+        return self._process_var_binds(
+            var_binds, skipped_records=[val.record_oid], **context)[0]
+
+    def _walk_records(self, oid, count, **context):
+        """Read up to `count` plain records following the one at OID"""
+        var_binds = []
+
+        # broken data file is reported by GETNEXT logic
+        try:
+            text, _ = self.get_handles()
+
+        except SnmpsimError:
+            return var_binds
+
+        try:
+            offset, subtree_flag, _ = self._record_index.lookup(oid)
+
+        except KeyError:
+            return var_binds
+
+        if subtree_flag:
+            return var_binds
+
+        text.seek(offset)
+
+        get_record(text)  # record we are walking from
+
+        value_cache = self._value_cache
+
+        call_context = context.copy()
+        call_context.update(
+            (),
+            origOid=oid,
+            dataFile=self._text_file,
+            subtreeFlag=False,
+            exactMatch=True,
+            errorStatus=exval.endOfMib,
+            varsTotal=1,
+            varsRemaining=0,
+            variationModules=self._variation_modules
+        )
+
+        while len(var_binds) < count:
+            line, _, _ = get_record(text)
+
+            if not line:
+                # no more records, all further GETNEXTs hit the end of MIB
+                var_binds.extend(
+                    [(oid, exval.endOfMib)] * (count - len(var_binds)))
+                break
+
+            try:
+                if value_cache is None:
+                    raise KeyError()
+
+                # only plain records ever get cached
+                var_bind = value_cache.get(line)
+
+            except KeyError:
+                if not self._text_parser.is_static(line):
+                    break
+
+                try:
+                    var_bind = self._text_parser.evaluate(
+                        line, **call_context)
+
+                except Exception:
+                    break
+
+                if value_cache is not None:
+                    var_bind = value_cache.add(line, *var_bind)
+
+            # duplicate or unsorted records are left to GETNEXT logic
+            if var_bind[0] <= oid:
+                break
+
+            var_binds.append(var_bind)
+
+            oid = var_bind[0]
+
+        return var_binds
+
     def __str__(self):
         return '%s controller' % self._text_file
 
 
+def _create_index(args):
+    """Build record index in a worker process"""
+    idx, record_index, force_index_build, validate_data = args
+
+    try:
+        record_index.create(force_index_build, validate_data)
+
+    except Exception as exc:
+        return idx, None, str(exc)
+
+    return idx, record_index, None
+
+
+def index_data_files(data_files, forceIndexBuild=False, validateData=False,
+                     workers=1):
+    """Build indices for many data files, possibly in parallel.
+
+    With more than one worker, indices are built by a pool of processes
+    and then handed over to the data file objects of this process.
+
+    Returns a list of (data file path, error message) tuples for the
+    data files failed to index, sorted by data file path.
+    """
+    total = len(data_files)
+    errors = []
+
+    if not total:
+        return errors
+
+    progress_step = max(1, total // 20)
+
+    log.info('Indexing %d data file(s) using %d '
+             'worker(s)...' % (total, workers))
+
+    if workers > 1:
+        pool = multiprocessing.Pool(min(workers, total))
+
+        try:
+            tasks = [(idx, data_file._record_index,
+                      forceIndexBuild, validateData)
+                     for idx, data_file in enumerate(data_files)]
+
+            results = pool.imap_unordered(
+                _create_index, tasks,
+                chunksize=max(1, min(64, total // (workers * 4))))
+
+            for count, (idx, record_index, exc) in enumerate(results):
+                if exc is None:
+                    data_files[idx]._record_index = record_index
+
+                else:
+                    errors.append((data_files[idx].text_file, exc))
+
+                if not (count + 1) % progress_step or count + 1 == total:
+                    log.info('...%d of %d data files '
+                             'processed' % (count + 1, total))
+
+            pool.close()
+
+        finally:
+            pool.terminate()
+            pool.join()
+
+    else:
+        for count, data_file in enumerate(data_files):
+            try:
+                data_file.index_text(forceIndexBuild, validateData)
+
+            except Exception as exc:
+                errors.append((data_file.text_file, str(exc)))
+
+            if not (count + 1) % progress_step or count + 1 == total:
+                log.info('...%d of %d data files '
+                         'processed' % (count + 1, total))
+
+    errors.sort()
+
+    for text_file, exc in errors:
+        log.error('Failed to index data file %s: %s' % (text_file, exc))
+
+    return errors
+
+
 def get_data_files(tgt_dir, top_len=None):
     if top_len is None:
         top_len = len(tgt_dir.split(os.path.sep))
@@ -300,29 +780,34 @@ def get_data_files(tgt_dir, top_len=None):
     return dir_content
 
 
+def _domain_label(transport_domain):
+    return '.'.join([str(x) for x in transport_domain])
+
+
+def _address_label(transport_domain, transport_address):
+    if transport_domain[:len(udp.domainName)] == udp.domainName:
+        return transport_address[0]
+
+    elif udp6 and transport_domain[:len(udp6.domainName)] == udp6.domainName:
+        return str(transport_address[0]).replace(':', '_')
+
+    elif unix and transport_domain[:len(unix.domainName)] == unix.domainName:
+        return transport_address
+
+
 def probe_context(transport_domain, transport_address,
                   context_engine_id, context_name):
     """Suggest variations of context name based on request data
     """
     if context_engine_id:
-        candidate = [
-            context_engine_id, context_name, '.'.join(
-                [str(x) for x in transport_domain])]
+        candidate = [context_engine_id, context_name]
 
     else:
         # try legacy layout w/o contextEngineId in the path
-        candidate = [
-            context_name, '.'.join(
-                [str(x) for x in transport_domain])]
-
-    if transport_domain[:len(udp.domainName)] == udp.domainName:
-        candidate.append(transport_address[0])
+        candidate = [context_name]
 
-    elif udp6 and transport_domain[:len(udp6.domainName)] == udp6.domainName:
-        candidate.append(str(transport_address[0]).replace(':', '_'))
-
-    elif unix and transport_domain[:len(unix.domainName)] == unix.domainName:
-        candidate.append(transport_address)
+    candidate.append(_domain_label(transport_domain))
+    candidate.append(_address_label(transport_domain, transport_address))
 
     candidate = [str(x) for x in candidate if x]
 
@@ -337,3 +822,96 @@ def probe_context(transport_domain, transport_address,
         for candidate in probe_context(
                 transport_domain, transport_address, None, context_name):
             yield candidate
+
+
+class ContextTrie(object):
+    """Data file names arranged into a trie of their path components.
+
+    Resolves request data into the most specific data file the same way
+    as trying `probe_context` candidates in turn would do, though in a
+    single pass over path components and without building candidate
+    names.
+    """
+    _LEAF = None
+
+    # names, normalization of which may change them, are probed the old way
+    _UNPLAIN = frozenset(('', '.', '..'))
+
+    def __init__(self):
+        self._root = {}
+        self._names = {}
+        self._domain_labels = {}
+
+    def add(self, name, value):
+        name = str(name)
+
+        self._names[rfc1902.OctetString(name).asOctets()] = name, value
+
+        node = self._root
+
+        for component in name.split('/'):
+            node = node.setdefault(component, {})
+
+        node[self._LEAF] = name, value
+
+    def _search(self, elements):
+        node = self._root
+        found = None
+
+        for element in elements:
+            for component in element:
+                try:
+                    node = node[component]
+
+                except KeyError:
+                    return found
+
+            if self._LEAF in node:
+                found = node[self._LEAF]
+
+        return found
+
+    def _split(self, name):
+        if not name:
+            return []
+
+        components = str(name).split('/')
+
+        if self._UNPLAIN.intersection(components):
+            raise ValueError(name)
+
+        return components
+
+    def lookup(self, transport_domain, transport_address,
+               context_engine_id, context_name):
+        """Return name and value of the most specific data file or `None`"""
+        try:
+            domain = self._domain_labels[transport_domain]
+
+        except KeyError:
+            domain = self._domain_labels[transport_domain] = self._split(
+                _domain_label(transport_domain))
+
+        try:
+            elements = [
+                self._split(context_name), domain,
+                self._split(
+                    _address_label(transport_domain, transport_address))]
+
+            if context_engine_id:
+                found = self._search(
+                    [self._split(context_engine_id)] + elements)
+
+                if found:
+                    return found
+
+            return self._search(elements)
+
+        except ValueError:
+            pass
+
+        for candidate in probe_context(
+                transport_domain, transport_address,
+                context_engine_id, context_name):
+            if candidate in self._names:
+                return self._names[candidate]
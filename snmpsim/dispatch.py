@@ -0,0 +1,239 @@
+#
+# This file is part of snmpsim software.
+#
+# Copyright (c) 2010-2019, Ilya Etingof <etingof@gmail.com>
+# License: http://snmplabs.com/snmpsim/license.html
+#
+# Transport dispatchers for command responders
+#
+import asyncore
+import errno
+import heapq
+import socket
+import time
+import traceback
+
+from pysnmp.carrier.asyncore import dispatch
+from pysnmp.error import PySnmpError
+
+from snmpsim import error
+from snmpsim import log
+
+try:
+    import asyncio
+
+except ImportError:
+    asyncio = None
+
+try:
+    import uvloop
+
+except ImportError:
+    uvloop = None
+
+# the largest UDP datagram
+MAX_DATAGRAM_SIZE = 65535
+
+_RETRY_ERRNOS = (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR)
+
+# total delay (in seconds) requested for the response to SNMP request
+# being processed, None when not processing deferrable request
+_response_delay = None
+
+
+def begin_response():
+    """Start collecting delays requested for the response being built"""
+    global _response_delay
+    _response_delay = 0
+
+
+def end_response():
+    """Return the delay requested for the response being built"""
+    global _response_delay
+    delay, _response_delay = _response_delay, None
+    return delay
+
+
+def get_response_delay():
+    return _response_delay or 0
+
+
+def delay_response(delay):
+    """Ask to defer the response to SNMP request being processed.
+
+    Returns False if the response can not be deferred, so the caller
+    has to delay it on its own (e.g. by sleeping).
+    """
+    global _response_delay
+
+    if _response_delay is None:
+        return False
+
+    _response_delay += delay
+
+    return True
+
+
+def _run_call(fun, args):
+    try:
+        fun(*args)
+
+    except Exception as exc:
+        log.error('Scheduled call %s failed: %s' % (fun, exc))
+
+
+class AsyncoreDispatcher(dispatch.AsyncoreDispatcher):
+    """pysnmp asyncore dispatcher capable of one-time timed calls"""
+
+    def __init__(self):
+        dispatch.AsyncoreDispatcher.__init__(self)
+
+        self._calls = []
+        self._call_seq = 0
+
+    def call_later(self, delay, fun, *args):
+        """Call `fun(*args)` in `delay` seconds"""
+        self._call_seq += 1
+
+        heapq.heappush(
+            self._calls, (time.time() + delay, self._call_seq, fun, args))
+
+    def _run_calls(self):
+        now = time.time()
+
+        while self._calls and self._calls[0][0] <= now:
+            _, _, fun, args = heapq.heappop(self._calls)
+            _run_call(fun, args)
+
+    def runDispatcher(self, timeout=0.0):
+        while self.jobsArePending() or self.transportsAreWorking():
+            poll_timeout = timeout or self.getTimerResolution()
+
+            if self._calls:
+                poll_timeout = max(
+                    0, min(poll_timeout, self._calls[0][0] - time.time()))
+
+            try:
+                asyncore.loop(poll_timeout, use_poll=True,
+                              map=self.getSocketMap(), count=1)
+
+            except KeyboardInterrupt:
+                raise
+
+            except Exception:
+                raise PySnmpError('poll error: %s' % traceback.format_exc())
+
+            self._run_calls()
+
+            self.handleTimerTick(time.time())
+
+
+class AsyncioDispatcher(object):
+    """Serve UDP transports off asyncio event loop.
+
+    Mimics the subset of pysnmp transport dispatcher interface the v2c
+    arch command responder relies upon. The sockets of pysnmp transports
+    are watched directly by the event loop and, on every wake-up, all
+    pending datagrams (up to `batch_size`) get read off the socket and
+    passed to receive callback right away.
+
+    When `use_uvloop` is set, libuv-based event loop is used.
+    """
+    batch_size = 64
+
+    def __init__(self, use_uvloop=False):
+        if asyncio is None:
+            raise error.SnmpsimError(
+                'asyncio is not available on this Python version')
+
+        if use_uvloop:
+            if uvloop is None:
+                raise error.SnmpsimError(
+                    'uvloop event loop requested, but uvloop package '
+                    'is not installed')
+
+            self._loop = uvloop.new_event_loop()
+
+        else:
+            self._loop = asyncio.new_event_loop()
+
+        self._transports = {}
+        self._socket_map = {}
+        self._recv_cbfun = None
+
+    def registerTransport(self, transport_domain, transport):
+        if transport_domain in self._transports:
+            raise error.SnmpsimError(
+                'Transport %s already registered' % (transport_domain,))
+
+        self._transports[transport_domain] = transport
+        self._socket_map[transport.socket.fileno()] = transport
+
+    def registerRecvCbFun(self, recv_cbfun):
+        self._recv_cbfun = recv_cbfun
+
+    def getSocketMap(self):
+        return self._socket_map
+
+    def jobStarted(self, job_id, count=1):
+        pass  # serving forever anyway
+
+    def call_later(self, delay, fun, *args):
+        """Call `fun(*args)` in `delay` seconds"""
+        self._loop.call_later(delay, _run_call, fun, args)
+
+    def sendMessage(self, outgoing_message, transport_domain,
+                    transport_address):
+        sock = self._transports[transport_domain].socket
+
+        try:
+            sock.sendto(outgoing_message, transport_address)
+
+        except socket.error as exc:
+            log.error(
+                'Failed to send response to %s: %s' % (
+                    transport_address, exc))
+
+    def _read_ready(self, transport_domain, sock):
+        for _ in range(self.batch_size):
+            try:
+                incoming_message, transport_address = sock.recvfrom(
+                    MAX_DATAGRAM_SIZE)
+
+            except socket.error as exc:
+                if exc.args[0] not in _RETRY_ERRNOS:
+                    log.error('Failed to receive request: %s' % exc)
+
+                return
+
+            try:
+                self._recv_cbfun(
+                    self, transport_domain, transport_address,
+                    incoming_message)
+
+            except Exception as exc:
+                log.error(
+                    'Failed to process request from %s: %s' % (
+                        transport_address, exc))
+
+    def runDispatcher(self):
+        for transport_domain, transport in self._transports.items():
+            self._loop.add_reader(
+                transport.socket.fileno(), self._read_ready,
+                transport_domain, transport.socket)
+
+        try:
+            self._loop.run_forever()
+
+        finally:
+            for transport in self._transports.values():
+                self._loop.remove_reader(transport.socket.fileno())
+
+    def closeDispatcher(self):
+        for transport in self._transports.values():
+            transport.closeTransport()
+
+        self._transports.clear()
+        self._socket_map.clear()
+
+        self._loop.close()
@@ -6,6 +6,7 @@
 #
 # SNMP transport endpoints initialization harness
 #
+import os
 import socket
 
 from pysnmp.carrier.asyncore.dgram import udp
@@ -15,9 +16,36 @@ from snmpsim.error import SnmpsimError
 
 
 class TransportEndpointsBase(object):
+    # with multiple worker processes, every worker gets a socket of its
+    # own bound to each endpoint, so that kernel balances load among them
+    worker_count = 1
+
     def __init__(self):
         self.__endpoint = None
 
+    def _open_server_mode(self, transport_class, iface):
+        if self.worker_count < 2:
+            return transport_class().openServerMode(iface)
+
+        transports = [transport_class() for _ in range(self.worker_count)]
+
+        for transport in transports:
+            try:
+                transport.socket.setsockopt(
+                    socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+            except (AttributeError, socket.error) as exc:
+                raise SnmpsimError(
+                    'SO_REUSEPORT socket option is not available: '
+                    '%s' % exc)
+
+            transport.openServerMode(iface)
+
+        transport = transports[0]
+        transport.worker_sockets = [t.socket for t in transports]
+
+        return transport
+
     def add(self, addr):
         self.__endpoint = self._addEndpoint(addr)
         return self
@@ -42,7 +70,7 @@ class IPv4TransportEndpoints(TransportEndpointsBase):
         except Exception:
             raise SnmpsimError('improper IPv4/UDP endpoint %s' % addr)
 
-        return udp.UdpTransport().openServerMode((h, p)), addr
+        return self._open_server_mode(udp.UdpTransport, (h, p)), addr
 
 
 class IPv6TransportEndpoints(TransportEndpointsBase):
@@ -65,7 +93,31 @@ class IPv6TransportEndpoints(TransportEndpointsBase):
         else:
             h, p = addr, 161
 
-        return udp6.Udp6Transport().openServerMode((h, p)), addr
+        return self._open_server_mode(udp6.Udp6Transport, (h, p)), addr
+
+
+def use_worker_sockets(transport_dispatcher, worker_id):
+    """Make transports receive through the sockets of given worker process.
+
+    Worker socket is duplicated over the socket file descriptor the
+    transport has been registered with, sockets of other workers get
+    closed.
+    """
+    for transport in list(transport_dispatcher.getSocketMap().values()):
+        worker_sockets = getattr(transport, 'worker_sockets', None)
+
+        if not worker_sockets:
+            continue
+
+        if worker_id:
+            os.dup2(worker_sockets[worker_id].fileno(),
+                    transport.socket.fileno())
+
+        for idx, sock in enumerate(worker_sockets):
+            if idx:
+                sock.close()
+
+        transport.worker_sockets = None
 
 
 def parse_endpoint(arg, ipv6=False):
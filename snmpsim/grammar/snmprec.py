@@ -7,6 +7,8 @@
 from string import ascii_letters
 from string import digits
 
+from pyasn1.codec.ber import encoder
+from pyasn1.compat.octets import int2oct, oct2int, ints2octs
 from pyasn1.compat.octets import octs2str, str2octs, octs2ints
 from pyasn1.type import univ
 from pysnmp.proto import rfc1902, rfc1905
@@ -80,3 +82,164 @@ class SnmprecGrammar(AbstractGrammar):
                 if (value.tagSet == rfc1902.IpAddress.tagSet or
                             x not in self.ALNUMS):
                     return ''.join(['%.2x' % x for x in nval])
+
+
+class BinarySnmprecGrammar(SnmprecGrammar):
+    """BER-encoded form of snmprec records.
+
+    Plain record is a SEQUENCE of OID and value TLVs. Records
+    referring to variation modules carry OID followed by textual
+    tag and value (as OCTET STRINGs) wrapped into context-tagged,
+    constructed TLV: [0] for single OID and [1] for subtree records.
+    """
+    PLAIN = 0x30
+    VARIATION = 0xa0
+    SUBTREE = 0xa1
+
+    # tags of numeric SNMP types carrying unsigned values
+    UNSIGNED_TAGS = frozenset((65, 66, 67, 70))
+
+    # tags of SNMP types carrying no value
+    EMPTY_TAGS = frozenset((5, 128, 129, 130))
+
+    @staticmethod
+    def encode_length(length):
+        if length < 0x80:
+            return int2oct(length)
+
+        octets = []
+
+        while length:
+            octets.insert(0, length & 0xff)
+            length >>= 8
+
+        return ints2octs([0x80 | len(octets)] + octets)
+
+    @staticmethod
+    def decode_length(data, offset):
+        """Return value length and value offset of TLV length at offset"""
+        length = oct2int(data[offset])
+        offset += 1
+
+        if length & 0x80:
+            count = length & 0x7f
+            length = 0
+
+            for octet in octs2ints(data[offset:offset + count]):
+                length = length << 8 | octet
+
+            offset += count
+
+        return length, offset
+
+    def decode_tlv(self, data, offset):
+        """Return tag, value and next TLV offset of TLV at offset"""
+        tag = oct2int(data[offset])
+
+        length, offset = self.decode_length(data, offset + 1)
+
+        return tag, data[offset:offset + length], offset + length
+
+    @staticmethod
+    def decode_oid(octets):
+        oid = []
+        sub_id = 0
+
+        for octet in octs2ints(octets):
+            sub_id = sub_id << 7 | octet & 0x7f
+
+            if not octet & 0x80:
+                oid.append(sub_id)
+                sub_id = 0
+
+        if not oid:
+            raise error.SnmpsimError('empty OID')
+
+        if oid[0] < 80:
+            oid[0:1] = divmod(oid[0], 40)
+
+        else:
+            oid[0:1] = 2, oid[0] - 80
+
+        return tuple(oid)
+
+    @staticmethod
+    def decode_integer(octets, signed=True):
+        value = 0
+
+        octets = octs2ints(octets)
+
+        for octet in octets:
+            value = value << 8 | octet
+
+        if signed and octets and octets[0] & 0x80:
+            value -= 1 << len(octets) * 8
+
+        return value
+
+    def decode_value(self, tag, octets):
+        if tag == 6:
+            return univ.ObjectIdentifier(self.decode_oid(octets))
+
+        typ = self.TAG_MAP[str(tag)]
+
+        if tag == 2 or tag in self.UNSIGNED_TAGS:
+            return typ(self.decode_integer(octets, tag == 2))
+
+        elif tag in self.EMPTY_TAGS:
+            return typ('')
+
+        return typ(octets)
+
+    def build(self, oid, tag, val):
+        if not oid or not tag:
+            raise error.SnmpsimError('empty OID/tag <%s/%s>' % (oid, tag))
+
+        body = encoder.encode(univ.ObjectIdentifier(oid))
+
+        if ':' in tag:
+            body += encoder.encode(univ.OctetString(tag))
+            body += encoder.encode(univ.OctetString(val))
+
+            kind = tag[0] == ':' and self.SUBTREE or self.VARIATION
+
+        else:
+            body += encoder.encode(val)
+
+            kind = self.PLAIN
+
+        return int2oct(kind) + self.encode_length(len(body)) + body
+
+    def parse_oid(self, line):
+        try:
+            _, offset = self.decode_length(line, 1)
+            _, value, _ = self.decode_tlv(line, offset)
+
+            return self.decode_oid(value)
+
+        except Exception as exc:
+            raise error.SnmpsimError(
+                'broken record <%r>: %s' % (line, exc))
+
+    def parse(self, line):
+        try:
+            kind = oct2int(line[0])
+
+            _, offset = self.decode_length(line, 1)
+            _, oid, offset = self.decode_tlv(line, offset)
+            tag, value, offset = self.decode_tlv(line, offset)
+
+            oid = self.decode_oid(oid)
+
+            if kind == self.PLAIN:
+                return oid, str(tag), self.decode_value(tag, value)
+
+            tag = octs2str(value)
+
+            _, value, _ = self.decode_tlv(line, offset)
+
+            return oid, tag, octs2str(value)
+
+        except Exception as exc:
+            raise error.SnmpsimError(
+                'broken record <%r>: %s' % (line, exc))
@@ -269,19 +269,44 @@ msg = lambda x: None
 log_level = LOG_INFO
 
 
-def error(message, ctx=''):
-    if log_level <= LOG_ERROR:
-        msg('ERROR %s %s' % (message, ctx))
+class lazy(object):
+    """Defer computing log message argument.
 
+    Wraps a callable to be invoked only when the message gets formatted,
+    that is, only if the message is actually going to be logged.
+    """
+    __slots__ = ('_fun', '_args')
 
-def info(message, ctx=''):
-    if log_level <= LOG_INFO:
-        msg('%s %s' % (message, ctx))
+    def __init__(self, fun, *args):
+        self._fun = fun
+        self._args = args
 
+    def __str__(self):
+        return str(self._fun(*self._args))
 
-def debug(message, ctx=''):
-    if log_level <= LOG_DEBUG:
-        msg('DEBUG %s %s' % (message, ctx))
+
+def is_enabled(level):
+    """Tell whether messages of given level go anywhere"""
+    return log_level <= level and not isinstance(msg, NullLogger)
+
+
+def _format(message, args):
+    return args and message % args or message
+
+
+def error(message, *args, **kwargs):
+    if is_enabled(LOG_ERROR):
+        msg('ERROR %s %s' % (_format(message, args), kwargs.get('ctx', '')))
+
+
+def info(message, *args, **kwargs):
+    if is_enabled(LOG_INFO):
+        msg('%s %s' % (_format(message, args), kwargs.get('ctx', '')))
+
+
+def debug(message, *args, **kwargs):
+    if is_enabled(LOG_DEBUG):
+        msg('DEBUG %s %s' % (_format(message, args), kwargs.get('ctx', '')))
 
 
 def set_level(level):
@@ -4,6 +4,8 @@
 # Copyright (c) 2010-2019, Ilya Etingof <etingof@gmail.com>
 # License: http://snmplabs.com/snmpsim/license.html
 #
+import mmap
+
 from snmpsim.error import SnmpsimError
 from snmpsim.grammar import abstract
 
@@ -12,6 +14,9 @@ class AbstractRecord(object):
     grammar = abstract.AbstractGrammar()
     ext = ''
 
+    # data files carrying their own index do not need a separate one
+    embedded_index = None
+
     def evaluate_oid(self, oid):
         raise SnmpsimError(
             'Method not implemented at '
@@ -27,6 +32,10 @@ class AbstractRecord(object):
             'Method not implemented at '
             '%s' % self.__class__.__name__)
 
+    def is_static(self, line):
+        """Tell whether record always evaluates into the same value"""
+        return False
+
     def format_oid(self, oid):
         raise SnmpsimError(
             'Method not implemented at '
@@ -45,3 +54,19 @@ class AbstractRecord(object):
     @staticmethod
     def open(path, flags='rb'):
         return open(path, flags)
+
+    @staticmethod
+    def open_mapped(path):
+        """Open data file for reading as a read-only memory map.
+
+        Falls back to regular file object for the files that can not
+        be mapped (e.g. empty ones).
+        """
+        with open(path, 'rb') as fl:
+            try:
+                return mmap.mmap(fl.fileno(), 0, access=mmap.ACCESS_READ)
+
+            except (ValueError, EnvironmentError):
+                pass
+
+        return open(path, 'rb')
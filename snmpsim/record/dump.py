@@ -59,6 +59,9 @@ class DumpRecord(abstract.AbstractRecord):
 
         return oid, value
 
+    def is_static(self, line):
+        return True
+
     def format_oid(self, oid):
         return univ.ObjectIdentifier(oid).prettyPrint()
 
@@ -0,0 +1,138 @@
+#
+# This file is part of snmpsim software.
+#
+# Copyright (c) 2010-2019, Ilya Etingof <etingof@gmail.com>
+# License: http://snmplabs.com/snmpsim/license.html
+#
+# Index embedded into binary simulation data file
+#
+import os
+
+from snmpsim import error
+from snmpsim import log
+from snmpsim.record.search.database import RecordIndex
+
+
+class BinaryRecordIndex(RecordIndex):
+    """Simulation data index built into binary data file.
+
+    Binary data file records are sorted by OID and addressable through
+    the table of record offsets, so OID lookups are served by bisection
+    right over the data file. Nothing is built or stored aside.
+    """
+
+    def __init__(self, text_file, text_parser, memory_map=False):
+        RecordIndex.__init__(self, text_file, text_parser, memory_map)
+
+        self._db_type = 'embedded'
+
+    def __str__(self):
+        return 'Data file %s, %s-indexed, %s' % (
+            self._text_file, self._db_type,
+            self._text and 'opened' or 'closed')
+
+    def is_open(self):
+        return self._text is not None
+
+    def create(self, force_index_build=False, validate_data=False):
+        text_file_time = os.stat(self._text_file)[8]
+
+        if not validate_data and self._text_file_time == text_file_time:
+            return self
+
+        try:
+            text = self._text_parser.open(self._text_file)
+
+        except Exception as exc:
+            raise error.SnmpsimError(
+                'Failed to open data file %s: %s' % (self._text_file, exc))
+
+        try:
+            if validate_data:
+                prev_oid = None
+
+                for idx in range(text.count):
+                    line = text.record_at(text.offset_at(idx))
+
+                    try:
+                        oid, tag, val = self._text_parser.grammar.parse(line)
+
+                    except Exception as exc:
+                        raise error.SnmpsimError(
+                            'Data error at %s record #%d:'
+                            ' %s' % (self._text_file, idx, exc))
+
+                    if prev_oid is not None and prev_oid >= oid:
+                        raise error.SnmpsimError(
+                            'Data file %s is not sorted by OID at record '
+                            '#%d' % (self._text_file, idx))
+
+                    prev_oid = oid
+
+                    try:
+                        self._text_parser.evaluate_value(
+                            oid, tag, val, dataValidation=True
+                        )
+
+                    except Exception as exc:
+                        log.info(
+                            'ERROR at record #%s, value %r: '
+                            '%s' % (idx, val, exc))
+
+            log.info(
+                'Data file %s carries embedded index of %d '
+                'entries' % (self._text_file, text.count))
+
+        finally:
+            text.close()
+
+        self._text_file_time = text_file_time
+
+        return self
+
+    def _prev_offset(self, idx):
+        # previous record serving a subtree, if any
+        if idx and self._text.kind_at(
+                idx - 1) == self._text_parser.grammar.SUBTREE:
+            return self._text.offset_at(idx - 1)
+
+        return -1
+
+    def lookup(self, oid):
+        text = self._text
+
+        if oid == 'last':
+            return text.size, 0, self._prev_offset(text.count)
+
+        oid = tuple(oid)
+
+        idx = text.find(oid)
+
+        if idx < text.count and text.oid_at(idx) == oid:
+            subtree_flag = (text.kind_at(idx) ==
+                            self._text_parser.grammar.SUBTREE)
+
+            return text.offset_at(idx), subtree_flag, self._prev_offset(idx)
+
+        raise KeyError(oid)
+
+    def search(self, oid):
+        text = self._text
+
+        idx = text.find(tuple(oid))
+
+        if idx < text.count:
+            return text.offset_at(idx)
+
+        return text.size
+
+    def open(self):
+        self._text = self.open_text()
+
+    def close(self):
+        self._text.close()
+        self._text = None
+
+    def get_handles(self):
+        text, _ = RecordIndex.get_handles(self)
+        return text, text
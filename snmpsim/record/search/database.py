@@ -8,11 +8,14 @@
 import os
 import sys
 
+from pyasn1.compat.octets import str2octs
+
 from snmpsim import confdir
 from snmpsim import error
 from snmpsim import log
 from snmpsim import utils
 from snmpsim.record.search.file import get_record
+from snmpsim.record.search.file import search_record_by_oid
 
 dbm = utils.try_load('anydbm')
 if dbm:
@@ -25,9 +28,10 @@ else:
 
 class RecordIndex(object):
 
-    def __init__(self, text_file, text_parser):
+    def __init__(self, text_file, text_parser, memory_map=False):
         self._text_file = text_file
         self._text_parser = text_parser
+        self._memory_map = memory_map
 
         try:
             self._db_file = text_file[:text_file.rindex(os.path.extsep)]
@@ -53,6 +57,11 @@ class RecordIndex(object):
     def is_open(self):
         return self._db is not None
 
+    @property
+    def text_file_time(self):
+        """Modification time of the indexed data file"""
+        return self._text_file_time
+
     def get_handles(self):
         if self.is_open():
             if self._text_file_time != os.stat(self._text_file)[8]:
@@ -218,10 +227,32 @@ class RecordIndex(object):
         return self
 
     def lookup(self, oid):
-        return self._db[oid]
+        """Look up indexed record by exact OID.
+
+        Returns a tuple of record offset, subtree flag and the offset of
+        the preceding subtree record (or -1). Raises `KeyError` if OID
+        is not indexed.
+        """
+        if not isinstance(oid, str):
+            oid = '.'.join(['%s' % x for x in oid])
+
+        offset, subtree_flag, prev_offset = self._db[oid].split(
+            str2octs(','), 2)
+
+        return int(offset), int(subtree_flag), int(prev_offset)
+
+    def search(self, oid):
+        """Find offset of the first record following given OID"""
+        return search_record_by_oid(oid, self._text, self._text_parser)
+
+    def open_text(self):
+        if self._memory_map:
+            return self._text_parser.open_mapped(self._text_file)
+
+        return self._text_parser.open(self._text_file)
 
     def open(self):
-        self._text = self._text_parser.open(self._text_file)
+        self._text = self.open_text()
         self._db = dbm.open(self._db_file)
 
     def close(self):
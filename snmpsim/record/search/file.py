@@ -4,6 +4,8 @@
 # Copyright (c) 2010-2019, Ilya Etingof <etingof@gmail.com>
 # License: http://snmplabs.com/snmpsim/license.html
 #
+import mmap
+
 from pyasn1.compat.octets import str2octs
 
 
@@ -33,6 +35,10 @@ def get_record(fileObj, line_no=None, offset=0):
 
 def find_eol(file_obj, offset, block_size=256, eol=str2octs('\n')):
 
+    if isinstance(file_obj, mmap.mmap):
+        # whole file is addressable, no need to read it by blocks
+        return file_obj.rfind(eol, 0, offset) + 1
+
     while True:
         if offset < block_size:
             offset, block_size = 0, offset
@@ -0,0 +1,205 @@
+#
+# This file is part of snmpsim software.
+#
+# Copyright (c) 2010-2019, Ilya Etingof <etingof@gmail.com>
+# License: http://snmplabs.com/snmpsim/license.html
+#
+# In-memory, bisection-searchable simulation data index
+#
+import array
+import bisect
+import os
+import struct
+
+from snmpsim import error
+from snmpsim import log
+from snmpsim.record.search.database import RecordIndex
+from snmpsim.record.search.file import get_record
+
+# sub-OIDs are packed as fixed-width big-endian unsigned integers, so that
+# byte-wise comparison of packed keys follows OID ordering
+_OID_STRUCTS = {}
+
+
+def encode_oid(oid):
+    """Pack OID into an order-preserving binary key"""
+    try:
+        packer = _OID_STRUCTS[len(oid)]
+
+    except KeyError:
+        packer = _OID_STRUCTS[len(oid)] = struct.Struct('>%dL' % len(oid))
+
+    return packer.pack(*oid)
+
+
+class MemoryRecordIndex(RecordIndex):
+    """Simulation data index kept in process memory.
+
+    All OIDs of a data file are loaded into a sorted list of packed keys
+    along with parallel arrays of record offset, subtree flag and
+    previous subtree record offset. Both exact and next OID lookups
+    are served by bisection, no DBM file is involved.
+    """
+
+    def __init__(self, text_file, text_parser, memory_map=False):
+        RecordIndex.__init__(self, text_file, text_parser, memory_map)
+
+        self._oids = None
+        self._offsets = array.array('l')
+        self._flags = array.array('b')
+        self._prev_offsets = array.array('l')
+        self._last = None
+
+        self._db_type = 'memory'
+
+    def __str__(self):
+        return 'Data file %s, %s-indexed, %s' % (
+            self._text_file, self._db_type,
+            self._text and 'opened' or 'closed')
+
+    def is_open(self):
+        return self._text is not None
+
+    def create(self, force_index_build=False, validate_data=False):
+        text_file_time = os.stat(self._text_file)[8]
+
+        if (self._oids is not None and not force_index_build and
+                self._text_file_time == text_file_time):
+            return self
+
+        try:
+            text = self._text_parser.open(self._text_file)
+
+        except Exception as exc:
+            raise error.SnmpsimError(
+                'Failed to open data file %s: %s' % (self._text_file, exc))
+
+        log.info(
+            'Building in-memory index for data file '
+            '%s...' % self._text_file)
+
+        oids = []
+        offsets = array.array('l')
+        flags = array.array('b')
+        prev_offsets = array.array('l')
+
+        line_no = 0
+        offset = 0
+        prev_offset = -1
+
+        try:
+            while True:
+                line, line_no, offset = get_record(text, line_no, offset)
+
+                if not line:
+                    # reference to last OID in data file
+                    last = offset, 0, prev_offset
+                    break
+
+                try:
+                    oid, tag, val = self._text_parser.grammar.parse(line)
+
+                    key = encode_oid(self._text_parser.evaluate_oid(oid))
+
+                except Exception as exc:
+                    raise error.SnmpsimError(
+                        'Data error at %s:%d:'
+                        ' %s' % (self._text_file, line_no, exc))
+
+                if validate_data:
+                    try:
+                        self._text_parser.evaluate_value(
+                            oid, tag, val, dataValidation=True
+                        )
+
+                    except Exception as exc:
+                        log.info(
+                            'ERROR at line %s, value %r: '
+                            '%s' % (line_no, val, exc))
+
+                subtree_flag = tag[0] == ':'
+
+                oids.append(key)
+                offsets.append(offset)
+                flags.append(subtree_flag)
+                prev_offsets.append(prev_offset)
+
+                # for lines serving subtrees, type is empty in tag field
+                if subtree_flag:
+                    prev_offset = offset
+
+                else:
+                    prev_offset = -1   # not a subtree - no back reference
+
+                offset += len(line)
+
+        finally:
+            text.close()
+
+        if any(oids[idx] > oids[idx + 1] for idx in range(len(oids) - 1)):
+            log.error(
+                'Data file %s is not sorted by OID, next OID lookups '
+                'may be inaccurate' % self._text_file)
+
+            order = sorted(range(len(oids)), key=oids.__getitem__)
+
+            oids = [oids[idx] for idx in order]
+            offsets = array.array('l', [offsets[idx] for idx in order])
+            flags = array.array('b', [flags[idx] for idx in order])
+            prev_offsets = array.array(
+                'l', [prev_offsets[idx] for idx in order])
+
+        self._oids = oids
+        self._offsets = offsets
+        self._flags = flags
+        self._prev_offsets = prev_offsets
+        self._last = last
+
+        log.info('...%d entries indexed' % line_no)
+
+        self._text_file_time = text_file_time
+
+        return self
+
+    def lookup(self, oid):
+        if oid == 'last':
+            return self._last
+
+        try:
+            key = encode_oid(oid)
+
+        except struct.error:
+            raise KeyError(oid)
+
+        # like with DBM, the last of duplicate records wins
+        idx = bisect.bisect_right(self._oids, key) - 1
+
+        if idx >= 0 and self._oids[idx] == key:
+            return self._offsets[idx], self._flags[idx], self._prev_offsets[idx]
+
+        raise KeyError(oid)
+
+    def search(self, oid):
+        try:
+            key = encode_oid(oid)
+
+        except struct.error:
+            return RecordIndex.search(self, oid)
+
+        idx = bisect.bisect_left(self._oids, key)
+
+        if idx < len(self._oids):
+            return self._offsets[idx]
+
+        return self._last[0]
+
+    def open(self):
+        self._text = self.open_text()
+
+    def close(self):
+        self._text.close()
+        self._text = None
+
+    def get_handles(self):
+        text, _ = RecordIndex.get_handles(self)
+        return text, self._oids
@@ -5,10 +5,14 @@
 # License: http://snmplabs.com/snmpsim/license.html
 #
 import bz2
+import mmap
+import struct
 
 from snmpsim import error
 from snmpsim.grammar import snmprec
+from snmpsim.record import abstract
 from snmpsim.record import dump
+from snmpsim.record.search.binary import BinaryRecordIndex
 
 from pyasn1.compat import octets
 
@@ -103,6 +107,16 @@ class SnmprecRecord(dump.DumpRecord):
                 'value evaluation error for tag %r, value '
                 '%r: %s' % (tag, value, exc))
 
+    def is_static(self, line):
+        try:
+            oid, tag, value = self.grammar.parse(line)
+
+        except error.SnmpsimError:
+            return False
+
+        # values of variation module records are computed on every call
+        return ':' not in tag
+
     def format_value(self, oid, value, **context):
         if 'nohex' in context and context['nohex']:
             hexvalue = None
@@ -139,3 +153,209 @@ class CompressedSnmprecRecord(SnmprecRecord):
     @staticmethod
     def open(path, flags='rb'):
         return bz2.BZ2File(path, flags)
+
+    @staticmethod
+    def open_mapped(path):
+        # compressed data can not be read through memory map
+        return bz2.BZ2File(path, 'rb')
+
+
+class BinarySnmprecFile(object):
+    """Read-only binary snmprec data file.
+
+    The file starts with a header followed by a fixed-width table of
+    record offsets and BER-encoded records sorted by OID. Records are
+    served one by one through `readline` so that binary data file could
+    be read by the same code as text data files.
+    """
+    HEADER = struct.Struct('>8sBL')
+    OFFSET = struct.Struct('>L')
+
+    MAGIC = octets.str2octs('SNMPRECB')
+    VERSION = 1
+
+    def __init__(self, file_obj, grammar):
+        self._file = file_obj
+        self._grammar = grammar
+
+        try:
+            magic, version, self.count = self.HEADER.unpack(
+                file_obj.read(self.HEADER.size))
+
+        except struct.error:
+            magic = version = None
+
+        if magic != self.MAGIC or version != self.VERSION:
+            file_obj.close()
+            raise error.SnmpsimError(
+                'not a binary snmprec file or unsupported version')
+
+        self._records_offset = (
+            self.HEADER.size + self.OFFSET.size * self.count)
+
+        if isinstance(file_obj, mmap.mmap):
+            self._table, self._table_offset = file_obj, self.HEADER.size
+
+        else:
+            self._table = file_obj.read(self.OFFSET.size * self.count)
+            self._table_offset = 0
+
+        file_obj.seek(0, 2)
+
+        self.size = file_obj.tell()
+
+        self._pos = self._records_offset
+
+    def offset_at(self, idx):
+        return self.OFFSET.unpack_from(
+            self._table, self._table_offset + idx * self.OFFSET.size)[0]
+
+    def record_at(self, offset):
+        self._file.seek(offset)
+
+        # record tag and the longest length we could possibly meet
+        record = self._file.read(6)
+
+        if record:
+            length, offset = self._grammar.decode_length(record, 1)
+
+            length += offset
+
+            if length > len(record):
+                record += self._file.read(length - len(record))
+
+            record = record[:length]
+
+        return record
+
+    def kind_at(self, idx):
+        self._file.seek(self.offset_at(idx))
+        return ord(self._file.read(1))
+
+    def oid_at(self, idx):
+        return self._grammar.parse_oid(self.record_at(self.offset_at(idx)))
+
+    def find(self, oid):
+        """Return number of the first record with OID not less than given"""
+        lo, hi = 0, self.count
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+
+            if self.oid_at(mid) < oid:
+                lo = mid + 1
+
+            else:
+                hi = mid
+
+        return lo
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self._pos
+
+        elif whence == 2:
+            offset += self.size
+
+        self._pos = max(offset, self._records_offset)
+
+    def tell(self):
+        return self._pos
+
+    def readline(self):
+        if self._pos >= self.size:
+            return octets.null
+
+        record = self.record_at(self._pos)
+
+        self._pos += len(record)
+
+        return record
+
+    def close(self):
+        self._file.close()
+
+
+class BinarySnmprecWriter(object):
+    """Collects binary snmprec records, writes them out sorted on close"""
+
+    def __init__(self, file_obj, grammar):
+        self._file = file_obj
+        self._grammar = grammar
+        self._records = []
+
+    def write(self, record):
+        self._records.append((self._grammar.parse_oid(record), record))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        records = sorted(self._records, key=lambda x: x[0])
+
+        # like with text data file index, the last of duplicates wins
+        records = [record for idx, (oid, record) in enumerate(records)
+                   if idx + 1 == len(records) or records[idx + 1][0] != oid]
+
+        header = BinarySnmprecFile.HEADER
+        offset_size = BinarySnmprecFile.OFFSET.size
+
+        offset = header.size + offset_size * len(records)
+        offsets = []
+
+        for record in records:
+            offsets.append(offset)
+            offset += len(record)
+
+        if offset > 0xffffffff:
+            raise error.SnmpsimError(
+                'binary snmprec file can not exceed 4GB')
+
+        self._file.write(
+            header.pack(BinarySnmprecFile.MAGIC, BinarySnmprecFile.VERSION,
+                        len(records)))
+
+        self._file.write(struct.pack('>%dL' % len(offsets), *offsets))
+
+        for record in records:
+            self._file.write(record)
+
+        self._file.close()
+
+        self._records = []
+
+
+class BinarySnmprecRecord(SnmprecRecord):
+    """BER-encoded, OID-sorted snmprec data file with embedded index"""
+    grammar = snmprec.BinarySnmprecGrammar()
+    ext = 'snmprecb'
+
+    embedded_index = BinaryRecordIndex
+
+    def open(self, path, flags='rb'):
+        if 'w' in flags:
+            return BinarySnmprecWriter(open(path, flags), self.grammar)
+
+        return BinarySnmprecFile(open(path, 'rb'), self.grammar)
+
+    def open_mapped(self, path):
+        return BinarySnmprecFile(
+            abstract.AbstractRecord.open_mapped(path), self.grammar)
+
+    def evaluate_value(self, oid, tag, value, **context):
+        # plain record values come out of the grammar ready-made
+        if hasattr(value, 'tagSet'):
+            return oid, tag, value
+
+        return SnmprecRecord.evaluate_value(self, oid, tag, value, **context)
+
+    def is_static(self, line):
+        return ord(line[0:1]) == self.grammar.PLAIN
+
+    def format(self, oid, value, **context):
+        _, text_tag, text_value = self.format_value(oid, value, **context)
+
+        if ':' in text_tag:
+            return self.grammar.build(oid, text_tag, text_value)
+
+        return self.grammar.build(oid, text_tag, value)
@@ -87,7 +87,7 @@ class NestingDict(dict):
             return value
 
 
-class BaseJsonReporter(base.BaseReporter):
+class BaseJsonReporter(base.BufferedReporter):
     """Common base for JSON-backed family of reporters.
     """
 
@@ -97,6 +97,8 @@ class BaseJsonReporter(base.BaseReporter):
     PRODUCER_UUID = str(uuid.uuid1())
 
     def __init__(self, *args):
+        base.BufferedReporter.__init__(self)
+
         if not args:
             raise error.SnmpsimError(
                 'Missing %s parameter(s). Expected: '
@@ -145,6 +147,16 @@ class BaseJsonReporter(base.BaseReporter):
 
         self._next_dump = now + self.REPORTING_PERIOD
 
+        if self._forward_cbfun:
+            try:
+                self._forward_cbfun(self._metrics)
+
+            except Exception as exc:
+                log.error('Failure while forwarding metrics: %s' % exc)
+
+            self._metrics.clear()
+            return
+
         self._metrics['format'] = self.REPORTING_FORMAT
         self._metrics['version'] = self.REPORTING_VERSION
         self._metrics['producer'] = self.PRODUCER_UUID
@@ -168,6 +180,39 @@ class BaseJsonReporter(base.BaseReporter):
 
         self._metrics.clear()
 
+    def forward_to(self, cbFun):
+        base.BufferedReporter.forward_to(self, cbFun)
+        self._metrics.clear()
+
+    def _merge_metrics(self, metrics, _root=None):
+        """Add up metrics accumulated by another reporter.
+
+        Counters are summed up, update times are stretched to cover
+        both reporters, other values are taken from `metrics`.
+        """
+        if _root is None:
+            _root = self._metrics
+
+        for key, value in metrics.items():
+            if isinstance(value, dict):
+                self._merge_metrics(value, _root[key])
+
+            elif key not in _root:
+                _root[key] = value
+
+            elif key == 'first_update':
+                _root[key] = min(_root[key], value)
+
+            elif key == 'last_update':
+                _root[key] = max(_root[key], value)
+
+            elif (isinstance(value, (int, float)) and
+                    not isinstance(value, bool)):
+                _root[key] += value
+
+            else:
+                _root[key] = value
+
 
 class MinimalJsonReporter(BaseJsonReporter):
     """Collect activity metrics and dump brief report.
@@ -202,14 +247,20 @@ class MinimalJsonReporter(BaseJsonReporter):
         },
         'data_files': {
             'total': 0,
-            'failures': 0
+            'failures': 0,
+            'cache_hits': 0,
+            'cache_misses': 0,
+            'cache_evictions': 0
         }
     }
     """
 
     REPORTING_FORMAT = 'minimaljson'
 
-    def update_metrics(self, **kwargs):
+    # all activity is collapsed into a single scope
+    SCOPE_KEYS = ()
+
+    def process_metrics(self, **kwargs):
         """Process activity update.
 
         Update internal counters based on activity update information.
@@ -258,6 +309,15 @@ class MinimalJsonReporter(BaseJsonReporter):
             metrics['failures'] = (
                     metrics.get('failures', 0)
                     + kwargs.get('datafile_failure_count', 0))
+            metrics['cache_hits'] = (
+                    metrics.get('cache_hits', 0)
+                    + kwargs.get('datafile_cache_hit_count', 0))
+            metrics['cache_misses'] = (
+                    metrics.get('cache_misses', 0)
+                    + kwargs.get('datafile_cache_miss_count', 0))
+            metrics['cache_evictions'] = (
+                    metrics.get('cache_evictions', 0)
+                    + kwargs.get('datafile_cache_eviction_count', 0))
 
             # TODO: some data is still not coming from snmpsim v2carch core
 
@@ -287,6 +347,9 @@ class FullJsonReporter(BaseJsonReporter):
         'producer': <UUID>,
         'first_update': '{timestamp}',
         'last_update': '{timestamp}',
+        'data_files_cache': {
+            'evictions': 0
+        },
         '{transport_protocol}': {
             '{transport_endpoint}': {  # local address
                 'transport_domain': '{transport_domain}',  # endpoint ID
@@ -306,6 +369,8 @@ class FullJsonReporter(BaseJsonReporter):
                                                     'pdus': 0,
                                                     'varbinds': 0,
                                                     'failures': 0,
+                                                    'cache_hits': 0,
+                                                    'cache_misses': 0,
                                                     '{variation_module}': {
                                                         'calls': 0,
                                                         'failures': 0
@@ -327,8 +392,25 @@ class FullJsonReporter(BaseJsonReporter):
     """
     REPORTING_FORMAT = 'fulljson'
 
+    SCOPE_KEYS = (
+        'transportProtocol',
+        'transportEndpoint',
+        'transportDomain',
+        'transportAddress',
+        'snmpEngine',
+        'securityModel',
+        'securityLevel',
+        'securityName',
+        'contextEngineId',
+        'contextName',
+        'pduType',
+        'data_file',
+        'dataFile',
+        'variation',
+    )
+
     @ensure_base_types
-    def update_metrics(self, **kwargs):
+    def process_metrics(self, **kwargs):
         """Process activity update.
 
         Update internal counters based on activity update information.
@@ -349,6 +431,14 @@ class FullJsonReporter(BaseJsonReporter):
 
         metrics['last_update'] = now
 
+        if 'datafile_cache_eviction_count' in kwargs:
+            metrics = metrics['data_files_cache']
+            metrics['evictions'] = (
+                    metrics.get('evictions', 0)
+                    + kwargs['datafile_cache_eviction_count'])
+
+            metrics = self._metrics
+
         try:
             metrics = metrics[kwargs['transport_protocol']]
             metrics = metrics['%s:%s' % kwargs['transport_endpoint']]
@@ -380,11 +470,17 @@ class FullJsonReporter(BaseJsonReporter):
             metrics['varbinds'] = (
                     metrics.get('varbinds', 0)
                     + kwargs.get('varbind_count', 0))
+            metrics['cache_hits'] = (
+                    metrics.get('cache_hits', 0)
+                    + kwargs.get('datafile_cache_hit_count', 0))
+            metrics['cache_misses'] = (
+                    metrics.get('cache_misses', 0)
+                    + kwargs.get('datafile_cache_miss_count', 0))
 
             metrics = metrics['variations']
             metrics = metrics[kwargs['variation']]
             metrics['calls'] = (
-                    metrics.get('pdus', 0)
+                    metrics.get('calls', 0)
                     + kwargs.get('variation_call_count', 0))
             metrics['failures'] = (
                     metrics.get('failures', 0)
@@ -6,11 +6,24 @@
 #
 # SNMP Agent Simulator
 #
+import bisect
+import threading
+import time
+
+from snmpsim import log
 
 
 class BaseReporter(object):
     """Maintain activity metrics.
     """
+    # update parameters holding durations (in seconds) to build
+    # histograms of, durations get measured only if reporter wants them
+    HISTOGRAM_KEYS = ()
+
+    def start(self):
+        """Start background activity, if any.
+        """
+
     def update_metrics(self, **kwargs):
         """Process activity update.
         """
@@ -21,5 +34,174 @@ class BaseReporter(object):
         Reset all counters upon success.
         """
 
+    def forward_to(self, cbFun):
+        """Pass accumulated metrics to `cbFun` rather than dumping them.
+        """
+
+    def merge_metrics(self, metrics):
+        """Add up metrics accumulated by another reporter.
+        """
+
     def __str__(self):
-        return self.__class__.__name__
\ No newline at end of file
+        return self.__class__.__name__
+
+
+class BufferedReporter(BaseReporter):
+    """Accumulate activity metrics in memory, process them off-line.
+
+    Activity updates are summed up into plain integer counters, one set
+    of counters per scope i.e. combination of `SCOPE_KEYS` values of the
+    update. Durations are counted into fixed `HISTOGRAM_BUCKETS` the same
+    way. A background thread periodically hands accumulated counters
+    over to `process_metrics` and calls `flush`, so that request handling
+    path never converts, formats or dumps anything.
+    """
+    FLUSH_INTERVAL = 1
+
+    # upper bounds (in seconds) of histogram buckets
+    HISTOGRAM_BUCKETS = (
+        0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+        0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+    )
+
+    # update parameters making up activity scope
+    SCOPE_KEYS = ()
+
+    # update parameters holding counter increments
+    COUNTER_KEYS = (
+        'transport_call_count',
+        'transport_failure_count',
+        'datafile_call_count',
+        'datafile_failure_count',
+        'datafile_cache_hit_count',
+        'datafile_cache_miss_count',
+        'datafile_cache_eviction_count',
+        'varbind_count',
+        'variation_call_count',
+        'variation_failure_count',
+    )
+
+    def __init__(self):
+        self._counters = tuple(enumerate(self.COUNTER_KEYS))
+
+        # every histogram takes a counter per bucket, one more for the
+        # values beyond the last bucket, then the sum of all values
+        self._histogram_size = len(self.HISTOGRAM_BUCKETS) + 2
+
+        self._histograms = tuple(
+            (len(self._counters) + idx * self._histogram_size, key)
+            for idx, key in enumerate(self.HISTOGRAM_KEYS))
+
+        self._scope_size = (len(self._counters) +
+                            len(self._histograms) * self._histogram_size)
+
+        self._forward_cbfun = None
+        self._reset()
+
+    def _reset(self):
+        self._buffer = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def start(self):
+        """Start background thread processing accumulated metrics.
+        """
+        if self._flusher is None:
+            self._start_flusher()
+
+    def _start_flusher(self):
+        self._flusher = threading.Thread(
+            target=self._run_flusher, name='%s flusher' % self)
+        self._flusher.daemon = True
+        self._flusher.start()
+
+    def _run_flusher(self):
+        while True:
+            time.sleep(self.FLUSH_INTERVAL)
+
+            # request handler might still be updating the buffer being
+            # swapped out, it is processed on the next round
+            pending, self._pending = self._pending, self._buffer
+            self._buffer = {}
+
+            try:
+                with self._lock:
+                    for scope, counters in pending.items():
+                        kwargs = dict(
+                            (key, value)
+                            for key, value in zip(self.SCOPE_KEYS, scope)
+                            if value is not None)
+
+                        kwargs.update(
+                            (key, counters[idx])
+                            for idx, key in self._counters if counters[idx])
+
+                        size = self._histogram_size
+
+                        kwargs.update(
+                            (key, (counters[idx:idx + size - 1],
+                                   counters[idx + size - 1]))
+                            for idx, key in self._histograms
+                            if any(counters[idx:idx + size - 1]))
+
+                        self.process_metrics(**kwargs)
+
+                    self.flush()
+
+            except Exception as exc:
+                log.error('Failure while processing metrics: %s' % exc)
+
+    def update_metrics(self, **kwargs):
+        """Count activity update in.
+        """
+        scope = tuple([kwargs.get(key) for key in self.SCOPE_KEYS])
+
+        try:
+            counters = self._buffer[scope]
+
+        except KeyError:
+            counters = self._buffer[scope] = [0] * self._scope_size
+
+            if self._flusher is None:
+                self._start_flusher()
+
+        for idx, key in self._counters:
+            if key in kwargs:
+                counters[idx] += kwargs[key]
+
+        for idx, key in self._histograms:
+            if key in kwargs:
+                value = kwargs[key]
+                counters[idx + bisect.bisect_left(
+                    self.HISTOGRAM_BUCKETS, value)] += 1
+                counters[idx + self._histogram_size - 1] += value
+
+    def process_metrics(self, **kwargs):
+        """Process activity update accumulated over flushing interval.
+
+        Histograms come as pairs of per-bucket counts and the sum of
+        all durations.
+        """
+
+    def forward_to(self, cbFun):
+        """Pass accumulated metrics to `cbFun` rather than dumping them.
+
+        Worker processes use that to ship their metrics to the
+        supervisor process right upon fork, so whatever has been
+        accumulated by the parent process is dropped and the background
+        thread, which does not survive fork, gets restarted.
+        """
+        self._forward_cbfun = cbFun
+        self._reset()
+
+    def merge_metrics(self, metrics):
+        """Add up metrics accumulated by another reporter.
+        """
+        self.start()
+
+        with self._lock:
+            self._merge_metrics(metrics)
+
+    def _merge_metrics(self, metrics):
+        pass
@@ -0,0 +1,335 @@
+#
+# This file is part of snmpsim software.
+#
+# Copyright (c) 2010-2019, Ilya Etingof <etingof@gmail.com>
+# License: http://snmplabs.com/snmpsim/license.html
+#
+# SNMP Agent Simulator
+#
+import socket
+import threading
+
+try:
+    from http.server import BaseHTTPRequestHandler
+    from http.server import HTTPServer
+
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from BaseHTTPServer import HTTPServer
+
+from snmpsim import error
+from snmpsim import log
+from snmpsim.reporting.formats import base
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# counter update parameter -> metric name, help text
+COUNTERS = (
+    ('transport_call_count', 'snmpsim_transport_requests_total',
+     'SNMP requests served'),
+    ('transport_failure_count', 'snmpsim_transport_failures_total',
+     'SNMP requests failed'),
+    ('datafile_call_count', 'snmpsim_datafile_requests_total',
+     'Requests to simulation data files'),
+    ('datafile_failure_count', 'snmpsim_datafile_failures_total',
+     'Failed requests to simulation data files'),
+    ('datafile_cache_hit_count', 'snmpsim_datafile_cache_hits_total',
+     'Requests to simulation data files being open'),
+    ('datafile_cache_miss_count', 'snmpsim_datafile_cache_misses_total',
+     'Requests to simulation data files that had to be opened'),
+    ('datafile_cache_eviction_count',
+     'snmpsim_datafile_cache_evictions_total',
+     'Simulation data files closed to make room for other ones'),
+    ('varbind_count', 'snmpsim_varbinds_total',
+     'Variable bindings served'),
+    ('variation_call_count', 'snmpsim_variation_calls_total',
+     'Variation module calls'),
+    ('variation_failure_count', 'snmpsim_variation_failures_total',
+     'Failed variation module calls'),
+)
+
+# histogram update parameter -> metric name, help text
+HISTOGRAMS = (
+    ('datafile_call_time', 'snmpsim_datafile_request_duration_seconds',
+     'Time spent serving requests by simulation data files'),
+    # request processing stages, timed on demand
+    ('context_probe_time', 'snmpsim_context_probe_duration_seconds',
+     'Time spent selecting simulation data file for request'),
+    ('index_lookup_time', 'snmpsim_index_lookup_duration_seconds',
+     'Time spent looking up data file index per request'),
+    ('record_evaluation_time', 'snmpsim_record_evaluation_duration_seconds',
+     'Time spent evaluating data file records per request'),
+    ('variation_call_time', 'snmpsim_variation_call_duration_seconds',
+     'Time spent in variation module calls'),
+    ('ber_encoding_time', 'snmpsim_ber_encoding_duration_seconds',
+     'Time spent BER-encoding responses'),
+)
+
+
+def _format_label_value(value):
+    if isinstance(value, tuple):  # transport endpoint
+        value = '%s:%s' % value[:2]
+
+    return str(value).replace(
+        '\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, *extra):
+    labels = labels + extra
+
+    if not labels:
+        return ''
+
+    return '{%s}' % ','.join(
+        ['%s="%s"' % (name, value) for name, value in labels])
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _ExpositionHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+
+        body = self.server.reporter.exposition
+
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        log.debug('Metrics scraped by %s: %s' % (
+            self.client_address[0], fmt % args))
+
+
+class PrometheusReporter(base.BufferedReporter):
+    """Serve live activity metrics over HTTP.
+
+    Accumulates activity counters and request processing duration
+    histograms, labeled by transport endpoint, simulation data file
+    and variation module, and serves them in Prometheus text exposition
+    format at `http://<host>:<port>/metrics`.
+
+    The exposition document is rebuilt by the background thread every
+    `FLUSH_INTERVAL` seconds, so scraping does not interfere with
+    serving SNMP requests.
+
+    `PrometheusReporter` works with both SNMPv1/v2c and SNMPv3
+    command responder, however the lightweight one does not report
+    transport endpoints.
+    """
+    SCOPE_KEYS = (
+        'transportDomain',
+        'transportEndpoint',
+        'data_file',
+        'dataFile',
+        'variation',
+    )
+
+    HISTOGRAM_KEYS = tuple(key for key, _, _ in HISTOGRAMS)
+
+    # scope key -> label name
+    LABELS = {
+        'transportDomain': 'transport_domain',
+        'transportEndpoint': 'transport_endpoint',
+        'data_file': 'data_file',
+        'dataFile': 'data_file',
+        'variation': 'variation',
+    }
+
+    def __init__(self, *args):
+        base.BufferedReporter.__init__(self)
+
+        if not args:
+            raise error.SnmpsimError(
+                'Missing %s parameter(s). Expected: '
+                '<method>:[<host>:]<port>' % self.__class__.__name__)
+
+        if len(args) > 1:
+            host, port = args[0], args[1]
+
+        else:
+            host, port = '127.0.0.1', args[0]
+
+        try:
+            port = int(port)
+
+        except ValueError:
+            raise error.SnmpsimError('Malformed HTTP port: %s' % port)
+
+        try:
+            self._server = HTTPServer((host, port), _ExpositionHandler)
+
+        except socket.error as exc:
+            raise error.SnmpsimError(
+                'Failed to listen for HTTP at %s:%s: %s' % (host, port, exc))
+
+        self._server.reporter = self
+        self._serving = False
+
+        # metric name -> {labels: value}
+        self._counters_series = dict(
+            (name, {}) for _, name, _ in COUNTERS)
+
+        # metric name -> {labels: [bucket counts..., sum]}
+        self._histograms_series = dict(
+            (name, {}) for _, name, _ in HISTOGRAMS)
+
+        self.exposition = self._render()
+
+        log.debug(
+            'Initialized %s metrics reporter listening at '
+            'http://%s:%s/metrics' % (self.__class__.__name__, host, port))
+
+    def start(self):
+        base.BufferedReporter.start(self)
+
+        if self._server is not None and not self._serving:
+            server_thread = threading.Thread(
+                target=self._server.serve_forever, name='%s server' % self)
+            server_thread.daemon = True
+            server_thread.start()
+
+            self._serving = True
+
+    def forward_to(self, cbFun):
+        base.BufferedReporter.forward_to(self, cbFun)
+
+        # HTTP endpoint is served by the supervisor process
+        if self._server is not None:
+            self._server.server_close()
+            self._server = None
+
+        for series in self._counters_series.values():
+            series.clear()
+
+        for series in self._histograms_series.values():
+            series.clear()
+
+    def process_metrics(self, **kwargs):
+        """Process activity update.
+
+        Add up counters and histograms of the scope of the update.
+        """
+        labels = tuple(
+            (self.LABELS[key], _format_label_value(kwargs[key]))
+            for key in self.SCOPE_KEYS if key in kwargs)
+
+        for key, name, _ in COUNTERS:
+            if key in kwargs:
+                series = self._counters_series[name]
+                series[labels] = series.get(labels, 0) + kwargs[key]
+
+        for key, name, _ in HISTOGRAMS:
+            if key in kwargs:
+                counts, total = kwargs[key]
+
+                series = self._histograms_series[name]
+
+                values = series.get(labels)
+
+                if values is None:
+                    values = series[labels] = [0] * (len(counts) + 1)
+
+                for idx, count in enumerate(counts):
+                    values[idx] += count
+
+                values[-1] += total
+
+    def flush(self):
+        """Rebuild exposition document or forward accumulated metrics.
+        """
+        if self._forward_cbfun:
+            metrics = {
+                'counters': dict(
+                    (name, [[list(labels), value]
+                            for labels, value in series.items()])
+                    for name, series in self._counters_series.items()
+                    if series),
+                'histograms': dict(
+                    (name, [[list(labels), values]
+                            for labels, values in series.items()])
+                    for name, series in self._histograms_series.items()
+                    if series)
+            }
+
+            if metrics['counters'] or metrics['histograms']:
+                try:
+                    self._forward_cbfun(metrics)
+
+                except Exception as exc:
+                    log.error('Failure while forwarding metrics: %s' % exc)
+
+                for series in self._counters_series.values():
+                    series.clear()
+
+                for series in self._histograms_series.values():
+                    series.clear()
+
+            return
+
+        self.exposition = self._render()
+
+    def _merge_metrics(self, metrics):
+        for name, items in metrics.get('counters', {}).items():
+            series = self._counters_series.setdefault(name, {})
+
+            for labels, value in items:
+                labels = tuple(tuple(label) for label in labels)
+                series[labels] = series.get(labels, 0) + value
+
+        for name, items in metrics.get('histograms', {}).items():
+            series = self._histograms_series.setdefault(name, {})
+
+            for labels, values in items:
+                labels = tuple(tuple(label) for label in labels)
+
+                if labels in series:
+                    series[labels] = [
+                        x + y for x, y in zip(series[labels], values)]
+
+                else:
+                    series[labels] = list(values)
+
+    def _render(self):
+        lines = []
+
+        for _, name, text in COUNTERS:
+            lines.append('# HELP %s %s.' % (name, text))
+            lines.append('# TYPE %s counter' % name)
+
+            for labels, value in sorted(self._counters_series[name].items()):
+                lines.append('%s%s %s' % (
+                    name, _format_labels(labels), _format_number(value)))
+
+        bounds = [_format_number(float(bound))
+                  for bound in self.HISTOGRAM_BUCKETS] + ['+Inf']
+
+        for _, name, text in HISTOGRAMS:
+            lines.append('# HELP %s %s.' % (name, text))
+            lines.append('# TYPE %s histogram' % name)
+
+            for labels, values in sorted(
+                    self._histograms_series[name].items()):
+                count = 0
+
+                for bound, bucket_count in zip(bounds, values[:-1]):
+                    count += bucket_count
+                    lines.append('%s_bucket%s %s' % (
+                        name, _format_labels(labels, ('le', bound)), count))
+
+                lines.append('%s_sum%s %s' % (
+                    name, _format_labels(labels), _format_number(values[-1])))
+                lines.append('%s_count%s %s' % (
+                    name, _format_labels(labels), count))
+
+        lines.append('')
+
+        return '\n'.join(lines).encode('utf-8')
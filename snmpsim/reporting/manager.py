@@ -9,6 +9,7 @@
 from snmpsim import error
 from snmpsim.reporting.formats import alljson
 from snmpsim.reporting.formats import null
+from snmpsim.reporting.formats import prometheus
 from snmpsim import log
 
 
@@ -27,10 +28,17 @@ class ReportingManager(object):
         'null': null.NullReporter,
         'fulljson': alljson.FullJsonReporter,
         'minimaljson': alljson.MinimalJsonReporter,
+        'prometheus': prometheus.PrometheusReporter,
     }
 
     _reporter = null.NullReporter()
 
+    # whether the reporter wants durations of request processing
+    timings = False
+
+    # whether stages of request processing get timed as well
+    stage_timings = False
+
     @classmethod
     def configure(cls, fmt, *args):
         try:
@@ -41,11 +49,37 @@ class ReportingManager(object):
 
         cls._reporter = reporter(*args)
 
+        cls.timings = bool(cls._reporter.HISTOGRAM_KEYS)
+
         log.info('Using "%s" activity reporting method with '
                  'params %s' % (cls._reporter, ', '.join(args)))
 
     @classmethod
-    def update_metrics(cls, **kwargs):
+    def time_stages(cls, enable=True):
+        """Have stages of request processing timed.
+
+        Takes effect only if configured reporter wants durations.
+        """
+        cls.stage_timings = bool(enable) and cls.timings
+
+    @classmethod
+    def start(cls):
+        """Start background activity of the reporter.
 
+        Should be called once the process is done forking.
+        """
+        cls._reporter.start()
+
+    @classmethod
+    def forward_to(cls, cbFun):
+        """Pass accumulated metrics to `cbFun` rather than dumping them"""
+        cls._reporter.forward_to(cbFun)
+
+    @classmethod
+    def merge_metrics(cls, metrics):
+        """Add up metrics accumulated by another process"""
+        cls._reporter.merge_metrics(metrics)
+
+    @classmethod
+    def update_metrics(cls, **kwargs):
         cls._reporter.update_metrics(**kwargs)
-        cls._reporter.flush()
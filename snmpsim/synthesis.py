@@ -0,0 +1,113 @@
+#
+# This file is part of snmpsim software.
+#
+# Copyright (c) 2010-2019, Ilya Etingof <etingof@gmail.com>
+# License: http://snmplabs.com/snmpsim/license.html
+#
+# SNMP managed objects values synthesis
+#
+import random
+
+from pyasn1.error import PyAsn1Error
+from pyasn1.type import univ
+from pysnmp.proto import rfc1902
+
+from snmpsim.error import SnmpsimError
+
+STRING_POOL = ['Jaded', 'zombies', 'acted', 'quaintly', 'but',
+               'kept', 'driving', 'their', 'oxen', 'forward']
+
+
+class ValueSynthesizer(object):
+    """Make up random values of SNMP types.
+
+    Random numbers are drawn from `rng` (`random.Random` instance), so
+    a seeded one yields the same values over again.
+    """
+    # most words in simulated string value
+    max_words = 10
+
+    def __init__(self, rng=None, string_pool=None,
+                 integer32_range=(0, 32), unsigned_range=(0, 65535),
+                 counter_range=(0, 0xffffffff),
+                 counter64_range=(0, 0xffffffffffffffff),
+                 gauge_range=(0, 0xffffffff),
+                 timeticks_range=(0, 0xffffffff)):
+        self._rng = rng or random.Random()
+        self._string_pool = string_pool or STRING_POOL
+        self._integer32_range = integer32_range
+        self._unsigned_range = unsigned_range
+        self._counter_range = counter_range
+        self._counter64_range = counter64_range
+        self._gauge_range = gauge_range
+        self._timeticks_range = timeticks_range
+
+    def guess(self, syntax):
+        """Return random initializer for a value of `syntax` type"""
+        rng = self._rng
+
+        if isinstance(syntax, rfc1902.IpAddress):
+            return '.'.join([str(rng.randrange(1, 256)) for x in range(4)])
+
+        elif isinstance(syntax, rfc1902.TimeTicks):
+            return rng.randrange(*self._timeticks_range)
+
+        elif isinstance(syntax, rfc1902.Gauge32):
+            return rng.randrange(*self._gauge_range)
+
+        elif isinstance(syntax, rfc1902.Counter32):
+            return rng.randrange(*self._counter_range)
+
+        elif isinstance(syntax, rfc1902.Integer32):
+            return rng.randrange(*self._integer32_range)
+
+        elif isinstance(syntax, rfc1902.Unsigned32):
+            return rng.randrange(*self._unsigned_range)
+
+        elif isinstance(syntax, rfc1902.Counter64):
+            return rng.randrange(*self._counter64_range)
+
+        elif isinstance(syntax, univ.OctetString):
+            return ' '.join([self._string_pool[rng.randrange(0, len(self._string_pool))]
+                             for i in range(rng.randrange(1, self.max_words))])
+
+        elif isinstance(syntax, univ.ObjectIdentifier):
+            return '.'.join(['1', '3', '6', '1', '3'] + [
+                '%d' % rng.randrange(0, 255)
+                for x in range(rng.randrange(0, 10))])
+
+        elif isinstance(syntax, rfc1902.Bits):
+            return [rng.randrange(0, 256)
+                    for x in range(rng.randrange(0, 9))]
+
+        return '?'
+
+    @staticmethod
+    def clone(syntax, value):
+        """Make `syntax` type value out of `value` ignoring enumerations.
+
+        Raises `PyAsn1Error` if `value` does not satisfy `syntax`
+        constraints.
+        """
+        if syntax.tagSet == rfc1902.Integer32.tagSet:
+            return rfc1902.Integer32(syntax.clone(value))
+
+        if syntax.tagSet == rfc1902.Unsigned32.tagSet:
+            return rfc1902.Unsigned32(syntax.clone(value))
+
+        if syntax.tagSet == rfc1902.Bits.tagSet:
+            return rfc1902.OctetString(syntax.clone(value))
+
+        return syntax.clone(value)
+
+    def synthesize(self, syntax, attempts=5000):
+        """Return random value of `syntax` type satisfying its constraints"""
+        for _ in range(attempts):
+            try:
+                return self.clone(syntax, self.guess(syntax))
+
+            except PyAsn1Error:
+                continue
+
+        raise SnmpsimError(
+            'Failed to synthesize %s value' % syntax.__class__.__name__)
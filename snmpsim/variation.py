@@ -6,10 +6,13 @@
 #
 # Variation module support in simulation data
 #
+import collections
 import os
+import time
 
 from pyasn1.error import PyAsn1Error
 from pyasn1.type import univ
+from pysnmp.smi import exval
 from pysnmp.smi.error import MibOperationError
 
 from snmpsim import log
@@ -30,6 +33,152 @@ RECORD_TYPES = {
 }
 
 
+class PendingValue(object):
+    """Placeholder for var-bind value being computed in a batch"""
+
+    def __init__(self, record, oid, tag, context, keeps_oid=False):
+        self.record = record
+        self.record_oid = self.oid = oid
+        self.tag = tag
+        self.context = context
+        self.keeps_oid = keeps_oid
+        self.value = context['errorStatus']
+        self.failed = False
+
+    def fail(self, exc):
+        log.error(
+            'data error at %s for %s: %s', self.context['dataFile'],
+            self.oid, exc)
+
+        self.failed = True
+
+    def resolve(self, value):
+        if isinstance(value, Exception):
+            self.fail(value)
+            return
+
+        if isinstance(value, tuple):  # as `variate` returns
+            self.oid, self.tag, value = value
+
+        if hasattr(value, 'tagSet'):  # already a pyasn1 object
+            self.value = value
+            return
+
+        try:
+            _, _, self.value = snmprec.SnmprecRecord.evaluate_value(
+                self.record, self.oid, self.tag, value, **self.context)
+
+        except Exception as exc:
+            self.fail(exc)
+
+    @property
+    def skipped(self):
+        """GETNEXT evaluation came up with no value, next record is due"""
+        return (not self.failed and self.context.get('nextFlag') and
+                self.value is exval.endOfMib)
+
+    @property
+    def var_bind(self):
+        """Response var-bind, the same as one-by-one evaluation yields.
+
+        Failed evaluation makes requested OID come back with error
+        status value.
+        """
+        if self.failed:
+            return self.context['origOid'], self.context['errorStatus']
+
+        return self.oid, self.value
+
+
+class VariationBatch(object):
+    """Variation module calls collected for evaluation in one go.
+
+    Variation modules implementing `variate_batch(calls)` handler get
+    the calls made while reading var-binds of a SNMP request deferred
+    till the whole request has been looked up. Meanwhile, var-binds
+    carry `PendingValue` placeholders.
+
+    The `variate_batch` handler is given a sequence of `(oid, tag, value,
+    recordContext, context)` tuples and is expected to return the
+    sequence of the same size. Its items are either values, `(oid, tag,
+    value)` tuples like `variate` returns or exceptions. Modules setting
+    `variate_batch_keeps_oids` to true promise to leave OIDs of records
+    intact on GETNEXT, so that OIDs of var-binds are known before
+    evaluation. GETNEXT value of `errorStatus` makes lookup go on to the
+    next record, as it does with `variate`.
+    """
+
+    def __init__(self):
+        self._calls = collections.OrderedDict()
+
+    def __len__(self):
+        return sum([len(calls) for _, calls in self._calls.values()])
+
+    def add(self, record, mod_name, variation_module, oid, tag, value,
+            **context):
+        pending = PendingValue(
+            record, oid, tag, context,
+            variation_module.get('variate_batch_keeps_oids', False))
+
+        if mod_name not in self._calls:
+            self._calls[mod_name] = variation_module, []
+
+        self._calls[mod_name][1].append(
+            (pending, (oid, tag, value, variation_module['recordContext'],
+                       context)))
+
+        return pending
+
+    def run(self, var_binds):
+        """Evaluate collected calls, return var-binds with values in place"""
+        for mod_name, (variation_module, calls) in self._calls.items():
+            handler = variation_module['variate_batch']
+
+            _, (_, _, _, _, context) = calls[0]
+
+            started = time.time()
+
+            try:
+                values = handler([call for _, call in calls])
+
+            except Exception as exc:
+                log.error(
+                    'Variation module "%s" batch evaluation failed: '
+                    '%s' % (mod_name, exc))
+
+                values = [exc] * len(calls)
+
+            else:
+                # the whole batch counts as a single call
+                if ReportingManager.stage_timings:
+                    ReportingManager.update_metrics(
+                        variation=mod_name,
+                        variation_call_time=time.time() - started, **context)
+
+            failures = collections.defaultdict(int)
+
+            for (pending, _), value in zip(calls, values):
+                pending.resolve(value)
+
+                if pending.failed:
+                    failures[pending.context['dataFile']] += 1
+
+            for data_file, count in failures.items():
+                ReportingManager.update_metrics(
+                    data_file=data_file, datafile_failure_count=count,
+                    **context)
+
+                ReportingManager.update_metrics(
+                    variation=mod_name, variation_failure_count=count,
+                    **context)
+
+        self._calls.clear()
+
+        return [var_bind[1].var_bind
+                if isinstance(var_bind[1], PendingValue) else var_bind
+                for var_bind in var_binds]
+
+
 class SnmprecRecordMixIn(object):
 
     def evaluate_value(self, oid, tag, value, **context):
@@ -79,11 +228,33 @@ class SnmprecRecordMixIn(object):
 
                     variation_module['recordContext'] = record_contexts[oid]
 
+                    batch = context.get('variationBatch')
+
+                    # reads can be evaluated in batch
+                    if (batch is not None and
+                            'variate_batch' in variation_module and
+                            not context['setFlag']):
+
+                        value = batch.add(
+                            self, mod_name, variation_module, oid, tag,
+                            value, **context)
+
+                        ReportingManager.update_metrics(
+                            variation=mod_name, variation_call_count=1,
+                            **context)
+
+                        return oid, tag, value
+
                     handler = variation_module['variate']
 
+                    started = time.time()
+
                     # invoke variation module
                     oid, tag, value = handler(oid, tag, value, **context)
 
+                    if ReportingManager.stage_timings:
+                        context['variation_call_time'] = time.time() - started
+
                     ReportingManager.update_metrics(
                         variation=mod_name, variation_call_count=1, **context)
 
@@ -179,6 +350,13 @@ class CompressedSnmprecRecord(
 RECORD_TYPES[CompressedSnmprecRecord.ext] = CompressedSnmprecRecord()
 
 
+class BinarySnmprecRecord(SnmprecRecordMixIn, snmprec.BinarySnmprecRecord):
+    pass
+
+
+RECORD_TYPES[BinarySnmprecRecord.ext] = BinarySnmprecRecord()
+
+
 def load_variation_modules(search_path, modules_options):
 
     variation_modules = {}
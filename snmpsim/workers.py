@@ -0,0 +1,224 @@
+#
+# This file is part of snmpsim software.
+#
+# Copyright (c) 2010-2019, Ilya Etingof <etingof@gmail.com>
+# License: http://snmplabs.com/snmpsim/license.html
+#
+# Pre-forked worker processes management
+#
+import errno
+import json
+import os
+import select
+import signal
+import struct
+import time
+
+from snmpsim import error
+from snmpsim import log
+from snmpsim.reporting.manager import ReportingManager
+
+# workers ship their metrics to supervisor as length-prefixed JSON documents
+_LENGTH = struct.Struct('>L')
+
+# seconds to wait for workers to shut down before killing them
+SHUTDOWN_TIMEOUT = 10
+
+# minimum number of seconds between restarts of the same worker
+RESPAWN_INTERVAL = 1
+
+
+class _Worker(object):
+
+    def __init__(self, worker_id):
+        self.worker_id = worker_id
+        self.pid = None
+        self.pipe = None
+        self.buffer = b''
+        self.started = 0
+
+    def __str__(self):
+        return 'worker #%d (PID %s)' % (self.worker_id, self.pid)
+
+
+def _send_metrics(fd, metrics):
+    data = json.dumps(metrics).encode('utf-8')
+    data = _LENGTH.pack(len(data)) + data
+
+    while data:
+        data = data[os.write(fd, data):]
+
+
+def _start_worker(worker, workers):
+    read_fd, write_fd = os.pipe()
+
+    pid = os.fork()
+
+    if pid:
+        os.close(write_fd)
+
+        worker.pid = pid
+        worker.pipe = read_fd
+        worker.buffer = b''
+        worker.started = time.time()
+
+        log.info('Started %s' % worker)
+
+        return False
+
+    # worker process
+
+    os.close(read_fd)
+
+    for other in workers:
+        if other.pipe is not None:
+            os.close(other.pipe)
+            other.pipe = None
+
+    def signal_cb(signum, frame):
+        raise KeyboardInterrupt
+
+    for signum in signal.SIGTERM, signal.SIGINT:
+        signal.signal(signum, signal_cb)
+
+    for signum in signal.SIGHUP, signal.SIGQUIT:
+        signal.signal(signum, signal.SIG_DFL)
+
+    ReportingManager.forward_to(lambda metrics: _send_metrics(write_fd, metrics))
+
+    return True
+
+
+def _read_metrics(worker):
+    try:
+        data = os.read(worker.pipe, 65536)
+
+    except OSError as exc:
+        if exc.errno == errno.EINTR:
+            return
+
+        data = b''
+
+    if not data:
+        os.close(worker.pipe)
+        worker.pipe = None
+        return
+
+    worker.buffer += data
+
+    while len(worker.buffer) >= _LENGTH.size:
+        length, = _LENGTH.unpack(worker.buffer[:_LENGTH.size])
+
+        if len(worker.buffer) < _LENGTH.size + length:
+            break
+
+        data = worker.buffer[_LENGTH.size:_LENGTH.size + length]
+        worker.buffer = worker.buffer[_LENGTH.size + length:]
+
+        try:
+            ReportingManager.merge_metrics(json.loads(data.decode('utf-8')))
+
+        except Exception as exc:
+            log.error('Failed to merge metrics of %s: %s' % (worker, exc))
+
+
+def _poll_workers(workers, timeout):
+    pipes = dict((w.pipe, w) for w in workers if w.pipe is not None)
+
+    if pipes:
+        try:
+            readable, _, _ = select.select(list(pipes), [], [], timeout)
+
+        except (select.error, OSError) as exc:
+            if exc.args[0] != errno.EINTR:
+                raise
+
+            readable = []
+
+        for fd in readable:
+            _read_metrics(pipes[fd])
+
+    else:
+        time.sleep(timeout)
+
+    while True:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+
+        except OSError as exc:
+            if exc.errno == errno.EINTR:
+                continue
+
+            break  # no children left
+
+        if not pid:
+            break
+
+        for worker in workers:
+            if worker.pid == pid:
+                while worker.pipe is not None:
+                    _read_metrics(worker)
+
+                log.info('Terminated %s, exit status %s' % (worker, status))
+
+                worker.pid = None
+                break
+
+
+def run_workers(count):
+    """Fork `count` worker processes and keep them running.
+
+    Workers that terminate get restarted until the supervisor process
+    gets SIGTERM or SIGINT, then all workers are asked to shut down
+    gracefully. Meanwhile, activity metrics shipped by workers are
+    merged into the reporter of the supervisor process.
+
+    Returns ID of the worker (0..count-1) in the worker process, None
+    in the supervisor process once all workers have terminated.
+    """
+    if not hasattr(os, 'fork'):
+        raise error.SnmpsimError(
+            'Worker processes are not supported on this platform')
+
+    workers = [_Worker(worker_id) for worker_id in range(count)]
+
+    shutdown = []
+
+    def signal_cb(signum, frame):
+        shutdown.append(signum)
+
+    for signum in signal.SIGTERM, signal.SIGINT:
+        signal.signal(signum, signal_cb)
+
+    log.info('Starting %d worker processes...' % count)
+
+    ReportingManager.start()
+
+    while not shutdown:
+        for worker in workers:
+            if (worker.pid is None and
+                    time.time() - worker.started >= RESPAWN_INTERVAL):
+                if _start_worker(worker, workers):
+                    return worker.worker_id
+
+        _poll_workers(workers, RESPAWN_INTERVAL)
+
+    log.info('Shutting down worker processes...')
+
+    for worker in workers:
+        if worker.pid is not None:
+            os.kill(worker.pid, signal.SIGTERM)
+
+    deadline = time.time() + SHUTDOWN_TIMEOUT
+
+    while time.time() < deadline:
+        if all(worker.pid is None for worker in workers):
+            break
+
+        _poll_workers(workers, 0.1)
+
+    for worker in workers:
+        if worker.pid is not None:
+            log.error('Killing %s' % worker)
+            os.kill(worker.pid, signal.SIGKILL)
+            os.waitpid(worker.pid, 0)
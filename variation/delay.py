@@ -7,6 +7,7 @@
 import random
 import time
 
+from snmpsim import dispatch
 from snmpsim import error
 from snmpsim import log
 from snmpsim.grammar.snmprec import SnmprecGrammar
@@ -155,9 +156,12 @@ def variate(oid, tag, value, **context):
         log.info('delay: dropping response for %s' % oid)
         raise error.NoDataNotification()
 
-    log.info('delay: waiting %d milliseconds for %s' % (delay, oid))
+    log.info('delay: waiting %d milliseconds for %s', delay, oid)
 
-    time.sleep(delay / 1000)  # ms
+    # command responders send delayed response off their event loop,
+    # otherwise just block
+    if not dispatch.delay_response(delay / 1000.0):
+        time.sleep(delay / 1000.0)  # ms
 
     if context['setFlag'] or 'value' not in recordContext['settings']:
         return oid, tag, context['origValue']
@@ -11,7 +11,6 @@ import bisect
 import os
 import time
 
-from pyasn1.compat.octets import str2octs
 from pysnmp.proto import rfc1902
 
 from snmpsim import confdir
@@ -228,21 +227,18 @@ def variate(oid, tag, value, **context):
 
     text, db = moduleContext[oid]['datafileobj'].get_handles()
 
-    textOid = str(rfc1902.OctetString(
-        '.'.join(['%s' % x for x in context['origOid']])))
-
     try:
-        line = moduleContext[oid]['datafileobj'].lookup(textOid)
+        offset, subtreeFlag, prevOffset = moduleContext[oid][
+            'datafileobj'].lookup(context['origOid'])
 
     except KeyError:
         offset = search_record_by_oid(context['origOid'], text, parser)
         exactMatch = False
 
     else:
-        offset, subtreeFlag, prevOffset = line.split(str2octs(','))
         exactMatch = True
 
-    text.seek(int(offset))
+    text.seek(offset)
 
     line, _, _ = get_record(text)  # matched line
 
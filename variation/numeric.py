@@ -14,6 +14,7 @@
 #   67 - TimeTicks
 #   70 - Counter64
 #
+import array
 import math
 import random
 import time
@@ -24,8 +25,20 @@ from snmpsim import error
 from snmpsim import log
 from snmpsim.utils import split
 
+try:
+    import numpy
+
+except ImportError:
+    numpy = None
+
 BOOTED = time.time()
 
+# least number of alike formulas in a batch worth vectorizing
+VECTOR_THRESHOLD = 16
+
+# GETNEXT values come with OIDs of their records
+variate_batch_keeps_oids = True
+
 INTEGER_TYPES = set(
     (rfc1902.Counter32.tagSet,
      rfc1902.Counter64.tagSet,
@@ -74,110 +87,341 @@ def init(**context):
                     moduleContext['settings']['taglist'] = '2-65-66-67-70'
 
 
-def variate(oid, tag, value, **context):
-    if not context['nextFlag'] and not context['exactMatch']:
-        return context['origOid'], tag, context['errorStatus']
-
-    if context['setFlag']:
-        return context['origOid'], tag, context['errorStatus']
+class Formula(object):
+    """Numeric record settings compiled into a value generator.
 
-    if 'settings' not in recordContext:
-        recordContext['settings'] = dict(
-            [split(x, '=') for x in split(value, ',')])
+    Record settings are parsed just once and turned into a Python
+    function carrying only the computation steps these settings call
+    for. Calling `evaluate(tnow, vold, told)` yields the value at the
+    time `tnow`, given the previous value `vold` computed at `told`
+    (cumulative formulas only).
+    """
+    def __init__(self, tag, value):
+        settings = dict([split(x, '=') for x in split(value, ',')])
 
-        for k in recordContext['settings']:
+        for k in settings:
             if k != 'function':
-                recordContext['settings'][k] = float(recordContext['settings'][k])
+                settings[k] = float(settings[k])
 
-        if 'min' not in recordContext['settings']:
-            recordContext['settings']['min'] = 0
+        if 'min' not in settings:
+            settings['min'] = 0
 
-        if 'max' not in recordContext['settings']:
+        if 'max' not in settings:
             if tag == '70':
-                recordContext['settings']['max'] = 0xffffffffffffffff
+                settings['max'] = 0xffffffffffffffff
 
             else:
-                recordContext['settings']['max'] = 0xffffffff
+                settings['max'] = 0xffffffff
+
+        if 'rate' not in settings:
+            settings['rate'] = 1
+
+        self.cumulative = 'cumulative' in settings
+        self.initial = settings.get('initial', settings['min'])
+        self.rate = settings['rate']
+        self.scale = settings.get('scale')
+        self.offset = settings.get('offset')
+        self.deviation = int(settings.get('deviation', 0))
+
+        # random deviation is drawn by randrange()
+        if self.deviation != settings.get('deviation', 0):
+            raise error.SnmpsimError(
+                'numeric: deviation must be integer, not %s' % (
+                    settings['deviation']))
+        self.minimum = settings['min']
+        self.maximum = settings['max']
+        self.wrap = 'wrap' in settings
+
+        # index of cumulative state entry
+        self.slot = None
+
+        # formulas of the same kind can be evaluated as a vector
+        if 'function' in settings:
+            self.kind = None
+
+        else:
+            self.kind = ('atime' in settings, self.scale is not None,
+                         self.offset is not None, bool(self.deviation),
+                         self.cumulative)
+
+        namespace = {
+            'BOOTED': BOOTED,
+            'randrange': random.randrange,
+            'rate': settings['rate'],
+            'initial': self.initial,
+            'minimum': settings['min'],
+            'maximum': settings['max'],
+        }
 
-        if 'rate' not in recordContext['settings']:
-            recordContext['settings']['rate'] = 1
+        code = ['def evaluate(tnow, vold, told):']
 
-        if 'function' in recordContext['settings']:
-            f = split(recordContext['settings']['function'], '%')
-            recordContext['settings']['function'] = getattr(math, f[0]), f[1:]
+        if 'atime' in settings:
+            code.append('t = tnow')
 
         else:
-            recordContext['settings']['function'] = lambda x: x, ()
+            code.append('t = tnow - BOOTED')
 
-    vold, told = recordContext['settings'].get(
-        'initial', recordContext['settings']['min']), BOOTED
+        if 'function' in settings:
+            f = split(settings['function'], '%')
 
-    if 'cumulative' in recordContext['settings']:
-        if 'value' not in recordContext:
-            recordContext['value'] = vold, told
+            namespace['function'] = getattr(math, f[0])
 
-        vold, told = recordContext['value']
+            args = []
 
-    tnow = time.time()
+            for idx, x in enumerate(f[1:] or ['<time>']):
+                if x == '<time>':
+                    args.append('t * rate')
+
+                else:
+                    namespace['arg%d' % idx] = float(x)
+                    args.append('arg%d' % idx)
+
+            code.append('v = function(%s)' % ', '.join(args))
+
+        else:
+            code.append('v = t * rate')
+
+        if 'scale' in settings:
+            namespace['scale'] = settings['scale']
+            code.append('v *= scale')
+
+        if 'offset' in settings:
+            namespace['offset'] = settings['offset']
+
+            if self.cumulative:
+                code.append('v += offset * (tnow - told) * rate')
+
+            else:
+                code.append('v += offset')
+
+        if self.deviation:
+            namespace['deviation'] = self.deviation
+            code.append('v += randrange(-deviation, deviation)')
+
+        if self.cumulative:
+            code.append('v = max(v, 0)')
+            code.append('v += vold')
+
+        else:
+            code.append('v += initial')
+
+        code.append('if v < minimum:')
+        code.append('    v = minimum')
+        code.append('elif v > maximum:')
+
+        if 'wrap' in settings:
+            code.append('    v %= maximum')
+            code.append('    v += minimum')
+
+        else:
+            code.append('    v = maximum')
+
+        code.append('return v')
+
+        self.source = '\n    '.join(code) + '\n'
+
+        exec(compile(self.source, '<numeric formula>', 'exec'), namespace)
+
+        self.evaluate = namespace['evaluate']
+
+    def clamp(self, v):
+        if v < self.minimum:
+            return self.minimum
+
+        elif v > self.maximum:
+            if self.wrap:
+                return v % self.maximum + self.minimum
+
+            return self.maximum
+
+        return v
+
+
+def get_formula(record_context, tag, value):
+    try:
+        return record_context['formula']
+
+    except KeyError:
+        pass
+
+    formula = record_context['formula'] = Formula(tag, value)
+
+    if formula.cumulative:
+        # cumulative values and times of all records are kept in arrays
+        if 'values' not in moduleContext:
+            moduleContext['values'] = array.array('d')
+            moduleContext['times'] = array.array('d')
+
+        formula.slot = len(moduleContext['values'])
+
+        moduleContext['values'].append(formula.initial)
+        moduleContext['times'].append(BOOTED)
 
-    if 'atime' in recordContext['settings']:
+    return formula
+
+
+def evaluate(formula, tnow):
+    if not formula.cumulative:
+        return formula.evaluate(tnow, None, None)
+
+    values, times = moduleContext['values'], moduleContext['times']
+
+    v = formula.evaluate(tnow, values[formula.slot], times[formula.slot])
+
+    values[formula.slot] = v
+    times[formula.slot] = tnow
+
+    return v
+
+
+def evaluate_vector(formulas, deviations, tnow):
+    """Evaluate formulas of the same kind with NumPy.
+
+    Yields the same values as the `evaluate` function called for every
+    formula in turn would do.
+    """
+    formula = formulas[0]
+
+    if formula.kind[0]:
         t = tnow
 
     else:
         t = tnow - BOOTED
 
-    f, args = recordContext['settings']['function']
+    rate = numpy.array([f.rate for f in formulas], dtype=float)
 
-    _args = []
+    v = t * rate
 
-    if args:
-        for x in args:
-            if x == '<time>':
-                _args.append(t * recordContext['settings']['rate'])
+    if formula.scale is not None:
+        v *= numpy.array([f.scale for f in formulas], dtype=float)
 
-            else:
-                _args.append(float(x))
+    if formula.cumulative:
+        slots = numpy.array([f.slot for f in formulas], dtype=int)
 
-    else:
-        _args.append(t * recordContext['settings']['rate'])
+        values = numpy.frombuffer(moduleContext['values'], dtype=float)
+        times = numpy.frombuffer(moduleContext['times'], dtype=float)
 
-    v = f(*_args)
+        vold = values.take(slots)
+        told = times.take(slots)
 
-    if 'scale' in recordContext['settings']:
-        v *= recordContext['settings']['scale']
+    if formula.offset is not None:
+        offset = numpy.array([f.offset for f in formulas], dtype=float)
 
-    if 'offset' in recordContext['settings']:
-        if 'cumulative' in recordContext['settings']:
-            rate = recordContext['settings']['rate']
-            v += recordContext['settings']['offset'] * (tnow - told) * rate
+        if formula.cumulative:
+            v += offset * (tnow - told) * rate
 
         else:
-            v += recordContext['settings']['offset']
+            v += offset
 
-    deviation = recordContext['settings'].get('deviation')
-    if deviation:
-        v += random.randrange(-deviation, deviation)
+    if formula.deviation:
+        v += numpy.array(deviations, dtype=float)
 
-    if 'cumulative' in recordContext['settings']:
-        v = max(v, 0)
+    if formula.cumulative:
+        v = numpy.maximum(v, 0)
+        v += vold
+
+    else:
+        v += numpy.array([f.initial for f in formulas], dtype=float)
+
+    v = [f.clamp(x) for f, x in zip(formulas, v.tolist())]
+
+    if formula.cumulative:
+        values[slots] = v
+        times[slots] = tnow
+
+        # release array buffers
+        del values, times
+
+    return v
 
-    v += vold
 
-    if v < recordContext['settings']['min']:
-        v = recordContext['settings']['min']
+def variate(oid, tag, value, **context):
+    if not context['nextFlag'] and not context['exactMatch']:
+        return context['origOid'], tag, context['errorStatus']
+
+    if context['setFlag']:
+        return context['origOid'], tag, context['errorStatus']
 
-    elif v > recordContext['settings']['max']:
-        if 'wrap' in recordContext['settings']:
-            v %= recordContext['settings']['max']
-            v += recordContext['settings']['min']
+    formula = get_formula(recordContext, tag, value)
+
+    return oid, tag, evaluate(formula, time.time())
+
+
+def variate_batch(calls):
+    """Evaluate many records at once.
+
+    Large enough groups of alike formulas are evaluated in vectorized
+    form if NumPy is available, the rest is evaluated one by one.
+    """
+    tnow = time.time()
+
+    values = [None] * len(calls)
+    formulas = [None] * len(calls)
+
+    kinds = {}
+
+    for idx, (oid, tag, value, record_context, context) in enumerate(calls):
+        if not context['nextFlag'] and not context['exactMatch']:
+            values[idx] = context['origOid'], tag, context['errorStatus']
+            continue
+
+        try:
+            formula = formulas[idx] = get_formula(record_context, tag, value)
+
+        except Exception as exc:
+            values[idx] = exc
+            continue
+
+        if numpy is not None and formula.kind is not None:
+            kinds[formula.kind] = kinds.get(formula.kind, 0) + 1
+
+    vectors = {}
+    slots = set()
+
+    def run_vectors():
+        for members in vectors.values():
+            result = evaluate_vector(
+                [formulas[idx] for idx, _ in members],
+                [deviation for _, deviation in members], tnow)
+
+            for (idx, _), value in zip(members, result):
+                values[idx] = value
+
+        vectors.clear()
+        slots.clear()
+
+    # random deviations are drawn in the order var-binds are evaluated
+    for idx, formula in enumerate(formulas):
+        if formula is None:
+            continue
+
+        if kinds.get(formula.kind, 0) < VECTOR_THRESHOLD:
+            try:
+                values[idx] = evaluate(formula, tnow)
+
+            except Exception as exc:
+                values[idx] = exc
+
+            continue
+
+        if formula.cumulative:
+            # repeated record builds upon the value computed before
+            if formula.slot in slots:
+                run_vectors()
+
+            slots.add(formula.slot)
+
+        if formula.deviation:
+            deviation = random.randrange(-formula.deviation, formula.deviation)
 
         else:
-            v = recordContext['settings']['max']
+            deviation = 0
+
+        vectors.setdefault(formula.kind, []).append((idx, deviation))
 
-    if 'cumulative' in recordContext['settings']:
-        recordContext['value'] = v, tnow
+    run_vectors()
 
-    return oid, tag, v
+    return values
 
 
 def record(oid, tag, value, **context):
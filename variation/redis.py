@@ -22,6 +22,7 @@ import random
 import time
 
 from pyasn1.compat import octets
+from pysnmp.proto import rfc1902
 from pysnmp.smi.error import WrongValueError
 
 from snmpsim import error, log
@@ -95,14 +96,6 @@ unpackTag = SnmprecRecord().unpack_tag
 # on Py3 and `str` on Py2. So let's add simple wrappers to all
 # Redis calls that return non-ints to overcome this hassle.
 
-def lindex(dbConn, *args):
-    ret = dbConn.lindex(*args)
-    if ret is not None:
-        ret = octets.octs2str(ret)
-
-    return ret
-
-
 def get(dbConn, *args):
     ret = dbConn.get(*args)
     if ret is not None:
@@ -119,60 +112,188 @@ def evalsha(dbConn, *args):
     return ret
 
 
-def variate(oid, tag, value, **context):
-    if 'dbConn' in moduleContext:
-        dbConn = moduleContext['dbConn']
+# Lua snippet to find index of the first element of `listKey` list
+# greater than `oidKey`, the list is kept sorted
+BISECT_SNIPPET = """
+local lo, hi = 0, redis.call('llen', listKey) - 1
 
-    else:
-        raise error.SnmpsimError('variation module not initialized')
+while lo <= hi do
+    local mid = math.floor((lo + hi) / 2)
+    if redis.call('lindex', listKey, mid) <= oidKey then
+        lo = mid + 1
+    else
+        hi = mid - 1
+    end
+end
+"""
+
+# Server-side OID lookup, answers GET/GETNEXT var-bind in one round trip.
+# The successor key GETNEXT finds is not known in advance, it belongs to
+# the same key space as the keys passed in though
+LOOKUP_SCRIPT = """
+local oidKey, listKey = KEYS[1], KEYS[2]
+local nextFlag, fetchValue = ARGV[1], ARGV[2]
+
+if nextFlag == '1' then
+""" + BISECT_SNIPPET + """
+    oidKey = redis.call('lindex', listKey, lo)
+
+    if not oidKey then
+        return false
+    end
+end
+
+if fetchValue == '1' then
+    return {oidKey, redis.call('get', oidKey)}
+end
+
+return {oidKey}
+"""
+
+# Insert OID key into key-space ordering list preserving its order
+INSERT_SCRIPT = """
+local listKey, oidKey = KEYS[1], ARGV[1]
+""" + BISECT_SNIPPET + """
+local pivot = redis.call('lindex', listKey, lo)
+
+if pivot then
+    return redis.call('linsert', listKey, 'BEFORE', pivot, oidKey)
+end
+
+return redis.call('rpush', listKey, oidKey)
+"""
+
+
+def get_key_space(dbConn, keySpacesId, period):
+    """Pick current key-space, key-spaces list is read once per tick"""
+    tick = int(time.time() - moduleContext['booted'])
+
+    keySpaces = moduleContext.setdefault('key-spaces', {})
+
+    if keySpacesId not in keySpaces or keySpaces[keySpacesId][0] != tick:
+        keySpaces[keySpacesId] = tick, [
+            octets.octs2str(x) for x in dbConn.lrange(keySpacesId, 0, -1)]
+
+    keySpacesList = keySpaces[keySpacesId][1]
 
+    if not keySpacesList:
+        return
+
+    if not period:
+        return keySpacesList[0]
+
+    return keySpacesList[tick % len(keySpacesList)]
+
+
+def lookup(dbConn, keySpace, dbOid, nextFlag=False, fetchValue=True,
+           pipe=None):
+    """Return OID key and its value, None if OID is not there.
+
+    With `pipe` given, lookup just gets queued into it, reply is to be
+    unpacked by `unpack_lookup` then.
+    """
+    if 'lookup-script' not in moduleContext:
+        moduleContext['lookup-script'] = dbConn.register_script(
+            LOOKUP_SCRIPT)
+
+    ret = moduleContext['lookup-script'](
+        keys=[keySpace + '-' + dbOid, keySpace + '-oids_ordering'],
+        args=[int(nextFlag), int(fetchValue)], client=pipe)
+
+    if pipe is None:
+        return unpack_lookup(ret)
+
+
+def unpack_lookup(ret):
+    if not ret:
+        return None, None
+
+    if len(ret) > 1 and ret[1] is not None:
+        return octets.octs2str(ret[0]), octets.octs2str(ret[1])
+
+    return octets.octs2str(ret[0]), None
+
+
+def get_settings(dbConn, recordContext, value):
+    """Parse record settings once, return None if record is unusable"""
     if 'settings' not in recordContext:
         settings = recordContext['settings'] = dict(
             [utils.split(x, '=') for x in utils.split(value, ',')])
 
         if 'key-spaces-id' not in settings:
             log.info('redis:mandatory key-spaces-id option is missing')
-            return context['origOid'], tag, context['errorStatus']
+            return
 
         settings['period'] = float(settings.get('period', 60))
 
         if 'evalsha' in settings:
-            if not dbConn.script_exists(settings['evalsha']):
+            if not dbConn.script_exists(settings['evalsha'])[0]:
                 log.info('redis: lua script %s does not exist '
                         'at Redis' % settings['evalsha'])
-                return context['origOid'], tag, context['errorStatus']
+                return
 
         recordContext['ready'] = True
 
     if 'ready' not in recordContext:
-        return context['origOid'], tag, context['errorStatus']
-
-    redisScript = recordContext['settings'].get('evalsha')
+        return
 
-    keySpacesId = recordContext['settings']['key-spaces-id']
+    return recordContext['settings']
 
-    if recordContext['settings']['period'] and dbConn.llen(keySpacesId):
-        booted = time.time() - moduleContext['booted']
-        keySpaceIdx = int(booted) % dbConn.llen(keySpacesId)
 
-    else:
-        keySpaceIdx = 0
+def select_key_space(dbConn, recordContext):
+    settings = recordContext['settings']
 
-    keySpace = lindex(dbConn, keySpacesId, keySpaceIdx)
+    keySpace = get_key_space(
+        dbConn, settings['key-spaces-id'], settings['period'])
 
     if ('current-keyspace' not in recordContext or
             recordContext['current-keyspace'] != keySpace):
         log.info('redis: now using keyspace %s (cycling period'
                 ' %s)' % (
-            keySpace, recordContext['settings']['period'] or '<disabled>'))
+            keySpace, settings['period'] or '<disabled>'))
 
         recordContext['current-keyspace'] = keySpace
 
+    return keySpace
+
+
+def format_db_oid(oid):
+    return '.'.join(['%10s' % x for x in str(oid).split('.')])
+
+
+def parse_tag_and_value(origOid, tag, textOid, tagAndValue, errorStatus):
+    if not tagAndValue:
+        return origOid, tag, errorStatus
+
+    textOid = '.'.join(
+        [x.strip() for x in textOid.split('-', 1)[1].split('.')])
+    textTag, textValue = tagAndValue.split('|', 1)
+
+    return rfc1902.ObjectName(textOid), textTag, textValue
+
+
+def variate(oid, tag, value, **context):
+    if 'dbConn' in moduleContext:
+        dbConn = moduleContext['dbConn']
+
+    else:
+        raise error.SnmpsimError('variation module not initialized')
+
+    settings = get_settings(dbConn, recordContext, value)
+
+    if not settings:
+        return context['origOid'], tag, context['errorStatus']
+
+    redisScript = settings.get('evalsha')
+
+    keySpace = select_key_space(dbConn, recordContext)
+
+    origOid = context['origOid']
+
     if keySpace is None:
         return origOid, tag, context['errorStatus']
 
-    origOid = context['origOid']
-    dbOid = '.'.join(['%10s' % x for x in str(origOid).split('.')])
+    dbOid = format_db_oid(origOid)
 
     if context['setFlag']:
         if 'hexvalue' in context:
@@ -183,11 +304,13 @@ def variate(oid, tag, value, **context):
             textTag = SnmprecGrammar().get_tag_by_type(context['origValue'])
             textValue = str(context['origValue'])
 
+        oidKey = keySpace + '-' + dbOid
+
         if redisScript:
-            prevTagAndValue = evalsha(dbConn, redisScript, 1, keySpace + '-' + dbOid)
+            prevTagAndValue = evalsha(dbConn, redisScript, 1, oidKey)
 
         else:
-            prevTagAndValue = get(dbConn, keySpace + '-' + dbOid)
+            prevTagAndValue = get(dbConn, oidKey)
 
         if prevTagAndValue:
             prevTag, prevValue = prevTagAndValue.split('|')
@@ -196,73 +319,124 @@ def variate(oid, tag, value, **context):
                 idx = max(0, context['varsTotal'] - context['varsRemaining'] - 1)
                 raise WrongValueError(name=origOid, idx=idx)
 
-        else:
-            dbConn.linsert(
-                keySpace + '-oids_ordering', 'after',
-                getNextOid(dbConn, keySpace, dbOid), dbOid)
+        pipe = dbConn.pipeline()
+
+        if not prevTagAndValue:
+            insert_oid(dbConn, keySpace, oidKey, pipe)
 
         if redisScript:
-            evalsha(dbConn, redisScript, 1, keySpace + '-' + dbOid,
-                           textTag + '|' + textValue)
+            pipe.evalsha(redisScript, 1, oidKey, textTag + '|' + textValue)
 
         else:
-            dbConn.set(keySpace + '-' + dbOid, textTag + '|' + textValue)
+            pipe.set(oidKey, textTag + '|' + textValue)
+
+        pipe.execute()
 
         return origOid, textTag, context['origValue']
 
     else:
-        if context['nextFlag']:
-            textOid = lindex(
-                dbConn, keySpace + '-oids_ordering',
-                getNextOid(dbConn, keySpace, dbOid, index=True))
-
-        else:
-            textOid = keySpace + '-' + dbOid
+        textOid, tagAndValue = lookup(
+            dbConn, keySpace, dbOid, context['nextFlag'],
+            fetchValue=not redisScript)
 
-        if redisScript:
+        if textOid and redisScript:
             tagAndValue = evalsha(dbConn, redisScript, 1, textOid)
 
-        else:
-            tagAndValue = get(dbConn, textOid)
+        return parse_tag_and_value(
+            origOid, tag, textOid, tagAndValue, context['errorStatus'])
 
-        if not tagAndValue:
-            return origOid, tag, context['errorStatus']
 
-        textOid = '.'.join(
-            [x.strip() for x in textOid.split('-', 1)[1].split('.')])
-        textTag, textValue = tagAndValue.split('|', 1)
+def variate_batch(calls):
+    """Look up all GET/GETNEXT var-binds of SNMP request at once.
 
-        return textOid, textTag, textValue
+    Lookups are sent to Redis in a single pipeline. Records using
+    server-side script to read values take another pipeline.
+    """
+    if 'dbConn' in moduleContext:
+        dbConn = moduleContext['dbConn']
+
+    else:
+        raise error.SnmpsimError('variation module not initialized')
 
+    values = [None] * len(calls)
 
-def getNextOid(dbConn, keySpace, dbOid, index=False):
-    listKey = keySpace + '-oids_ordering'
-    oidKey = keySpace + '-' + dbOid
+    # call index and user script of every lookup sent to Redis
+    lookups = []
 
-    maxlen = listsize = dbConn.llen(listKey)
-    minlen = 0
+    pipe = dbConn.pipeline(transaction=False)
 
-    while maxlen >= minlen and listsize:
-        listsize -= 1
+    for idx, (oid, tag, value, record_context, context) in enumerate(calls):
+        settings = get_settings(dbConn, record_context, value)
 
-        idx = minlen + (maxlen - minlen) // 2
+        if settings:
+            keySpace = select_key_space(dbConn, record_context)
 
-        nextOid = lindex(dbConn, listKey, idx)
+        if not settings or keySpace is None:
+            values[idx] = context['origOid'], tag, context['errorStatus']
+            continue
 
-        if nextOid < oidKey:
-            minlen = idx + 1
+        redisScript = settings.get('evalsha')
 
-        elif nextOid > oidKey:
-            maxlen = idx - 1
+        lookup(dbConn, keySpace, format_db_oid(context['origOid']),
+               context['nextFlag'], fetchValue=not redisScript, pipe=pipe)
 
-        else:
-            idx += 1
-            break
+        lookups.append((idx, redisScript))
+
+    if not lookups:
+        return values
+
+    replies = pipe.execute(raise_on_error=False)
+
+    # values kept by user scripts are read in another round trip
+    scripted = []
+
+    for (idx, redisScript), ret in zip(lookups, replies):
+        if isinstance(ret, Exception):
+            values[idx] = ret
+            continue
+
+        textOid, tagAndValue = unpack_lookup(ret)
+
+        if textOid and redisScript:
+            pipe.evalsha(redisScript, 1, textOid)
+            scripted.append(idx)
+
+        values[idx] = textOid, tagAndValue
 
-    if not listsize:
-        raise error.SnmpsimError('empty/unsorted %s' % listKey)
+    if scripted:
+        for idx, ret in zip(scripted, pipe.execute(raise_on_error=False)):
+            if isinstance(ret, Exception):
+                values[idx] = ret
 
-    return not index and lindex(dbConn, listKey, idx) or idx
+            elif ret is not None:
+                values[idx] = values[idx][0], octets.octs2str(ret)
+
+            else:
+                values[idx] = values[idx][0], None
+
+    for idx, redisScript in lookups:
+        if isinstance(values[idx], Exception):
+            continue
+
+        _, tag, _, _, context = calls[idx]
+
+        textOid, tagAndValue = values[idx]
+
+        values[idx] = parse_tag_and_value(
+            context['origOid'], tag, textOid, tagAndValue,
+            context['errorStatus'])
+
+    return values
+
+
+def insert_oid(dbConn, keySpace, oidKey, pipe=None):
+    """Put OID key into key-space ordering list preserving its order"""
+    if 'insert-script' not in moduleContext:
+        moduleContext['insert-script'] = dbConn.register_script(
+            INSERT_SCRIPT)
+
+    moduleContext['insert-script'](
+        keys=[keySpace + '-oids_ordering'], args=[oidKey], client=pipe)
 
 
 def record(oid, tag, value, **context):
@@ -317,14 +491,18 @@ def record(oid, tag, value, **context):
         textTag = SnmprecGrammar().get_tag_by_type(context['origValue'])
         textValue = str(context['origValue'])
 
-    dbConn.lpush(keySpace + '-temp_oids_ordering', keySpace + '-' + dbOid)
+    pipe = dbConn.pipeline()
+
+    pipe.lpush(keySpace + '-temp_oids_ordering', keySpace + '-' + dbOid)
 
     if redisScript:
-        evalsha(dbConn, 
+        pipe.evalsha(
             redisScript, 1, keySpace + '-' + dbOid, textTag + '|' + textValue)
 
     else:
-        dbConn.set(keySpace + '-' + dbOid, textTag + '|' + textValue)
+        pipe.set(keySpace + '-' + dbOid, textTag + '|' + textValue)
+
+    pipe.execute()
 
     if not context['count']:
         settings = {
@@ -12,6 +12,8 @@
 # Expects to work a table of the following layout:
 # CREATE TABLE <tablename> (oid text, tag text, value text, maxaccess text)
 #
+import threading
+
 from snmpsim import error
 from snmpsim import log
 from snmpsim.grammar.snmprec import SnmprecGrammar
@@ -24,6 +26,172 @@ ISOLATION_LEVELS = {
     '3': 'SERIALIZABLE'
 }
 
+# SQL statements by name, `?` stands for query parameter, `{table}` for
+# table name
+QUERIES = {
+    'get': 'select tag, value from {table} where oid=? limit 1',
+    'getnext': 'select oid, tag, value from {table} where oid>? '
+               'order by oid limit 1',
+    'getaccess': 'select maxaccess from {table} where oid=? limit 1',
+    'exists': 'select oid from {table} where oid=? limit 1',
+    'update': 'update {table} set tag=?,value=? where oid=?',
+    'insert': 'insert into {table} values (?, ?, ?, \'read-write\')',
+}
+
+
+class ConnectionPool(object):
+    """Thread-safe pool of database connections.
+
+    Up to `size` connections are opened on demand, transaction isolation
+    level is set once, right after connection is established.
+    """
+    def __init__(self, db, connect_params, size=1, isolation_level=None):
+        self._db = db
+        self._connect_params = connect_params
+        self._isolation_level = isolation_level
+        self._idle = []
+        self._connections = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        conn = self._db.connect(**self._connect_params)
+
+        if self._isolation_level:
+            cursor = conn.cursor()
+
+            try:
+                cursor.execute(
+                    'set session transaction isolation level '
+                    '%s' % self._isolation_level)
+                cursor.fetchall()
+
+            except Exception:  # non-MySQL/Postgres
+                pass
+
+            cursor.close()
+
+        return conn
+
+    def acquire(self):
+        self._slots.acquire()
+
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+
+        try:
+            conn = self._connect()
+
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._connections.append(conn)
+
+        return conn
+
+    def release(self, conn):
+        with self._lock:
+            self._idle.append(conn)
+
+        self._slots.release()
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+
+                except Exception as exc:
+                    log.error('SQL connection close failed: %s' % exc)
+
+            self._connections = []
+            self._idle = []
+
+
+# connection held by current thread till the end of PDU
+_held = threading.local()
+
+
+def _acquire_connection():
+    conn = getattr(_held, 'conn', None)
+
+    if conn is None:
+        conn = _held.conn = moduleContext['dbPool'].acquire()
+        _held.dirty = False
+
+    return conn
+
+
+def _release_connection():
+    conn = getattr(_held, 'conn', None)
+
+    if conn is None:
+        return
+
+    _held.conn = None
+
+    try:
+        if _held.dirty:
+            conn.commit()
+
+    finally:
+        moduleContext['dbPool'].release(conn)
+
+
+def _prepare_query(name, table):
+    """Build SQL statement with DB-API driver-specific placeholders"""
+    queries = moduleContext['dbQueries']
+
+    try:
+        return queries[name, table]
+
+    except KeyError:
+        pass
+
+    parts = QUERIES[name].format(table=table).split('?')
+
+    paramstyle = moduleContext['paramStyle']
+
+    if paramstyle in ('format', 'pyformat'):
+        markers = ['%s'] * (len(parts) - 1)
+
+    elif paramstyle == 'numeric':
+        markers = [':%d' % (idx + 1) for idx in range(len(parts) - 1)]
+
+    elif paramstyle == 'named':
+        markers = [':p%d' % (idx + 1) for idx in range(len(parts) - 1)]
+
+    else:
+        markers = ['?'] * (len(parts) - 1)
+
+    query = parts[0] + ''.join(
+        [marker + part for marker, part in zip(markers, parts[1:])])
+
+    queries[name, table] = query
+
+    return query
+
+
+def _execute(cursor, name, table, *params):
+    query = _prepare_query(name, table)
+
+    if moduleContext['paramStyle'] == 'named':
+        params = dict(
+            [('p%d' % (idx + 1), param) for idx, param in enumerate(params)])
+
+    cursor.execute(query, params)
+
+
+def _format_sql_oid(oid):
+    return '.'.join(['%10s' % x for x in str(oid).split('.')])
+
+
+def _parse_sql_oid(sql_oid):
+    return '.'.join([x.strip() for x in str(sql_oid).split('.')])
+
 
 def init(**context):
     options = {}
@@ -61,7 +229,6 @@ def init(**context):
     if not connectParams:
         raise error.SnmpsimError('database connect parameters not specified')
 
-    moduleContext['dbConn'] = dbConn = db.connect(**connectParams)
     moduleContext['dbTable'] = dbTable = options.get('dbtable', 'snmprec')
     moduleContext['isolationLevel'] = options.get('isolationlevel', '1')
 
@@ -70,7 +237,26 @@ def init(**context):
             'unknown SQL transaction isolation level '
             '%s' % moduleContext['isolationLevel'])
 
+    try:
+        poolSize = int(options.get('poolsize', 1))
+
+    except ValueError:
+        raise error.SnmpsimError(
+            'bad SQL connection pool size %s' % options['poolsize'])
+
+    moduleContext['paramStyle'] = getattr(db, 'paramstyle', 'qmark')
+    moduleContext['dbQueries'] = {}
+
+    moduleContext['dbPool'] = ConnectionPool(
+        db, connectParams, max(poolSize, 1),
+        ISOLATION_LEVELS[moduleContext['isolationLevel']])
+
+    # fail early on bad connect parameters
+    moduleContext['dbPool'].release(moduleContext['dbPool'].acquire())
+
     if 'mode' in context and context['mode'] == 'recording':
+        dbConn = _acquire_connection()
+
         cursor = dbConn.cursor()
 
         try:
@@ -101,23 +287,9 @@ def init(**context):
 
 
 def variate(oid, tag, value, **context):
-    if 'dbConn' in moduleContext:
-        db_conn = moduleContext['dbConn']
-
-    else:
+    if 'dbPool' not in moduleContext:
         raise error.SnmpsimError('variation module not initialized')
 
-    cursor = db_conn.cursor()
-
-    try:
-        cursor.execute(
-            'set session transaction isolation level '
-            '%s' % ISOLATION_LEVELS[moduleContext['isolationLevel']])
-        cursor.fetchall()
-
-    except Exception:  # non-MySQL/Postgres
-        pass
-
     if value:
         db_table = value.split(',').pop(0)
 
@@ -126,11 +298,29 @@ def variate(oid, tag, value, **context):
 
     else:
         log.info('SQL table not specified for OID '
-                '%s' % (context['origOid'],))
+                 '%s' % (context['origOid'],))
         return context['origOid'], tag, context['errorStatus']
 
+    # the same connection serves all var-binds of a PDU
+    db_conn = _acquire_connection()
+
+    try:
+        cursor = db_conn.cursor()
+
+        try:
+            return _variate(cursor, db_table, tag, context)
+
+        finally:
+            cursor.close()
+
+    finally:
+        if context['varsRemaining'] == 0:  # last OID in PDU
+            _release_connection()
+
+
+def _variate(cursor, db_table, tag, context):
     orig_oid = context['origOid']
-    sql_oid = '.'.join(['%10s' % x for x in str(orig_oid).split('.')])
+    sql_oid = _format_sql_oid(orig_oid)
 
     if context['setFlag']:
         if 'hexvalue' in context:
@@ -141,10 +331,7 @@ def variate(oid, tag, value, **context):
             text_tag = SnmprecGrammar().get_tag_by_type(context['origValue'])
             text_value = str(context['origValue'])
 
-        cursor.execute(
-            'select maxaccess,tag from %s where oid=\'%s\''
-            ' limit 1' % (db_table, sql_oid)
-        )
+        _execute(cursor, 'getaccess', db_table, sql_oid)
 
         resultset = cursor.fetchone()
 
@@ -153,60 +340,43 @@ def variate(oid, tag, value, **context):
             if maxaccess != 'read-write':
                 return orig_oid, tag, context['errorStatus']
 
-            cursor.execute(
-                'update %s set tag=\'%s\',value=\'%s\' where '
-                'oid=\'%s\'' % (db_table, text_tag, text_value, sql_oid))
+            _execute(cursor, 'update', db_table,
+                     text_tag, text_value, sql_oid)
 
         else:
-            cursor.execute(
-                'insert into %s values (\'%s\', \'%s\', \'%s\', '
-                '\'read-write\')' % (db_table, sql_oid, text_tag, text_value))
+            _execute(cursor, 'insert', db_table,
+                     sql_oid, text_tag, text_value)
 
-        if context['varsRemaining'] == 0:  # last OID in PDU
-            db_conn.commit()
-
-        cursor.close()
+        _held.dirty = True
 
         return orig_oid, text_tag, context['origValue']
 
-    else:
-        if context['nextFlag']:
-            cursor.execute(
-                'select oid from %s where oid>\'%s\' order by oid '
-                'limit 1' % (db_table, sql_oid))
-
-            resultset = cursor.fetchone()
+    if context['nextFlag']:
+        # next OID along with its value in one go
+        _execute(cursor, 'getnext', db_table, sql_oid)
 
-            if resultset:
-                orig_oid = orig_oid.clone(
-                    '.'.join([x.strip() for x in str(resultset[0]).split('.')]))
+        resultset = cursor.fetchone()
 
-                sql_oid = '.'.join(['%10s' % x for x in str(orig_oid).split('.')])
+        if resultset:
+            orig_oid = orig_oid.clone(_parse_sql_oid(resultset[0]))
 
-            else:
-                cursor.close()
-                return orig_oid, tag, context['errorStatus']
+            return orig_oid, str(resultset[1]), str(resultset[2])
 
-        cursor.execute(
-            'select tag, value from %s where oid=\'%s\' '
-            'limit 1' % (db_table, sql_oid))
+        return orig_oid, tag, context['errorStatus']
 
-        resultset = cursor.fetchone()
+    _execute(cursor, 'get', db_table, sql_oid)
 
-        cursor.close()
+    resultset = cursor.fetchone()
 
-        if resultset:
-            return orig_oid, str(resultset[0]), str(resultset[1])
+    if resultset:
+        return orig_oid, str(resultset[0]), str(resultset[1])
 
-        else:
-            return orig_oid, tag, context['errorStatus']
+    else:
+        return orig_oid, tag, context['errorStatus']
 
 
 def record(oid, tag, value, **context):
-    if 'dbConn' in moduleContext:
-        db_conn = moduleContext['dbConn']
-
-    else:
+    if 'dbPool' not in moduleContext:
         raise error.SnmpsimError('variation module not initialized')
 
     db_table = moduleContext['dbTable']
@@ -214,7 +384,8 @@ def record(oid, tag, value, **context):
     if context['stopFlag']:
         raise error.NoDataNotification()
 
-    sql_oid = '.'.join(['%10s' % x for x in oid.split('.')])
+    sql_oid = _format_sql_oid(oid)
+
     if 'hexvalue' in context:
         text_tag = context['hextag']
         text_value = context['hexvalue']
@@ -223,21 +394,18 @@ def record(oid, tag, value, **context):
         text_tag = SnmprecGrammar().get_tag_by_type(context['origValue'])
         text_value = str(context['origValue'])
 
-    cursor = db_conn.cursor()
+    # recording session runs in a single transaction
+    cursor = _acquire_connection().cursor()
 
-    cursor.execute(
-        'select oid from %s where oid=\'%s\' '
-        'limit 1' % (db_table, sql_oid))
+    _execute(cursor, 'exists', db_table, sql_oid)
 
     if cursor.fetchone():
-        cursor.execute(
-            'update %s set tag=\'%s\',value=\'%s\' where '
-            'oid=\'%s\'' % (db_table, text_tag, text_value, sql_oid))
+        _execute(cursor, 'update', db_table, text_tag, text_value, sql_oid)
 
     else:
-        cursor.execute(
-            'insert into %s values (\'%s\', \'%s\', \'%s\', '
-            '\'read-write\')' % (db_table, sql_oid, text_tag, text_value))
+        _execute(cursor, 'insert', db_table, sql_oid, text_tag, text_value)
+
+    _held.dirty = True
 
     cursor.close()
 
@@ -249,9 +417,9 @@ def record(oid, tag, value, **context):
 
 
 def shutdown(**context):
-    db_conn = moduleContext.get('dbConn')
-    if db_conn:
-        if 'mode' in context and context['mode'] == 'recording':
-            db_conn.commit()
+    db_pool = moduleContext.get('dbPool')
+    if db_pool:
+        # commits pending changes, if any
+        _release_connection()
 
-        db_conn.close()
+        db_pool.close()
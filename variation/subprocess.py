@@ -7,14 +7,290 @@
 # Managed value variation module
 # Get/set managed value by invoking an external program
 #
+import errno
+import os
+import select
 import subprocess
 import sys
+import threading
+import time
 
 from pysnmp.proto import rfc1902
 
+from snmpsim import error
 from snmpsim import log
 from snmpsim.utils import split
 
+# characters escaped in coprocess protocol lines
+ESCAPES = (('\\', '\\\\'), ('\n', '\\n'), ('\r', '\\r'))
+
+# values come with OIDs of their records unless failed
+variate_batch_keeps_oids = True
+
+
+def escape(text):
+    for char, escaped in ESCAPES:
+        text = text.replace(char, escaped)
+
+    return text
+
+
+def unescape(text):
+    chars = []
+    escaped = False
+
+    for char in text:
+        if escaped:
+            chars.append({'n': '\n', 'r': '\r'}.get(char, char))
+            escaped = False
+
+        elif char == '\\':
+            escaped = True
+
+        else:
+            chars.append(char)
+
+    return ''.join(chars)
+
+
+class Coprocess(object):
+    """Long-running external program serving line-delimited requests.
+
+    Each request is a single line written to program's stdin, the
+    response is expected as a single line at program's stdout. Requests
+    are served one at a time by `exchange()`.
+    """
+    def __init__(self, args, shell=False):
+        self._process = subprocess.Popen(
+            args, shell=shell, stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE, bufsize=0)
+        self._input = b''
+        self._output = b''
+        self.request = None
+        self.responses = {}
+        self.error = None
+
+    @property
+    def stdin(self):
+        return self._process.stdin.fileno()
+
+    @property
+    def stdout(self):
+        return self._process.stdout.fileno()
+
+    @property
+    def writing(self):
+        return bool(self._output)
+
+    def send(self, request, line):
+        self._output = escape(line).encode('utf-8') + b'\n'
+        self.request = request
+
+    def write(self):
+        # at most PIPE_BUF octets never block on writable pipe
+        written = os.write(self.stdin, self._output[:select.PIPE_BUF])
+        self._output = self._output[written:]
+
+    def read(self):
+        data = os.read(self.stdout, 65536)
+
+        if not data:
+            raise error.SnmpsimError('program terminated')
+
+        self._input += data
+
+        if self.request is not None and b'\n' in self._input:
+            response, self._input = self._input.split(b'\n', 1)
+            self.responses[self.request] = unescape(
+                response.decode('utf-8').rstrip('\r'))
+            self.request = None
+
+    def fail(self, exc):
+        """Mark coprocess broken, return its unanswered request if any"""
+        request, self.request = self.request, None
+        self.error = exc
+        return request
+
+    def close(self):
+        try:
+            self._process.stdin.close()
+
+        except (IOError, OSError):
+            pass
+
+        if self._process.poll() is None:
+            self._process.terminate()
+
+        self._process.wait()
+
+
+def exchange(jobs, timeout):
+    """Have coprocesses serve requests, return responses by request IDs.
+
+    `jobs` is a sequence of (pool, coprocesses, requests) tuples, where
+    `requests` is a list of (request ID, line) pairs served by
+    `coprocesses` taken from `pool`. Each coprocess takes the next
+    request as soon as it responds, failed ones get replaced.
+
+    All coprocesses are served at once by a single select() loop, which
+    ends as soon as all requests are answered or in `timeout` seconds.
+    Failed requests are represented by exceptions.
+
+    The loop runs on the thread serving SNMP requests, as responses make
+    up the SNMP response being built, so no other SNMP request gets
+    served by the process meanwhile.
+    """
+    deadline = time.time() + timeout
+
+    results = {}
+
+    def feed(pool, coprocesses, requests, idx):
+        coprocess = coprocesses[idx]
+
+        results.update(coprocess.responses)
+        coprocess.responses.clear()
+
+        if coprocess.error:
+            if not requests:
+                return
+
+            # out of sync or dead, replace with a fresh one
+            coprocess.close()
+
+            try:
+                coprocess = coprocesses[idx] = pool.spawn()
+
+            except Exception as exc:
+                for request, _ in requests:
+                    results[request] = exc
+
+                del requests[:]
+                return
+
+        if coprocess.request is None and requests:
+            coprocess.send(*requests.pop(0))
+
+    slots = [(job, idx) for job in jobs for idx in range(len(job[1]))]
+
+    for job, idx in slots:
+        feed(job[0], job[1], job[2], idx)
+
+    while True:
+        active = [(job, idx) for job, idx in slots
+                  if job[1][idx].request is not None]
+
+        if not active:
+            break
+
+        remaining = deadline - time.time()
+
+        if remaining <= 0:
+            exc = error.SnmpsimError('no response in %s seconds' % timeout)
+
+            for job, idx in active:
+                results[job[1][idx].fail(exc)] = exc
+
+            for job in jobs:
+                for request, _ in job[2]:
+                    results[request] = exc
+
+                del job[2][:]
+
+            break
+
+        readers = dict((job[1][idx].stdout, job[1][idx])
+                       for job, idx in active)
+        writers = dict((job[1][idx].stdin, job[1][idx])
+                       for job, idx in active if job[1][idx].writing)
+
+        try:
+            readable, writable, _ = select.select(
+                list(readers), list(writers), [], remaining)
+
+        except (select.error, OSError) as exc:
+            if exc.args[0] == errno.EINTR:
+                continue
+
+            raise
+
+        for handlers, fds in ((writers, writable), (readers, readable)):
+            for fd in fds:
+                coprocess = handlers[fd]
+
+                if coprocess.error:
+                    continue
+
+                try:
+                    if fd == coprocess.stdin:
+                        coprocess.write()
+
+                    else:
+                        coprocess.read()
+
+                except (IOError, OSError, error.SnmpsimError) as exc:
+                    results[coprocess.fail(exc)] = exc
+
+        for job, idx in active:
+            feed(job[0], job[1], job[2], idx)
+
+    return results
+
+
+class CoprocessPool(object):
+    """Thread-safe bounded pool of coprocesses running the same program"""
+    def __init__(self, args, shell=False, size=1):
+        self._args = args
+        self._shell = shell
+        self._size = size
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def spawn(self):
+        return Coprocess(self._args, self._shell)
+
+    def acquire(self, count=1):
+        """Return from one to `count` coprocesses, waits for the first one"""
+        self._slots.acquire()
+
+        acquired = 1
+
+        while (acquired < min(count, self._size) and
+               self._slots.acquire(False)):
+            acquired += 1
+
+        coprocesses = []
+
+        try:
+            while len(coprocesses) < acquired:
+                with self._lock:
+                    coprocess = self._idle and self._idle.pop() or None
+
+                coprocesses.append(coprocess or self.spawn())
+
+        except Exception:
+            self.release(coprocesses, acquired)
+            raise
+
+        return coprocesses
+
+    def release(self, coprocesses, acquired=None):
+        for coprocess in coprocesses:
+            if coprocess.error or coprocess.request is not None:
+                coprocess.close()
+                continue
+
+            with self._lock:
+                self._idle.append(coprocess)
+
+        for _ in range(len(coprocesses) if acquired is None else acquired):
+            self._slots.release()
+
+    def close(self):
+        with self._lock:
+            while self._idle:
+                self._idle.pop().close()
+
 
 def init(**context):
     moduleContext['settings'] = {}
@@ -30,8 +306,23 @@ def init(**context):
         moduleContext['settings']['shell'] = int(
             moduleContext['settings']['shell'])
 
+    moduleContext['settings']['coprocess'] = int(
+        moduleContext['settings'].get('coprocess', 0))
 
-def variate(oid, tag, value, **context):
+    if moduleContext['settings']['coprocess'] and sys.platform[:3] == 'win':
+        raise error.SnmpsimError(
+            'subprocess: coprocess mode is not supported on Windows')
+
+    moduleContext['settings']['pool'] = max(
+        1, int(moduleContext['settings'].get('pool', 1)))
+
+    moduleContext['settings']['timeout'] = float(
+        moduleContext['settings'].get('timeout', 0.5))
+
+    moduleContext['pools'] = {}
+
+
+def format_args(oid, tag, value, context):
     # in --v2c-arch some of the items are not defined
     transport_domain = transport_address = security_model = '<undefined>'
     security_name = security_level = context_name = transport_domain
@@ -56,7 +347,7 @@ def variate(oid, tag, value, **context):
     if 'contextName' in context:
         context_name = str(context['contextName'])
 
-    args = [
+    return [
         (x
         .replace('@TRANSPORTDOMAIN@', transport_domain)
         .replace('@TRANSPORTADDRESS@', transport_address)
@@ -75,6 +366,8 @@ def variate(oid, tag, value, **context):
         .replace('@SUBTREEFLAG@', str(int(context['subtreeFlag']))))
         for x in split(value, ' ')]
 
+
+def run_program(args):
     log.info('subprocess: executing external process "%s"' % ' '.join(args))
 
     try:
@@ -89,14 +382,125 @@ def variate(oid, tag, value, **context):
         except AttributeError:
             handler = subprocess.call
 
+    return handler(args, shell=moduleContext['settings']['shell'])
+
+
+def variate(oid, tag, value, **context):
+    args = format_args(oid, tag, value, context)
+
+    if moduleContext['settings']['coprocess']:
+        value = call_coprocesses([args])[0]
+
+        if isinstance(value, Exception):
+            log.info('subprocess: coprocess "%s" failed: %s' % (args[0], value))
+            return context['origOid'], tag, context['errorStatus']
+
+        return oid, tag, value
+
     try:
-        return oid, tag, handler(
-            args, shell=moduleContext['settings']['shell'])
+        return oid, tag, run_program(args)
 
     except getattr(subprocess, 'CalledProcessError', Exception):
         log.info('subprocess: external program execution failed')
         return context['origOid'], tag, context['errorStatus']
 
 
+def variate_batch(calls):
+    """Serve all read var-binds of SNMP request at once.
+
+    In coprocess mode, all requests are written to coprocesses first,
+    then all the responses are awaited together, so the whole SNMP
+    request takes at most one timeout. Otherwise programs are run one
+    by one.
+    """
+    values = [None] * len(calls)
+
+    requests = []
+
+    for idx, (oid, tag, value, record_context, context) in enumerate(calls):
+        args = format_args(oid, tag, value, context)
+
+        if moduleContext['settings']['coprocess']:
+            requests.append((idx, args))
+            continue
+
+        try:
+            values[idx] = oid, tag, run_program(args)
+
+        except getattr(subprocess, 'CalledProcessError', Exception):
+            log.info('subprocess: external program execution failed')
+            values[idx] = context['origOid'], tag, context['errorStatus']
+
+    if requests:
+        responses = call_coprocesses([args for _, args in requests])
+
+        for (idx, args), value in zip(requests, responses):
+            oid, tag, _, _, context = calls[idx]
+
+            if isinstance(value, Exception):
+                log.info('subprocess: coprocess "%s" failed: '
+                         '%s' % (args[0], value))
+                values[idx] = context['origOid'], tag, context['errorStatus']
+
+            else:
+                values[idx] = oid, tag, value
+
+    return values
+
+
+def call_coprocesses(requests):
+    """Have coprocesses serve requests given as program arguments.
+
+    Returns responses in the order of requests, failed requests are
+    represented by exceptions.
+    """
+    pools = moduleContext['pools']
+
+    lines = {}
+
+    for idx, args in enumerate(requests):
+        lines.setdefault(args[0], []).append((idx, ' '.join(args[1:])))
+
+    results = [None] * len(requests)
+
+    jobs = []
+
+    try:
+        # same order in all threads or they may deadlock on busy pools
+        for program in sorted(lines):
+            if program not in pools:
+                log.info('subprocess: starting coprocess "%s"' % program)
+
+                pools[program] = CoprocessPool(
+                    [program], shell=moduleContext['settings']['shell'],
+                    size=moduleContext['settings']['pool'])
+
+            try:
+                coprocesses = pools[program].acquire(len(lines[program]))
+
+            except Exception as exc:
+                for idx, _ in lines[program]:
+                    results[idx] = exc
+                continue
+
+            for _, line in lines[program]:
+                log.info('subprocess: calling coprocess "%s" with '
+                         '"%s"' % (program, line))
+
+            jobs.append((pools[program], coprocesses, list(lines[program])))
+
+        responses = exchange(jobs, moduleContext['settings']['timeout'])
+
+        for idx, response in responses.items():
+            results[idx] = response
+
+    finally:
+        for pool, coprocesses, _ in jobs:
+            pool.release(coprocesses)
+
+    return results
+
+
 def shutdown(**context):
-    pass
+    for pool in moduleContext.get('pools', {}).values():
+        pool.close()